@@ -3,7 +3,8 @@ EXTENSION_NAME = "My Cool Extension"
 def init_extension(browser):
     # This runs when loaded.
     print("Extension loaded!")
-    # You can add UI, hook events, etc. with `browser`.
+    # Runs in its own process: `browser` is an extension_host.BrowserAPI.
+    # Hook events with browser.on("load_finished", callback), open tabs, etc.
 
 def cleanup_extension(browser):
     # This runs on unload.
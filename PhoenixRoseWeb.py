@@ -1,5 +1,9 @@
 import os
 import sys
+from singleinstance import forward_to_running_instance, parse_args, listen, INCOGNITO_FLAG
+if __name__ == "__main__" and forward_to_running_instance(sys.argv[1:]):
+    # Another instance opened the URLs; don't pay for starting WebEngine
+    sys.exit(0)
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QAction, QLineEdit, QWidget,
     QVBoxLayout, QTabWidget, QPushButton, QListWidget, QLabel, QTabBar,
@@ -81,7 +85,7 @@ class AboutWindow(QWidget):
         self.setLayout(layout)
 
 class Browser(QMainWindow):
-    def __init__(self):
+    def __init__(self, urls=None, incognito=False):
         super().__init__()
         self.setWindowTitle("PhoenixRose Web")
         self.setGeometry(100, 100, 1200, 800)
@@ -100,7 +104,9 @@ class Browser(QMainWindow):
         self.load_history()
         self.load_bookmarks()
         self.load_theme()  # load saved theme or default
-        self.add_new_tab()
+        self.open_urls(urls or [], incognito)
+        if self.tabs.count() == 0:
+            self.add_new_tab()
         self.update_bookmarks_bar()
 
     def closeEvent(self, event):
@@ -281,6 +287,21 @@ class Browser(QMainWindow):
         self.apply_theme_to_tab(new_tab)
         return new_tab
 
+    def open_urls(self, urls, incognito=False):
+        for url in urls:
+            self.add_new_tab(QUrl.fromUserInput(url).toString(), incognito=incognito)
+
+    def open_forwarded(self, message):
+        # URLs from a later launch, handed over by singleinstance.listen
+        urls = message.get("urls") or []
+        self.open_urls(urls, bool(message.get("incognito")))
+        if not urls:
+            self.add_new_tab(incognito=bool(message.get("incognito")))
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
     def close_tab(self, index):
         if self.tabs.count() < 2:
             return
@@ -492,7 +513,9 @@ class Browser(QMainWindow):
 
 def main():
     app = QApplication(sys.argv)
-    window = Browser()
+    urls, flags = parse_args(sys.argv[1:])
+    window = Browser(urls, incognito=INCOGNITO_FLAG in flags)
+    window.single_instance = listen(window.open_forwarded, window)
     window.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,415 @@
+import os
+import re
+import pickle
+import hashlib
+
+FILTER_LISTS_DIR = "filters"
+FILTER_CACHE_FILE = os.path.join(FILTER_LISTS_DIR, "compiled.cache")
+CACHE_VERSION = 1
+
+# Resource type names used by filter options ($script, $image, ...)
+TYPE_BITS = {
+    "document": 1 << 0,
+    "subdocument": 1 << 1,
+    "stylesheet": 1 << 2,
+    "script": 1 << 3,
+    "image": 1 << 4,
+    "font": 1 << 5,
+    "object": 1 << 6,
+    "media": 1 << 7,
+    "xmlhttprequest": 1 << 8,
+    "ping": 1 << 9,
+    "websocket": 1 << 10,
+    "other": 1 << 11,
+}
+TYPE_ALIASES = {
+    "xhr": "xmlhttprequest",
+    "frame": "subdocument",
+    "css": "stylesheet",
+    "object-subrequest": "object",
+    "beacon": "ping",
+    "doc": "document",
+}
+ALL_TYPES = (1 << len(TYPE_BITS)) - 1
+# Without an explicit type option a rule never applies to top-level documents
+DEFAULT_TYPES = ALL_TYPES & ~TYPE_BITS["document"]
+
+PARTY_ANY = 0
+PARTY_FIRST = 1
+PARTY_THIRD = 2
+
+TOKEN_RE = re.compile(r"[a-z0-9%]{2,}")
+HOSTS_LINE_RE = re.compile(r"^(?:0\.0\.0\.0|127\.0\.0\.1)\s+([a-z0-9.\-_]+)\s*$")
+# Tokens so common that indexing on them would put half the list in one bucket
+BAD_TOKENS = {"http", "https", "www", "com", "js", "net", "org", "html", "php"}
+SEPARATOR_CLASS = r"(?:[^\w\-.%]|$)"
+SECOND_LEVEL_LABELS = {"co", "com", "net", "org", "gov", "edu", "ac", "or", "ne", "go"}
+
+# Options that don't change how a network request is matched
+IGNORED_OPTIONS = {"match-case", "all", "collapse", "~collapse"}
+
+HOST_RE = re.compile(r"^[a-z][a-z0-9+.\-]*://(?:[^@/?#]*@)?(\[[^\]]*\]|[^:/?#]*)", re.IGNORECASE)
+_base_domain_cache = {}
+
+
+def base_domain(host):
+    # Cheap registrable-domain approximation; good enough for party checks
+    base = _base_domain_cache.get(host)
+    if base is None:
+        parts = host.rsplit(".", 3)
+        if len(parts) >= 3 and parts[-2] in SECOND_LEVEL_LABELS and len(parts[-1]) == 2:
+            base = ".".join(parts[-3:])
+        else:
+            base = ".".join(parts[-2:])
+        if len(_base_domain_cache) > 4096:
+            _base_domain_cache.clear()
+        _base_domain_cache[host] = base
+    return base
+
+
+def host_of(url):
+    m = HOST_RE.match(url)
+    return m.group(1).lower() if m else ""
+
+
+def _pattern_to_regex(pattern, host_anchor, start_anchor, end_anchor):
+    out = []
+    for ch in pattern:
+        if ch == "*":
+            out.append(".*")
+        elif ch == "^":
+            out.append(SEPARATOR_CLASS)
+        else:
+            out.append(re.escape(ch))
+    body = "".join(out)
+    if host_anchor:
+        body = r"^[a-z][a-z0-9+.\-]*://(?:[^/?#]*\.)?" + body
+    elif start_anchor:
+        body = "^" + body
+    if end_anchor:
+        body += "$"
+    return body
+
+
+def _best_token(pattern, host_anchor, start_anchor, end_anchor):
+    # A token can only be used as an index key when it is guaranteed to appear
+    # as a whole token in every matching URL, i.e. it is not cut short by a
+    # wildcard or by an unanchored edge of the pattern.
+    best = ""
+    for m in TOKEN_RE.finditer(pattern):
+        tok = m.group(0)
+        s, e = m.start(), m.end()
+        if s == 0 and not (host_anchor or start_anchor):
+            continue
+        if s > 0 and pattern[s - 1] == "*":
+            continue
+        if e == len(pattern) and not end_anchor:
+            continue
+        if e < len(pattern) and pattern[e] == "*":
+            continue
+        if tok in BAD_TOKENS:
+            continue
+        if len(tok) > len(best):
+            best = tok
+    return best
+
+
+class Filter:
+    __slots__ = ("text", "plain", "regex_src", "types", "party", "include",
+                 "exclude", "important", "_regex")
+
+    def __init__(self, text, plain, regex_src, types=DEFAULT_TYPES, party=PARTY_ANY,
+                 include=frozenset(), exclude=frozenset(), important=False):
+        self.text = text
+        self.plain = plain
+        self.regex_src = regex_src
+        self.types = types
+        self.party = party
+        self.include = include
+        self.exclude = exclude
+        self.important = important
+        self._regex = None
+
+    def __getstate__(self):
+        return (self.text, self.plain, self.regex_src, self.types, self.party,
+                self.include, self.exclude, self.important)
+
+    def __setstate__(self, state):
+        (self.text, self.plain, self.regex_src, self.types, self.party,
+         self.include, self.exclude, self.important) = state
+        self._regex = None
+
+    def matches(self, url, type_bit, third_party, source_host):
+        if not self.types & type_bit:
+            return False
+        if self.party == PARTY_THIRD and not third_party:
+            return False
+        if self.party == PARTY_FIRST and third_party:
+            return False
+        if (self.include or self.exclude) and not self._domain_ok(source_host):
+            return False
+        if self.plain is not None:
+            return self.plain in url
+        if self._regex is None:
+            # Compiled lazily, most buckets are never hit during a session
+            self._regex = re.compile(self.regex_src, re.IGNORECASE)
+        return self._regex.search(url) is not None
+
+    def _domain_ok(self, host):
+        included = not self.include
+        while host:
+            if host in self.exclude:
+                return False
+            if not included and host in self.include:
+                included = True
+            dot = host.find(".")
+            if dot == -1:
+                break
+            host = host[dot + 1:]
+        return included
+
+
+class FilterEngine:
+    def __init__(self):
+        self.blocked_domains = set()
+        self.allowed_domains = set()
+        self.block_buckets = {}
+        self.allow_buckets = {}
+        self.important_buckets = {}
+        self.filter_count = 0
+
+    def add_filter(self, line):
+        line = line.strip()
+        if not line or line.startswith(("!", "[")):
+            return False
+        # Cosmetic (element hiding) rules are not handled by the network engine
+        if "##" in line or "#@#" in line or "#?#" in line or "#$#" in line:
+            return False
+
+        hosts_line = HOSTS_LINE_RE.match(line.lower())
+        if hosts_line:
+            self.blocked_domains.add(hosts_line.group(1))
+            self.filter_count += 1
+            return True
+
+        exception = line.startswith("@@")
+        if exception:
+            line = line[2:]
+
+        options = ""
+        if line.startswith("/") and "/$" in line:
+            line, options = line.rsplit("/$", 1)
+            line += "/"
+        elif not line.startswith("/") and "$" in line:
+            line, options = line.rsplit("$", 1)
+
+        types = 0
+        negated_types = 0
+        party = PARTY_ANY
+        include = exclude = frozenset()
+        important = False
+        for opt in options.lower().split(",") if options else ():
+            negate = opt.startswith("~")
+            name = opt[1:] if negate else opt
+            name = TYPE_ALIASES.get(name, name)
+            if name in TYPE_BITS:
+                if negate:
+                    negated_types |= TYPE_BITS[name]
+                else:
+                    types |= TYPE_BITS[name]
+            elif name in ("third-party", "3p"):
+                party = PARTY_FIRST if negate else PARTY_THIRD
+            elif name in ("first-party", "1p"):
+                party = PARTY_THIRD if negate else PARTY_FIRST
+            elif name.startswith("domain="):
+                domains = name[7:].split("|")
+                include = frozenset(d for d in domains if d and not d.startswith("~"))
+                exclude = frozenset(d[1:] for d in domains if d.startswith("~"))
+            elif name == "important":
+                important = True
+            elif opt not in IGNORED_OPTIONS:
+                # $csp, $redirect, $removeparam, $popup... change what the rule
+                # means, so skip it rather than over-block
+                return False
+        if not types:
+            types = DEFAULT_TYPES
+        types &= ~negated_types
+        if not types:
+            return False
+
+        if len(line) > 2 and line.startswith("/") and line.endswith("/"):
+            regex_src = line[1:-1]
+            try:
+                re.compile(regex_src)
+            except re.error:
+                return False
+            f = Filter(line, None, regex_src, types, party, include, exclude, important)
+            return self._add(f, "", exception)
+
+        host_anchor = line.startswith("||")
+        if host_anchor:
+            line = line[2:]
+        start_anchor = not host_anchor and line.startswith("|")
+        if start_anchor:
+            line = line[1:]
+        end_anchor = line.endswith("|")
+        if end_anchor:
+            line = line[:-1]
+        line = line.lower()
+        if not (host_anchor or start_anchor):
+            line = line.lstrip("*")
+        if not end_anchor:
+            line = line.rstrip("*")
+        if not line:
+            return False
+
+        # Plain "||host^" rules are by far the most common; they go into a
+        # hash set and never touch the token buckets.
+        simple = (types == DEFAULT_TYPES and party == PARTY_ANY and not include
+                  and not exclude and not important)
+        if host_anchor and simple and line.endswith("^") and \
+                re.fullmatch(r"[a-z0-9.\-_]+", line[:-1]):
+            if exception:
+                self.allowed_domains.add(line[:-1])
+            else:
+                self.blocked_domains.add(line[:-1])
+            self.filter_count += 1
+            return True
+
+        if not (host_anchor or start_anchor or end_anchor) and "*" not in line and "^" not in line:
+            plain, regex_src = line, None
+        else:
+            plain, regex_src = None, _pattern_to_regex(line, host_anchor, start_anchor, end_anchor)
+        token = _best_token(line, host_anchor, start_anchor, end_anchor)
+        f = Filter(line, plain, regex_src, types, party, include, exclude, important)
+        return self._add(f, token, exception)
+
+    def _add(self, f, token, exception):
+        if exception:
+            buckets = self.allow_buckets
+        elif f.important:
+            buckets = self.important_buckets
+        else:
+            buckets = self.block_buckets
+        buckets.setdefault(token, []).append(f)
+        self.filter_count += 1
+        return True
+
+    def load_list(self, path):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    self.add_filter(line)
+        except Exception as e:
+            print(f"Error loading filter list {path}: {e}")
+
+    def _bucket_match(self, buckets, url, tokens, type_bit, third_party, source_host):
+        if not buckets:
+            return False
+        for tok in tokens:
+            bucket = buckets.get(tok)
+            if bucket:
+                for f in bucket:
+                    if f.matches(url, type_bit, third_party, source_host):
+                        return True
+        bucket = buckets.get("")
+        if bucket:
+            for f in bucket:
+                if f.matches(url, type_bit, third_party, source_host):
+                    return True
+        return False
+
+    def _domain_hit(self, domains, host):
+        if not domains:
+            return False
+        while True:
+            if host in domains:
+                return True
+            dot = host.find(".")
+            if dot == -1:
+                return False
+            host = host[dot + 1:]
+
+    def should_block(self, url, source_url="", resource_type="other"):
+        if not self.filter_count:
+            return False
+        url = url.lower()
+        host = host_of(url)
+        source_host = host_of(source_url) if source_url else ""
+        third_party = bool(source_host) and base_domain(host) != base_domain(source_host)
+        type_bit = TYPE_BITS.get(resource_type, TYPE_BITS["other"])
+        tokens = None
+
+        if self.important_buckets:
+            tokens = TOKEN_RE.findall(url)
+            if self._bucket_match(self.important_buckets, url, tokens, type_bit,
+                                  third_party, source_host):
+                return True
+
+        blocked = type_bit & DEFAULT_TYPES and self._domain_hit(self.blocked_domains, host)
+        if not blocked:
+            if tokens is None:
+                tokens = TOKEN_RE.findall(url)
+            blocked = self._bucket_match(self.block_buckets, url, tokens, type_bit,
+                                         third_party, source_host)
+        if not blocked:
+            return False
+
+        if self._domain_hit(self.allowed_domains, host):
+            return False
+        if tokens is None:
+            tokens = TOKEN_RE.findall(url)
+        return not self._bucket_match(self.allow_buckets, url, tokens, type_bit,
+                                      third_party, source_host)
+
+    def _state(self):
+        return (self.blocked_domains, self.allowed_domains, self.block_buckets,
+                self.allow_buckets, self.important_buckets, self.filter_count)
+
+    def _set_state(self, state):
+        (self.blocked_domains, self.allowed_domains, self.block_buckets,
+         self.allow_buckets, self.important_buckets, self.filter_count) = state
+
+
+def _lists_fingerprint(paths):
+    h = hashlib.sha1(str(CACHE_VERSION).encode())
+    for path in paths:
+        st = os.stat(path)
+        h.update(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+
+def find_filter_lists(lists_dir=FILTER_LISTS_DIR):
+    if not os.path.isdir(lists_dir):
+        return []
+    return sorted(os.path.join(lists_dir, name) for name in os.listdir(lists_dir)
+                  if name.endswith(".txt"))
+
+
+def load_filter_engine(lists_dir=FILTER_LISTS_DIR, cache_file=FILTER_CACHE_FILE):
+    engine = FilterEngine()
+    paths = find_filter_lists(lists_dir)
+    if not paths:
+        return engine
+
+    fingerprint = _lists_fingerprint(paths)
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                cached_fingerprint, state = pickle.load(f)
+            if cached_fingerprint == fingerprint:
+                engine._set_state(state)
+                return engine
+        except Exception as e:
+            print(f"Error loading filter cache: {e}")
+
+    for path in paths:
+        engine.load_list(path)
+    try:
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump((fingerprint, engine._state()), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print(f"Error saving filter cache: {e}")
+    return engine
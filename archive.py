@@ -0,0 +1,352 @@
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import deque, Counter
+
+from PyQt5.QtCore import QObject, QIODevice, QTimer, pyqtSignal
+from PyQt5.QtWebEngineWidgets import QWebEngineDownloadItem
+
+ARCHIVE_DIR = "archives"
+MAX_CONCURRENT_SAVES = 3
+# A save that hasn't produced a finished file by then gives its slot back
+SAVE_TIMEOUT = 120
+READ_CHUNK = 64 * 1024
+BOUNDARY_RE = re.compile(rb'boundary=(?:"([^"]+)"|([^;\s]+))', re.IGNORECASE)
+
+
+class ArchiveStore:
+    # MHTML archives split into parts. Part headers go into a small JSON
+    # manifest per archive, part bodies into a content-addressed blob store, so
+    # a stylesheet or font shared by many saved pages is kept on disk once.
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.manifest_dir = os.path.join(root, "manifests")
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.manifest_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # Blobs written by ingests whose manifest isn't on disk yet; delete
+        # must not sweep them
+        self._claimed = Counter()
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest[2:])
+
+    def manifest_path(self, archive_id):
+        return os.path.join(self.manifest_dir, archive_id + ".json")
+
+    def ingest_mhtml(self, path, title="", url=""):
+        claimed = []
+        try:
+            return self._ingest(path, title, url, claimed)
+        finally:
+            with self._lock:
+                self._claimed.subtract(claimed)
+                self._claimed += Counter()
+
+    def _ingest(self, path, title, url, claimed):
+        # Streams the file line by line; only one line of a part is ever held in memory
+        parts = []
+        with open(path, "rb") as f:
+            header = bytearray()
+            for line in f:
+                header += line
+                if line in (b"\r\n", b"\n"):
+                    break
+            match = BOUNDARY_RE.search(bytes(header))
+            if not match:
+                raise ValueError("not an MHTML file (no multipart boundary)")
+            boundary = match.group(1) or match.group(2)
+            delimiter = b"--" + boundary
+
+            preamble = bytes(header)
+            line = f.readline()
+            while line and not line.startswith(delimiter):
+                preamble += line
+                line = f.readline()
+
+            epilogue = b""
+            while line:
+                if line.rstrip(b"\r\n") == delimiter + b"--":
+                    epilogue = line + f.read()
+                    break
+                delimiter_line = line
+                part_headers = bytearray()
+                line = f.readline()
+                while line and line not in (b"\r\n", b"\n"):
+                    part_headers += line
+                    line = f.readline()
+                part_headers += line
+
+                digest = hashlib.sha256()
+                size = 0
+                tmp = tempfile.NamedTemporaryFile(dir=self.blob_dir, delete=False)
+                try:
+                    line = f.readline()
+                    while line and not line.startswith(delimiter):
+                        digest.update(line)
+                        tmp.write(line)
+                        size += len(line)
+                        line = f.readline()
+                    tmp.close()
+                    blob = digest.hexdigest()
+                    self._commit_blob(tmp.name, blob, claimed)
+                except BaseException:
+                    tmp.close()
+                    os.unlink(tmp.name)
+                    raise
+                parts.append({
+                    "delimiter": delimiter_line.decode("latin-1"),
+                    "headers": bytes(part_headers).decode("latin-1"),
+                    "blob": blob,
+                    "size": size,
+                })
+
+        archive_id = hashlib.sha256(f"{url}|{time.time()}".encode()).hexdigest()[:16]
+        manifest = {
+            "id": archive_id,
+            "title": title,
+            "url": url,
+            "created": time.time(),
+            "preamble": preamble.decode("latin-1"),
+            "epilogue": epilogue.decode("latin-1"),
+            "parts": parts,
+        }
+        tmp_manifest = self.manifest_path(archive_id) + ".tmp"
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_manifest, self.manifest_path(archive_id))
+        return archive_id
+
+    def _commit_blob(self, tmp_name, digest, claimed):
+        target = self.blob_path(digest)
+        with self._lock:
+            self._claimed[digest] += 1
+            claimed.append(digest)
+            if os.path.exists(target):
+                os.unlink(tmp_name)
+                return
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_name, target)
+
+    def load_manifest(self, archive_id):
+        if not archive_id.isalnum():
+            return None
+        try:
+            with open(self.manifest_path(archive_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_archives(self):
+        archives = []
+        for name in os.listdir(self.manifest_dir):
+            if name.endswith(".json"):
+                manifest = self.load_manifest(name[:-5])
+                if manifest:
+                    archives.append({key: manifest[key] for key in ("id", "title", "url", "created")})
+        archives.sort(key=lambda a: a["created"], reverse=True)
+        return archives
+
+    def segments(self, manifest):
+        # The archive as a sequence of bytes / blob paths, in file order
+        yield manifest["preamble"].encode("latin-1")
+        for part in manifest["parts"]:
+            yield (part["delimiter"] + part["headers"]).encode("latin-1")
+            yield self.blob_path(part["blob"])
+        yield manifest["epilogue"].encode("latin-1")
+
+    def delete(self, archive_id):
+        if not self.load_manifest(archive_id):
+            return False
+        os.remove(self.manifest_path(archive_id))
+        with self._lock:
+            referenced = set(self._claimed)
+            for name in os.listdir(self.manifest_dir):
+                if name.endswith(".json"):
+                    manifest = self.load_manifest(name[:-5])
+                    if manifest:
+                        referenced.update(part["blob"] for part in manifest["parts"])
+            for prefix in os.listdir(self.blob_dir):
+                prefix_dir = os.path.join(self.blob_dir, prefix)
+                if not os.path.isdir(prefix_dir):
+                    continue
+                for rest in os.listdir(prefix_dir):
+                    if prefix + rest not in referenced:
+                        os.remove(os.path.join(prefix_dir, rest))
+        return True
+
+
+class ArchiveDevice(QIODevice):
+    # Sequential device that stitches an archive back together from its
+    # manifest while Qt reads it, a chunk at a time
+    def __init__(self, store, manifest, parent=None):
+        super().__init__(parent)
+        self._segments = store.segments(manifest)
+        self._pending = b""
+        self._current = None
+        self._finished = False
+
+    def isSequential(self):
+        return True
+
+    def bytesAvailable(self):
+        return (0 if self._finished else READ_CHUNK) + super().bytesAvailable()
+
+    def atEnd(self):
+        return self._finished and super().atEnd()
+
+    def readData(self, max_size):
+        if max_size <= 0:
+            return b""
+        while not self._finished:
+            if self._pending:
+                data, self._pending = self._pending[:max_size], self._pending[max_size:]
+                return data
+            if self._current:
+                data = self._current.read(min(max_size, READ_CHUNK))
+                if data:
+                    return data
+                self._current.close()
+                self._current = None
+            segment = next(self._segments, None)
+            if segment is None:
+                self._finished = True
+            elif isinstance(segment, bytes):
+                self._pending = segment
+            else:
+                self._current = open(segment, "rb")
+        return b""
+
+    def writeData(self, data):
+        return -1
+
+    def close(self):
+        if self._current:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+class PageArchiver(QObject):
+    # Queues QWebEnginePage.save() calls (Chromium writes the MHTML file
+    # itself, outside Python) and ingests finished files on a worker thread
+    progress = pyqtSignal(int, int)
+    archived = pyqtSignal(str)
+    failed = pyqtSignal(str, str)
+    # Results come back from worker threads through a queued signal
+    _ingested = pyqtSignal(str, str, str)
+
+    def __init__(self, store, max_concurrent=MAX_CONCURRENT_SAVES, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self.queue = deque()
+        self.in_flight = {}
+        # Spool paths of saves that timed out; a download that shows up for
+        # one late is cancelled rather than handed to the download manager
+        self.abandoned = set()
+        self.total = 0
+        self.done = 0
+        self.spool_dir = os.path.join(store.root, "spool")
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._ingested.connect(self._on_ingested)
+
+    def archive(self, pages):
+        for page in pages:
+            # Title and URL are taken now; the tab may be closed before its turn
+            entry = [page, page.title(), page.url().toString(), None]
+            # Kept so the handler goes away once the entry leaves the queue
+            entry[3] = page.destroyed.connect(lambda _=None, entry=entry: self._page_destroyed(entry))
+            self.queue.append(entry)
+            self.total += 1
+        self._pump()
+
+    def _page_destroyed(self, entry):
+        if entry in self.queue:
+            self.queue.remove(entry)
+            self._count(entry[2], "", "tab closed before it was saved")
+
+    def _pump(self):
+        while self.queue and len(self.in_flight) < self.max_concurrent:
+            page, title, url, connection = self.queue.popleft()
+            page.destroyed.disconnect(connection)
+            handle, path = tempfile.mkstemp(suffix=".mhtml", dir=self.spool_dir)
+            os.close(handle)
+            path = os.path.abspath(path)
+            self.abandoned.discard(path)
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda path=path: self._timed_out(path))
+            timer.start(SAVE_TIMEOUT * 1000)
+            self.in_flight[path] = {"title": title, "url": url, "timer": timer, "download": None}
+            page.save(path, QWebEngineDownloadItem.MimeHtmlSaveFormat)
+
+    def handle_download(self, download):
+        # Returns True when the download belongs to the archiver
+        path = os.path.abspath(download.path())
+        if path in self.abandoned and path not in self.in_flight:
+            self.abandoned.discard(path)
+            download.cancel()
+            return True
+        if path not in self.in_flight:
+            return False
+        if download.state() == QWebEngineDownloadItem.DownloadRequested:
+            download.accept()
+        self.in_flight[path]["download"] = download
+        download.finished.connect(lambda: self._save_finished(download, path))
+        return True
+
+    def _timed_out(self, path):
+        save = self.in_flight.get(path)
+        if save is None:
+            return
+        if save["download"] is not None:
+            save["download"].finished.disconnect()
+            save["download"].cancel()
+        else:
+            self.abandoned.add(path)
+        self._finish(path, "", f"not saved after {SAVE_TIMEOUT} s")
+
+    def _save_finished(self, download, path):
+        save = self.in_flight[path]
+        if download.state() != QWebEngineDownloadItem.DownloadCompleted:
+            self._finish(path, "", download.interruptReasonString() or "save failed")
+            return
+        save["timer"].stop()
+        threading.Thread(target=self._ingest, args=(path, save["title"], save["url"]), daemon=True).start()
+
+    def _ingest(self, path, title, url):
+        try:
+            archive_id = self.store.ingest_mhtml(path, title, url)
+            self._ingested.emit(path, archive_id, "")
+        except Exception as e:
+            self._ingested.emit(path, "", str(e))
+
+    def _on_ingested(self, path, archive_id, error):
+        self._finish(path, archive_id, error)
+
+    def _finish(self, path, archive_id, error):
+        save = self.in_flight.pop(path)
+        save["timer"].stop()
+        save["timer"].deleteLater()
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        self._count(save["url"], archive_id, error)
+
+    def _count(self, url, archive_id, error):
+        self.done += 1
+        if archive_id:
+            self.archived.emit(archive_id)
+        else:
+            self.failed.emit(url, error)
+        self.progress.emit(self.done, self.total)
+        if self.done == self.total:
+            self.done = self.total = 0
+        self._pump()
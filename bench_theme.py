@@ -0,0 +1,127 @@
+import os
+import sys
+import time
+import statistics
+
+# Runs without a display
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QToolBar, QLineEdit, QWidget, QVBoxLayout, QTabWidget,
+    QPushButton, QListWidget, QLabel
+)
+
+from theme import ThemeManager, PRESET_THEMES
+
+OUTPUT_FILE = "bench_output.txt"
+TAB_COUNTS = (10, 50, 200)
+BOOKMARKS = 40
+ROUNDS = 5
+SWITCHES = ("dark", "blue", "purple", "light")
+
+
+def legacy_stylesheet(dark_mode, primary_color):
+    # What Browser.apply_theme used to set on the window
+    if dark_mode:
+        return """
+            QMainWindow { background-color: #121212; color: #eee; }
+            QToolBar { background-color: #222; }
+            QPushButton { background-color: #333; color: #eee; }
+            QLineEdit { background-color: #222; color: #eee; }
+        """
+    base_color = primary_color if primary_color else "#f0f0f0"
+    return f"""
+        QMainWindow {{ background-color: {base_color}; color: #000; }}
+        QToolBar {{ background-color: #ddd; }}
+        QPushButton {{ background-color: #eee; color: #000; }}
+        QLineEdit {{ background-color: #fff; color: #000; }}
+    """
+
+
+def build_window(tab_count, legacy):
+    # Same widget shape as the browser chrome; tab contents stand in for pages
+    window = QMainWindow()
+    navbar = QToolBar()
+    for label in ("←", "→", "⟳", "✕", "⌂", "★", "DS"):
+        navbar.addWidget(QPushButton(label))
+    navbar.addWidget(QLineEdit())
+    navbar.addWidget(QPushButton("+"))
+    window.addToolBar(navbar)
+    bookmarks = QToolBar("Bookmarks")
+    for i in range(BOOKMARKS):
+        btn = QPushButton(f"Bookmark {i}")
+        if legacy:
+            btn.setStyleSheet("background-color: #e0e0e0; margin: 2px; padding: 2px 8px; border-radius: 4px;")
+        bookmarks.addWidget(btn)
+    window.addToolBar(bookmarks)
+    tabs = QTabWidget()
+    for i in range(tab_count):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+        layout.addWidget(QLabel(f"Tab {i}"))
+        layout.addWidget(QLineEdit())
+        layout.addWidget(QListWidget())
+        layout.addWidget(QPushButton("Button"))
+        tabs.addTab(page, f"Tab {i}")
+    window.setCentralWidget(tabs)
+    window.resize(1200, 800)
+    window.show()
+    return window
+
+
+def time_switches(app, apply):
+    startup_started = time.perf_counter()
+    apply(*PRESET_THEMES["light"])
+    app.processEvents()
+    startup = time.perf_counter() - startup_started
+    samples = []
+    for _ in range(ROUNDS):
+        for name in SWITCHES:
+            started = time.perf_counter()
+            apply(*PRESET_THEMES[name])
+            app.processEvents()
+            samples.append(time.perf_counter() - started)
+    return startup, samples
+
+
+def run(app, tab_count):
+    results = []
+    window = build_window(tab_count, legacy=True)
+    app.processEvents()
+    results.append(("window stylesheet",) +
+                   time_switches(app, lambda dark, color: window.setStyleSheet(legacy_stylesheet(dark, color))))
+    # Dropping the last reference deletes it; deleteLater() needs an event loop
+    window.close()
+    del window
+    app.processEvents()
+
+    window = build_window(tab_count, legacy=False)
+    app.processEvents()
+    manager = ThemeManager(app)
+    results.append(("palette",) + time_switches(app, manager.apply))
+    # The last switch was to light; make sure it reached the widgets
+    assert window.centralWidget().palette() == manager.palette(*PRESET_THEMES[SWITCHES[-1]])
+    window.close()
+    del window
+    app.processEvents()
+    return results
+
+
+def main():
+    app = QApplication(sys.argv)
+    # ThemeManager switches to Fusion; both runs use it so only theming differs
+    app.setStyle("Fusion")
+    lines = [f"Theme switch timings ({ROUNDS} rounds of {', '.join(SWITCHES)}; {BOOKMARKS} bookmarks)"]
+    for tab_count in TAB_COUNTS:
+        for name, startup, samples in run(app, tab_count):
+            lines.append(f"{tab_count:4d} tabs  {name:<18} first {startup * 1000:8.2f} ms  "
+                         f"switch median {statistics.median(samples) * 1000:8.2f} ms  "
+                         f"max {max(samples) * 1000:8.2f} ms")
+    report = "\n".join(lines)
+    print(report)
+    with open(OUTPUT_FILE, "w") as f:
+        f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,555 @@
+import os
+import sys
+import json
+import time
+import socket
+import select
+import hashlib
+import argparse
+import tempfile
+import threading
+import http.client
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime, formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+PROXY_CACHE_DIR = "proxy_cache"
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+MAX_OBJECT_BYTES = 32 * 1024 * 1024
+UPSTREAM_TIMEOUT = 30
+COPY_CHUNK = 64 * 1024
+# Heuristic freshness for responses with only Last-Modified (RFC 9111 4.2.2)
+HEURISTIC_FRACTION = 0.1
+MAX_HEURISTIC_LIFETIME = 24 * 3600
+
+CACHEABLE_STATUS = {200, 203, 204, 300, 301, 308, 404, 410}
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-connection", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade",
+}
+# Never written to disk, whatever the response says
+PRIVATE_HEADERS = {"set-cookie", "set-cookie2", "authorization", "www-authenticate", "authentication-info"}
+# Rewritten on every cache hit
+SERVED_HEADERS = {"content-length", "age", "x-cache"}
+
+
+def parse_cache_control(value):
+    directives = {}
+    for item in (value or "").split(","):
+        name, _, arg = item.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _seconds(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _get(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def freshness_lifetime(status, headers):
+    cc = parse_cache_control(_get(headers, "cache-control"))
+    for directive in ("s-maxage", "max-age"):
+        if directive in cc:
+            return _seconds(cc[directive]) or 0
+    date = _http_date(_get(headers, "date")) or time.time()
+    expires = _get(headers, "expires")
+    if expires is not None:
+        expires_at = _http_date(expires)
+        return max(0, int(expires_at - date)) if expires_at else 0
+    last_modified = _http_date(_get(headers, "last-modified"))
+    if last_modified and status in (200, 203, 300, 301, 404, 410):
+        return int(min(MAX_HEURISTIC_LIFETIME, max(0, date - last_modified) * HEURISTIC_FRACTION))
+    return 0
+
+
+def is_storable(method, request_headers, status, headers):
+    # Shared-cache rules: only responses that are safe to hand to anyone
+    if method != "GET" or status not in CACHEABLE_STATUS:
+        return False
+    if "no-store" in parse_cache_control(request_headers.get("Cache-Control")):
+        return False
+    cc = parse_cache_control(_get(headers, "cache-control"))
+    if "no-store" in cc or "private" in cc:
+        return False
+    vary = {v.strip().lower() for v in (_get(headers, "vary") or "").split(",") if v.strip()}
+    if vary - {"accept-encoding"}:
+        return False
+    credentialed = "Authorization" in request_headers or "Cookie" in request_headers or \
+        _get(headers, "set-cookie") is not None
+    if credentialed and "public" not in cc and "s-maxage" not in cc:
+        return False
+    has_validator = _get(headers, "etag") is not None or _get(headers, "last-modified") is not None
+    return has_validator or freshness_lifetime(status, headers) > 0
+
+
+class CacheWriter:
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        self.file = tempfile.NamedTemporaryFile(dir=cache.root, prefix="tmp", delete=False)
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > MAX_OBJECT_BYTES:
+            self.abort()
+            return False
+        self.file.write(data)
+        return True
+
+    def abort(self):
+        if self.file:
+            self.file.close()
+            os.unlink(self.file.name)
+            self.file = None
+
+    def commit(self, meta):
+        if not self.file:
+            return
+        self.file.close()
+        meta["size"] = self.size
+        self.cache._commit(self.key, self.file.name, meta)
+        self.file = None
+
+
+class ProxyCache:
+    # Disk store with one .body and one .meta file per URL. The index keeps
+    # keys in least-recently-used order; a hit moves its key to the end.
+    def __init__(self, root=PROXY_CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._index = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "evicted": 0,
+                      "uncacheable": 0, "bytes_from_cache": 0}
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def count(self, stat, amount=1):
+        # Handler threads update these concurrently
+        with self._lock:
+            self.stats[stat] += amount
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key[:2], key)
+        return base + ".meta", base + ".body"
+
+    def _load_index(self):
+        entries = []
+        for prefix in os.listdir(self.root):
+            prefix_dir = os.path.join(self.root, prefix)
+            if prefix.startswith("tmp"):
+                os.remove(prefix_dir)
+                continue
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in os.listdir(prefix_dir):
+                if not name.endswith(".meta"):
+                    continue
+                meta_path, body_path = self._paths(name[:-5])
+                try:
+                    stat = os.stat(meta_path)
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size + os.path.getsize(body_path)))
+                except OSError:
+                    continue
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total += size
+        self._evict()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def lookup(self, url, request_headers):
+        key = self.key(url)
+        with self._lock:
+            if key not in self._index:
+                return None
+        meta_path, body_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta["url"] != url or meta.get("accept_encoding") not in \
+                (None, request_headers.get("Accept-Encoding", "")):
+            return None
+        return meta, body_path
+
+    def is_fresh(self, meta, now=None):
+        if meta.get("no_cache"):
+            return False
+        return self.current_age(meta, now) < meta["lifetime"]
+
+    @staticmethod
+    def current_age(meta, now=None):
+        return meta["age"] + max(0, (now or time.time()) - meta["stored"])
+
+    def touch(self, url):
+        key = self.key(url)
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            os.utime(self._paths(key)[0])
+        except OSError:
+            pass
+
+    def writer(self, url):
+        return CacheWriter(self, self.key(url))
+
+    def make_meta(self, url, status, reason, headers, request_headers):
+        vary = (_get(headers, "vary") or "").lower()
+        cc = parse_cache_control(_get(headers, "cache-control"))
+        return {
+            "url": url,
+            "status": status,
+            "reason": reason,
+            "headers": [[k, v] for k, v in headers
+                        if k.lower() not in PRIVATE_HEADERS and k.lower() not in HOP_BY_HOP
+                        and k.lower() not in SERVED_HEADERS],
+            "stored": time.time(),
+            "age": _seconds(_get(headers, "age")) or 0,
+            "lifetime": freshness_lifetime(status, headers),
+            "no_cache": "no-cache" in cc,
+            "accept_encoding": request_headers.get("Accept-Encoding", "") if "accept-encoding" in vary else None,
+        }
+
+    def refresh(self, meta, headers):
+        # 304 Not Modified: take the new headers, keep the stored body
+        updated = {k.lower() for k, _ in headers}
+        kept = [[k, v] for k, v in meta["headers"] if k.lower() not in updated]
+        new = [[k, v] for k, v in headers if k.lower() not in PRIVATE_HEADERS and
+               k.lower() not in HOP_BY_HOP and k.lower() not in SERVED_HEADERS]
+        meta["headers"] = kept + new
+        meta["stored"] = time.time()
+        meta["age"] = _seconds(_get(headers, "age")) or 0
+        meta["lifetime"] = freshness_lifetime(meta["status"], meta["headers"])
+        key = self.key(meta["url"])
+        meta_path, _ = self._paths(key)
+        self._write_meta(meta_path, meta)
+        self.touch(meta["url"])
+
+    def _write_meta(self, meta_path, meta):
+        tmp = meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+
+    def _commit(self, key, body_tmp, meta):
+        meta_path, body_path = self._paths(key)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        # Body first: a .meta file only ever points at a complete body
+        os.replace(body_tmp, body_path)
+        self._write_meta(meta_path, meta)
+        size = meta["size"] + os.path.getsize(meta_path)
+        with self._lock:
+            self.total += size - self._index.pop(key, 0)
+            self._index[key] = size
+        self.count("stored")
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            victims = []
+            while self.total > self.max_bytes and self._index:
+                key, size = self._index.popitem(last=False)
+                self.total -= size
+                victims.append(key)
+        self.count("evicted", len(victims))
+        for key in victims:
+            for path in self._paths(key):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "PhoenixRoseProxy/1.0"
+
+    def setup(self):
+        super().setup()
+        # Upstream keep-alive connections, one per origin, for this client connection
+        self.upstream = {}
+
+    def finish(self):
+        for conn in self.upstream.values():
+            conn.close()
+        super().finish()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_CONNECT(self):
+        # HTTPS is tunnelled untouched; it can't be cached without terminating TLS
+        host, _, port = self.path.rpartition(":")
+        try:
+            upstream = socket.create_connection((host, int(port)), timeout=UPSTREAM_TIMEOUT)
+        except (OSError, ValueError):
+            self.send_error(502)
+            return
+        self.send_response_only(200, "Connection Established")
+        self.end_headers()
+        self.close_connection = True
+        sockets = [self.connection, upstream]
+        try:
+            while True:
+                readable, _, failed = select.select(sockets, [], sockets, UPSTREAM_TIMEOUT * 4)
+                if failed or not readable:
+                    break
+                for sock in readable:
+                    data = sock.recv(COPY_CHUNK)
+                    if not data:
+                        return
+                    (upstream if sock is self.connection else self.connection).sendall(data)
+        except OSError:
+            pass
+        finally:
+            upstream.close()
+
+    def do_GET(self):
+        self.proxy_request()
+
+    do_HEAD = do_POST = do_PUT = do_DELETE = do_OPTIONS = do_PATCH = do_GET
+
+    def _request_headers(self):
+        connection_tokens = {t.strip().lower() for t in self.headers.get("Connection", "").split(",")}
+        headers = {}
+        for key, value in self.headers.items():
+            lower = key.lower()
+            if lower not in HOP_BY_HOP and lower not in connection_tokens:
+                headers[key] = value
+        return headers
+
+    def _request_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";", 1)[0], 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else None
+
+    def _send_upstream(self, scheme_host, host, port, path, headers, body):
+        idempotent = self.command in ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+        for attempt in range(2):
+            conn = self.upstream.get(scheme_host)
+            if conn is None:
+                conn = self.upstream[scheme_host] = http.client.HTTPConnection(
+                    host, port, timeout=UPSTREAM_TIMEOUT)
+            try:
+                conn.request(self.command, path, body, headers)
+                return conn, conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # Stale keep-alive connection; retry once on a fresh one
+                conn.close()
+                del self.upstream[scheme_host]
+                if attempt or not idempotent:
+                    raise
+
+    def proxy_request(self):
+        cache = self.server.cache
+        url = self.path
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            self.send_error(400, "Only absolute http:// URLs can be proxied")
+            return
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        headers = self._request_headers()
+        body = self._request_body()
+
+        cached = None
+        request_cc = parse_cache_control(headers.get("Cache-Control"))
+        bypass = "no-cache" in request_cc or "no-cache" in headers.get("Pragma", "")
+        if self.command in ("GET", "HEAD") and not bypass:
+            cached = cache.lookup(url, headers)
+            if cached and cache.is_fresh(cached[0]):
+                cache.count("hits")
+                self._serve_cached(*cached)
+                return
+        revalidating = False
+        if cached and not any(h in headers for h in ("If-None-Match", "If-Modified-Since")):
+            etag = _get(cached[0]["headers"], "etag")
+            last_modified = _get(cached[0]["headers"], "last-modified")
+            if etag or last_modified:
+                revalidating = True
+                if etag:
+                    headers["If-None-Match"] = etag
+                if last_modified:
+                    headers["If-Modified-Since"] = last_modified
+
+        try:
+            conn, response = self._send_upstream(parts.scheme + "://" + parts.netloc, parts.hostname,
+                                                 parts.port or 80, path, headers, body)
+        except (OSError, http.client.HTTPException) as e:
+            self.upstream.pop(parts.scheme + "://" + parts.netloc, None)
+            self.send_error(502, f"Upstream error: {e}")
+            return
+        response_headers = response.getheaders()
+
+        if revalidating and response.status == 304:
+            response.read()
+            cache.refresh(cached[0], response_headers)
+            cache.count("revalidated")
+            self._serve_cached(*cached)
+            return
+
+        writer = None
+        if self.command == "GET":
+            length = _seconds(response.getheader("Content-Length"))
+            if is_storable(self.command, headers, response.status, response_headers) and \
+                    (length is None or length <= MAX_OBJECT_BYTES):
+                writer = cache.writer(url)
+                cache.count("misses")
+            else:
+                cache.count("uncacheable")
+        self._relay(response, response_headers, writer)
+        if writer:
+            writer.commit(cache.make_meta(url, response.status, response.reason, response_headers, headers))
+        if response.will_close:
+            conn.close()
+            self.upstream.pop(parts.scheme + "://" + parts.netloc, None)
+
+    def _relay(self, response, response_headers, writer):
+        self.send_response_only(response.status, response.reason)
+        length = response.getheader("Content-Length")
+        no_body = self.command == "HEAD" or response.status in (204, 304) or response.status < 200
+        chunked = not no_body and length is None
+        for key, value in response_headers:
+            if key.lower() not in HOP_BY_HOP:
+                self.send_header(key, value)
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if no_body:
+            response.read()
+            return
+        try:
+            while True:
+                data = response.read1(COPY_CHUNK)
+                if not data:
+                    break
+                if writer and not writer.write(data):
+                    writer = None
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data) if chunked else data)
+            if chunked:
+                self.wfile.write(b"0\r\n\r\n")
+        except BaseException:
+            if writer:
+                writer.abort()
+            self.close_connection = True
+            raise
+
+    def _serve_cached(self, meta, body_path):
+        try:
+            body = open(body_path, "rb")
+        except OSError:
+            self.send_error(502, "Cache entry vanished")
+            return
+        with body:
+            size = os.fstat(body.fileno()).st_size
+            self.send_response_only(meta["status"], meta["reason"])
+            for key, value in meta["headers"]:
+                self.send_header(key, value)
+            if not _get(meta["headers"], "date"):
+                self.send_header("Date", formatdate(usegmt=True))
+            self.send_header("Age", str(int(self.server.cache.current_age(meta))))
+            self.send_header("Content-Length", str(size))
+            self.send_header("X-Cache", "HIT")
+            self.end_headers()
+            if self.command != "HEAD":
+                while True:
+                    data = body.read(COPY_CHUNK)
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    self.server.cache.count("bytes_from_cache", len(data))
+        self.server.cache.touch(meta["url"])
+
+
+class ProxyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, cache):
+        self.cache = cache
+        super().__init__(address, ProxyHandler)
+
+
+class CachingProxy:
+    # Runs the proxy on a background thread; the browser points every
+    # profile at it through the application-wide QNetworkProxy
+    def __init__(self, cache_dir=PROXY_CACHE_DIR, max_bytes=MAX_CACHE_BYTES, host="127.0.0.1", port=0):
+        self.cache = ProxyCache(cache_dir, max_bytes)
+        self.address = (host, port)
+        self.server = None
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1] if self.server else None
+
+    def start(self):
+        if self.server:
+            return
+        self.server = ProxyServer(self.address, self.cache)
+        self.thread = threading.Thread(target=self.server.serve_forever, name="caching-proxy", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.server:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        self.server = self.thread = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PhoenixRose Web local caching proxy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--cache-dir", default=PROXY_CACHE_DIR)
+    parser.add_argument("--max-mb", type=int, default=MAX_CACHE_BYTES // (1024 * 1024))
+    args = parser.parse_args(argv)
+    server = ProxyServer((args.host, args.port), ProxyCache(args.cache_dir, args.max_mb * 1024 * 1024))
+    print(f"Caching proxy listening on {args.host}:{server.server_address[1]}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.cache.stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import os
+import re
+import mmap
+import hashlib
+import threading
+
+HASH_CHUNK = 8 * 1024 * 1024
+SHA256_RE = re.compile(r"^[0-9a-fA-F]{64}$")
+# pip-style "#sha256=<hex>" on a download URL
+URL_SHA256_RE = re.compile(r"(?:^|[&#])sha256=([0-9a-fA-F]{64})(?:&|$)")
+
+
+def normalize_sha256(text):
+    text = (text or "").strip().lower()
+    if text.startswith("sha256:"):
+        text = text[7:]
+    # sha256sum output: "<digest>  <file name>"
+    text = text.split()[0] if text else ""
+    return text if SHA256_RE.match(text) else None
+
+
+def sha256_from_url(url_fragment):
+    match = URL_SHA256_RE.search(url_fragment or "")
+    return match.group(1).lower() if match else None
+
+
+class FileHasher:
+    # SHA-256 of a file that is still being written. advance(offset) says
+    # the first offset bytes are final; a worker thread hashes up to there
+    # through mmap, so the bytes are read while they're still in the page
+    # cache and no full re-read is needed once the download is done.
+    def __init__(self, path, on_done=None):
+        self.path = path
+        self.on_done = on_done
+        self.offset = 0
+        self.digest = None
+        self.error = None
+        self._sha = hashlib.sha256()
+        self._target = 0
+        self._final = False
+        self._cancelled = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="file-hasher", daemon=True)
+        self._thread.start()
+
+    def advance(self, offset, final=False, path=None):
+        with self._cond:
+            if path:
+                self.path = path
+            self._target = max(self._target, offset)
+            self._final = self._final or final
+            self._cond.notify()
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._cancelled and self.offset >= self._target and not self._final:
+                    self._cond.wait()
+                if self._cancelled:
+                    return
+                target, final, path = self._target, self._final, self.path
+            start = self.offset
+            try:
+                self._hash_range(path, target)
+            except (OSError, ValueError) as e:
+                if not final:
+                    # e.g. the .part file was just renamed; advance() brings the new path
+                    with self._cond:
+                        self._cond.wait(0.5)
+                    continue
+                self.error = str(e)
+            if final:
+                with self._cond:
+                    if self._target > target and not self.error:
+                        continue
+                if not self.error:
+                    self.digest = self._sha.hexdigest()
+                if self.on_done:
+                    self.on_done()
+                return
+            if self.offset == start:
+                # The file is shorter than promised so far; don't spin on it
+                with self._cond:
+                    self._cond.wait(0.5)
+
+    def _hash_range(self, path, target):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            target = min(target, size)
+            if target <= self.offset:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                view = memoryview(m)
+                try:
+                    while self.offset < target and not self._cancelled:
+                        end = min(target, self.offset + HASH_CHUNK)
+                        self._sha.update(view[self.offset:end])
+                        self.offset = end
+                finally:
+                    view.release()
@@ -0,0 +1,188 @@
+import os
+import re
+import glob
+import hashlib
+
+from PyQt5.QtWebEngineWidgets import QWebEngineScript
+
+from internal_pages import INTERNAL_SCHEME
+
+USER_SCRIPTS_DIR = "userscripts"
+USER_OWNER = "user"
+# Greasemonkey's @run-at values
+RUN_AT = {
+    "document-start": QWebEngineScript.DocumentCreation,
+    "document-end": QWebEngineScript.DocumentReady,
+    "document-idle": QWebEngineScript.Deferred,
+}
+# @inject-into values, plus Qt's names; anything else must be a world number
+WORLDS = {
+    "page": QWebEngineScript.MainWorld,
+    "main": QWebEngineScript.MainWorld,
+    "application": QWebEngineScript.ApplicationWorld,
+    "content": QWebEngineScript.UserWorld,
+    "isolated": QWebEngineScript.UserWorld,
+    "auto": QWebEngineScript.UserWorld,
+}
+MAX_WORLD_ID = 256
+# Without @match or @include, scripts only run on web pages, never on internal ones
+DEFAULT_MATCHES = ("*://*/*",)
+METADATA_RE = re.compile(r"^\s*//\s*==UserScript==\s*$(.*?)^\s*//\s*==/UserScript==\s*$\n?", re.M | re.S)
+KEY_RE = re.compile(r"^\s*//\s*@([\w:-]+)(?:[ \t]+(.*?))?\s*$", re.M)
+
+
+def parse_metadata(source):
+    # Greasemonkey metadata block -> ({key: [values]}, source without the block)
+    match = METADATA_RE.search(source)
+    if match is None:
+        return {}, source
+    metadata = {}
+    for key, value in KEY_RE.findall(match.group(1)):
+        metadata.setdefault(key, []).append(value)
+    return metadata, source[:match.start()] + source[match.end():]
+
+
+def world_id(world):
+    if isinstance(world, int):
+        wid = world
+    elif str(world).isdigit():
+        wid = int(world)
+    else:
+        wid = WORLDS.get(str(world).lower())
+    if wid is None or not 0 <= wid <= MAX_WORLD_ID:
+        raise ValueError(f"unknown world {world!r}")
+    return wid
+
+
+class ContentScript:
+    # A script in canonical form: one metadata block we write ourselves, so
+    # QtWebEngine does the URL matching in the renderer and the same script
+    # from two owners comes out byte for byte the same
+    __slots__ = ("name", "matches", "includes", "excludes", "run_at", "world", "subframes", "body", "key")
+
+    def __init__(self, body, name="", matches=(), includes=(), excludes=(), run_at="document-end",
+                 world="isolated", subframes=False):
+        if run_at not in RUN_AT:
+            raise ValueError(f"unknown @run-at {run_at!r}")
+        self.body = body
+        self.matches = tuple(matches) or (() if includes else DEFAULT_MATCHES)
+        self.includes = tuple(includes)
+        self.excludes = tuple(excludes)
+        self.run_at = run_at
+        self.world = world_id(world)
+        self.subframes = bool(subframes)
+        self.name = name or "content script"
+        # Everything but the name, so two owners' copies of a script are one script
+        digest = hashlib.sha1()
+        for part in (body, *self.matches, "", *self.includes, "", *self.excludes, "", run_at, self.world, self.subframes):
+            digest.update(str(part).encode("utf-8") + b"\0")
+        self.key = digest.hexdigest()
+
+    @classmethod
+    def from_source(cls, source, **options):
+        # Metadata in the source wins over options, as it does for user scripts
+        metadata, body = parse_metadata(source)
+        for option, key in (("name", "name"), ("run_at", "run-at"), ("world", "inject-into"), ("world", "world")):
+            if metadata.get(key) and metadata[key][0]:
+                options[option] = metadata[key][0]
+        for option, key in (("matches", "match"), ("includes", "include"), ("excludes", "exclude")):
+            if metadata.get(key):
+                options[option] = [value for value in metadata[key] if value]
+        if metadata:
+            # Greasemonkey runs scripts in frames too, unless told @noframes
+            options.setdefault("subframes", "noframes" not in metadata)
+        return cls(body, **options)
+
+    def source(self):
+        lines = ["// ==UserScript==", f"// @name {self.name}"]
+        lines += [f"// @match {pattern}" for pattern in self.matches]
+        lines += [f"// @include {pattern}" for pattern in self.includes]
+        lines += [f"// @exclude {pattern}" for pattern in self.excludes]
+        # Internal pages talk to the browser over the web channel; no script gets near them
+        lines.append(f"// @exclude {INTERNAL_SCHEME}://*")
+        lines += [f"// @run-at {self.run_at}", "// ==/UserScript==", self.body]
+        return "\n".join(lines)
+
+    def build(self):
+        script = QWebEngineScript()
+        # Unique per script, so it can be found again in a collection
+        script.setName(f"prw-{self.key[:16]}")
+        # Qt reads the metadata block here; the explicit settings below agree with it
+        script.setSourceCode(self.source())
+        script.setInjectionPoint(RUN_AT[self.run_at])
+        script.setWorldId(self.world)
+        script.setRunsOnSubFrames(self.subframes)
+        return script
+
+    def summary(self):
+        return {"name": self.name, "matches": list(self.matches + self.includes), "excludes": list(self.excludes),
+                "run_at": self.run_at, "world": self.world, "subframes": self.subframes}
+
+
+class ContentScriptRegistry:
+    # Every content script is built once and inserted once into each
+    # attached profile's script collection; the profile then injects it
+    # into all of its pages, with no per-tab or per-load work in Python.
+    # Identical scripts from several owners are kept once. Incognito
+    # profiles are never attached.
+    def __init__(self):
+        self.profiles = []
+        # key -> [ContentScript, QWebEngineScript, owners]
+        self.scripts = {}
+
+    def attach(self, profile):
+        if profile in self.profiles:
+            return
+        self.profiles.append(profile)
+        collection = profile.scripts()
+        collection.insert([built for _, built, _ in self.scripts.values()])
+
+    def add(self, owner, script):
+        entry = self.scripts.get(script.key)
+        if entry is None:
+            built = script.build()
+            entry = self.scripts[script.key] = [script, built, set()]
+            for profile in self.profiles:
+                profile.scripts().insert(built)
+        entry[2].add(owner)
+        return script.key
+
+    def add_source(self, owner, source, **options):
+        return self.add(owner, ContentScript.from_source(source, **options))
+
+    def remove(self, owner, key):
+        entry = self.scripts.get(key)
+        if entry is None or owner not in entry[2]:
+            return False
+        entry[2].discard(owner)
+        if not entry[2]:
+            del self.scripts[key]
+            for profile in self.profiles:
+                profile.scripts().remove(entry[1])
+        return True
+
+    def owned_by(self, owner):
+        return [key for key, entry in self.scripts.items() if owner in entry[2]]
+
+    def remove_owner(self, owner):
+        for key in self.owned_by(owner):
+            self.remove(owner, key)
+
+    def load_user_scripts(self, directory=USER_SCRIPTS_DIR):
+        # *.user.js files, like Greasemonkey's
+        for path in sorted(glob.glob(os.path.join(directory, "*.user.js"))):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    source = f.read()
+                name = os.path.basename(path)[:-len(".user.js")]
+                self.add_source(USER_OWNER, source, name=name)
+            except Exception as e:
+                print(f"Error loading user script {path}: {e}")
+
+    def summary(self):
+        items = []
+        for script, _, owners in self.scripts.values():
+            item = script.summary()
+            item["owners"] = sorted(owners)
+            items.append(item)
+        return items
@@ -0,0 +1,88 @@
+import os
+import threading
+
+from adblock import base_domain, host_of
+
+DATA_SAVER_SITES_FILE = "data_saver_sites.txt"
+HEAVY_TYPES = {"image", "media", "font"}
+# The interceptor never sees response sizes, so savings are estimated from
+# typical transfer sizes per resource type (HTTP Archive medians, rounded)
+ESTIMATED_BYTES = {"image": 20 * 1024, "media": 512 * 1024, "font": 30 * 1024, "script": 25 * 1024}
+MAX_TRACKED_SITES = 256
+
+
+class DataSaver:
+    # Decides which requests to drop in data-saver mode and keeps a per-site
+    # tally of what was dropped. should_block runs on Chromium's IO thread.
+    def __init__(self, sites_file=DATA_SAVER_SITES_FILE):
+        self.sites_file = sites_file
+        self.enabled = False
+        self.allowed_sites = set()
+        self.saved = {}
+        self._lock = threading.Lock()
+        self.load_sites()
+
+    def load_sites(self):
+        if os.path.exists(self.sites_file):
+            try:
+                with open(self.sites_file, "r") as f:
+                    self.allowed_sites = {line.strip().lower() for line in f if line.strip()}
+            except Exception as e:
+                print(f"Error loading data saver sites: {e}")
+
+    def save_sites(self):
+        try:
+            with open(self.sites_file, "w") as f:
+                for site in sorted(self.allowed_sites):
+                    f.write(site + "\n")
+        except Exception as e:
+            print(f"Error saving data saver sites: {e}")
+
+    def site_of(self, url):
+        host = host_of(url)
+        return base_domain(host) if host else ""
+
+    def is_allowed(self, url):
+        return self.site_of(url) in self.allowed_sites
+
+    def set_allowed(self, url, allowed):
+        site = self.site_of(url)
+        if not site:
+            return
+        if allowed:
+            self.allowed_sites.add(site)
+        else:
+            self.allowed_sites.discard(site)
+        self.save_sites()
+
+    def page_started(self, page_url):
+        # A main-frame navigation starts the site's tally over. Keyed by site:
+        # the interceptor's first-party URL is the site for cookies, not the page.
+        with self._lock:
+            self.saved.pop(self.site_of(page_url), None)
+
+    def should_block(self, url, first_party_url, resource_type):
+        if not self.enabled or not first_party_url:
+            return False
+        page_site = self.site_of(first_party_url)
+        if page_site in self.allowed_sites:
+            return False
+        heavy = resource_type in HEAVY_TYPES
+        third_party_script = resource_type == "script" and self.site_of(url) != page_site
+        if not (heavy or third_party_script):
+            return False
+        with self._lock:
+            counts = self.saved.get(page_site)
+            if counts is None:
+                if len(self.saved) >= MAX_TRACKED_SITES:
+                    self.saved.pop(next(iter(self.saved)))
+                counts = self.saved[page_site] = [0, 0]
+            counts[0] += 1
+            counts[1] += ESTIMATED_BYTES.get(resource_type, 0)
+        return True
+
+    def page_savings(self, page_url):
+        # (requests, estimated bytes) saved on page_url's site since its last
+        # main-frame navigation
+        with self._lock:
+            return tuple(self.saved.get(self.site_of(page_url), (0, 0)))
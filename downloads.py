@@ -0,0 +1,830 @@
+import os
+import json
+import time
+import threading
+
+from PyQt5.QtCore import Qt, QObject, QTimer, QUrl, QStandardPaths, pyqtSignal
+from PyQt5.QtGui import QDesktopServices
+from PyQt5.QtWidgets import (
+    QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton,
+    QScrollArea, QFileDialog, QSpinBox, QLineEdit
+)
+from PyQt5.QtWebEngineWidgets import QWebEngineDownloadItem
+
+from segmented import SegmentedFetcher, Segment, MIN_SEGMENTED_SIZE, probe
+from checksum import FileHasher, normalize_sha256, sha256_from_url
+
+DOWNLOAD_SETTINGS_FILE = "download_settings.json"
+DOWNLOAD_STATE_FILE = "downloads.json"
+MAX_CONCURRENT_DOWNLOADS = 3
+PANEL_REFRESH_INTERVAL = 500
+PROGRESS_POLL_INTERVAL = 250
+STATE_SAVE_INTERVAL = 5000
+AUTO_RESUME_ATTEMPTS = 5
+AUTO_RESUME_DELAY = 5000
+# Smaller downloads just start over; not worth a probe request
+MIN_RESUMABLE_SIZE = 1024 * 1024
+# Weight of the newest sample in the smoothed download speed
+SPEED_SMOOTHING = 0.3
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+PAUSED = "paused"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+FINISHED_STATES = (COMPLETED, CANCELLED, INTERRUPTED)
+
+
+def default_download_dir():
+    return QStandardPaths.writableLocation(QStandardPaths.DownloadLocation) or os.path.abspath("downloads")
+
+
+def unique_path(directory, name, reserved=()):
+    # "file.zip" -> "file (1).zip" if the name is on disk or taken by a queued download
+    name = os.path.basename(name) or "download"
+    stem, ext = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    n = 1
+    while os.path.exists(path) or path in reserved:
+        path = os.path.join(directory, f"{stem} ({n}){ext}")
+        n += 1
+    return path
+
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} h {seconds % 3600 // 60} min"
+    if seconds >= 60:
+        return f"{seconds // 60} min {seconds % 60} s"
+    return f"{seconds} s"
+
+
+class Download(QObject):
+    # One entry in the download manager, whoever moves the bytes
+    finished = pyqtSignal()
+    verified = pyqtSignal()
+    _hashed = pyqtSignal()
+
+    def __init__(self, url, path, parent=None):
+        super().__init__(parent)
+        self.url = url
+        self.path = path
+        self.state = QUEUED
+        self.error = ""
+        self.received = 0
+        self.total = 0
+        self.speed = 0.0
+        self.connections = 0
+        # Saved across restarts; never set for incognito downloads
+        self.persist = False
+        self.expected_sha256 = None
+        self.sha256 = None
+        self.hash_error = ""
+        self.hasher = None
+        self._sample = None
+        self._hashed.connect(self._hash_finished)
+
+    def update_progress(self, received, total):
+        now = time.monotonic()
+        if self._sample:
+            elapsed = now - self._sample[0]
+            if elapsed >= 0.2:
+                rate = (received - self._sample[1]) / elapsed
+                self.speed = rate if not self.speed else \
+                    SPEED_SMOOTHING * rate + (1 - SPEED_SMOOTHING) * self.speed
+                self._sample = (now, received)
+        else:
+            self._sample = (now, received)
+        self.received = received
+        self.total = total
+
+    def eta(self):
+        if self.state != DOWNLOADING or self.total <= 0 or self.speed <= 0:
+            return None
+        return max(0, self.total - self.received) / self.speed
+
+    def start(self):
+        self.state = DOWNLOADING
+        self._sample = None
+        self.speed = 0.0
+
+    def pause(self):
+        self.state = PAUSED
+        self.speed = 0.0
+
+    def hold(self):
+        # Called when the download is added while every slot is taken
+        pass
+
+    def cancel(self):
+        self._finish(CANCELLED)
+
+    def snapshot(self):
+        # What it takes to resume after a restart, or None
+        return None
+
+    def set_expected_sha256(self, digest):
+        self.expected_sha256 = digest
+        if self.sha256:
+            self.verified.emit()
+
+    def is_hashing(self):
+        return self.hasher is not None and self.sha256 is None and not self.hash_error
+
+    def hash_progress(self):
+        return self.hasher.offset if self.hasher else 0
+
+    def sha256_matches(self):
+        # None until there's both a digest and something to compare it with
+        if not self.sha256 or not self.expected_sha256:
+            return None
+        return self.sha256 == self.expected_sha256
+
+    def _hash_to(self, offset, final=False, path=None):
+        # The hash runs on its own thread; _hashed comes back queued
+        if self.hasher is None:
+            self.hasher = FileHasher(path or self.path, self._hashed.emit)
+        self.hasher.advance(offset, final, path)
+
+    def _hash_finished(self):
+        self.sha256 = self.hasher.digest
+        self.hash_error = self.hasher.error or ""
+        self.verified.emit()
+
+    def _finish(self, state, error=""):
+        if self.state in FINISHED_STATES:
+            return
+        self.state = state
+        self.error = error
+        self.speed = 0.0
+        if state == COMPLETED:
+            self._hash_to(self.received, final=True, path=self.path)
+        elif state == CANCELLED and self.hasher:
+            self.hasher.cancel()
+        self.finished.emit()
+
+
+class RangeDownload(Download):
+    # Bytes fetched with range requests by SegmentedFetcher. Its state is
+    # just the ranges still missing, which is what gets saved to resume it.
+    _fetch_done = pyqtSignal()
+
+    def __init__(self, url, path, part_path=None, total=0, validator=None, headers=None, segments=None,
+                 parent=None):
+        super().__init__(url, path, parent)
+        self.part_path = part_path or path + ".part"
+        self.headers = dict(headers or {})
+        self.validator = validator
+        self.total = total
+        self.persist = True
+        self.auto_resumes = 0
+        self.fetcher = None
+        self._thread = None
+        if total:
+            self.fetcher = SegmentedFetcher(url, self.part_path, total, validator, self.headers, segments=segments)
+            self.received = self.fetcher.received
+        self._fetch_done.connect(self._fetch_finished)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(PROGRESS_POLL_INTERVAL)
+        self.poll_timer.timeout.connect(self._poll)
+
+    def start(self):
+        super().start()
+        self._run_fetcher()
+
+    def _run_fetcher(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._fetch, daemon=True)
+        self._thread.start()
+        self.poll_timer.start()
+
+    def _fetch(self):
+        try:
+            self.fetcher.run()
+        except OSError as e:
+            self.fetcher.error = str(e)
+        self._fetch_done.emit()
+
+    def _poll(self):
+        self.update_progress(self.fetcher.received, self.fetcher.total)
+        self.connections = self.fetcher.connections
+        # Hashed while the bytes are still in the page cache
+        self._hash_to(self.fetcher.contiguous(), path=self.part_path)
+
+    def _fetch_finished(self):
+        self.poll_timer.stop()
+        self._poll()
+        self.connections = 0
+        if self.state == CANCELLED:
+            self._remove_part()
+        elif self.fetcher.is_complete():
+            try:
+                if self.part_path != self.path:
+                    os.replace(self.part_path, self.path)
+                self._finish(COMPLETED)
+            except OSError as e:
+                self._finish(INTERRUPTED, str(e))
+        elif self.fetcher.changed:
+            self._finish(INTERRUPTED, "the file changed on the server; start the download again")
+        elif self.fetcher.error and self.state == DOWNLOADING:
+            # Every segment ran out of retries, e.g. the link is down.
+            # Keep the bytes and try again later, from where it stopped.
+            if self.auto_resumes < AUTO_RESUME_ATTEMPTS:
+                self.auto_resumes += 1
+                QTimer.singleShot(AUTO_RESUME_DELAY * 2 ** (self.auto_resumes - 1), self._auto_resume)
+            else:
+                self._finish(INTERRUPTED, self.fetcher.error)
+
+    def _auto_resume(self):
+        if self.state == DOWNLOADING:
+            self._run_fetcher()
+
+    def _remove_part(self):
+        try:
+            os.remove(self.part_path)
+        except OSError:
+            pass
+
+    def pause(self):
+        super().pause()
+        if self.fetcher:
+            self.fetcher.stop()
+
+    def cancel(self):
+        if self.fetcher:
+            self.fetcher.stop()
+        super().cancel()
+        if not (self._thread and self._thread.is_alive()):
+            self._remove_part()
+
+    def wait(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def snapshot(self):
+        if not self.fetcher or self.fetcher.changed:
+            return None
+        return {
+            "url": self.fetcher.url,
+            "path": self.path,
+            "part_path": self.part_path,
+            "total": self.total,
+            "validator": self.validator,
+            "segments": [[s.pos, s.end] for s in self.fetcher.segments if s.remaining() > 0],
+            "sha256": self.expected_sha256,
+        }
+
+
+class WebEngineDownload(RangeDownload):
+    # Starts out as a download QtWebEngine fetches itself. When the server
+    # takes range requests it can switch to a SegmentedFetcher: straight
+    # away for large files (segmented), or to resume from where QtWebEngine
+    # stopped after an interruption. Queued items are accepted and paused
+    # straight away: an item left unaccepted would be cancelled.
+    _probed = pyqtSignal(object)
+
+    def __init__(self, item, path, segmented=False, resumable=False, user_agent="", parent=None):
+        super().__init__(item.url().toString(), path, headers={"User-Agent": user_agent} if user_agent else None,
+                         parent=parent)
+        self.item = item
+        self.total = max(0, item.totalBytes())
+        self.segmented = segmented
+        self.persist = resumable or segmented
+        # (final_url, total, validator) once the server is known to take ranges
+        self.range_info = None
+        self._probing = False
+        self._probed.connect(self._probe_finished)
+        item.setDownloadDirectory(os.path.dirname(path))
+        item.setDownloadFileName(os.path.basename(path))
+        item.downloadProgress.connect(self.update_progress)
+        item.finished.connect(self._item_finished)
+        item.accept()
+        if segmented:
+            # Held until the probe answers
+            item.pause()
+        if self.persist:
+            self._probing = True
+            threading.Thread(target=lambda: self._probed.emit(probe(self.url, self.headers)),
+                             daemon=True).start()
+
+    def _probe_finished(self, result):
+        self._probing = False
+        if result and self.total and result[1] != self.total:
+            result = None
+        self.range_info = result
+        if not self.segmented or self.item is None or self.state in FINISHED_STATES:
+            return
+        self.segmented = False
+        if result:
+            self._take_over(0)
+            if self.state == DOWNLOADING:
+                self._run_fetcher()
+        elif self.state == DOWNLOADING:
+            self.item.resume()
+
+    def _take_over(self, offset):
+        # offset 0: start over into a .part file; otherwise carry on from
+        # QtWebEngine's partial file in place
+        final_url, total, validator = self.range_info
+        item, self.item = self.item, None
+        item.downloadProgress.disconnect(self.update_progress)
+        item.finished.disconnect(self._item_finished)
+        if not offset:
+            item.cancel()
+        self.part_path = self.path if offset else self.path + ".part"
+        self.total = total
+        self.validator = validator
+        segments = [Segment(offset, total)] if offset else None
+        self.fetcher = SegmentedFetcher(final_url, self.part_path, total, validator, self.headers, segments=segments)
+        self.received = self.fetcher.received
+
+    def start(self):
+        if self.item is None:
+            super().start()
+            return
+        Download.start(self)
+        if self.item.state() == QWebEngineDownloadItem.DownloadInterrupted:
+            # Retried after QtWebEngine gave up on it; snapshot() only offers
+            # that once range_info is known
+            self._resume_from_item()
+        elif not self.segmented and self.item.isPaused():
+            self.item.resume()
+
+    def pause(self):
+        if self.item is None:
+            super().pause()
+            return
+        Download.pause(self)
+        self.item.pause()
+
+    def hold(self):
+        if self.item is not None:
+            self.item.pause()
+
+    def cancel(self):
+        if self.item is None:
+            super().cancel()
+            return
+        self.item.cancel()
+        Download.cancel(self)
+
+    def _item_finished(self):
+        state = self.item.state()
+        if state == QWebEngineDownloadItem.DownloadCompleted:
+            self.received = self.total = self.item.receivedBytes()
+            self._finish(COMPLETED)
+        elif state == QWebEngineDownloadItem.DownloadCancelled:
+            self._finish(CANCELLED)
+        elif self.range_info and os.path.exists(self.path):
+            self._resume_from_item()
+        else:
+            self._finish(INTERRUPTED, self.item.interruptReasonString())
+
+    def _resume_from_item(self):
+        # Interrupted: pick up from the last byte QtWebEngine wrote, or start
+        # over when there's nothing on disk
+        offset = 0
+        if os.path.exists(self.path):
+            offset = min(self.item.receivedBytes(), os.path.getsize(self.path))
+        self._take_over(offset)
+        self._run_fetcher()
+
+    def snapshot(self):
+        if self.item is None:
+            return super().snapshot()
+        if not self.range_info:
+            return None
+        final_url, total, validator = self.range_info
+        return {
+            "url": final_url,
+            "path": self.path,
+            "part_path": self.path,
+            "total": total,
+            "validator": validator,
+            "segments": [[self.item.receivedBytes(), total]],
+            "sha256": self.expected_sha256,
+        }
+
+
+class CookieTracker(QObject):
+    # Hosts the profile holds cookies for. Segmented fetches go out without
+    # the browser's cookies, so downloads from these hosts stay in QtWebEngine.
+    def __init__(self, cookie_store, parent=None):
+        super().__init__(parent)
+        self.domains = {}
+        cookie_store.cookieAdded.connect(self._added)
+        cookie_store.cookieRemoved.connect(self._removed)
+        cookie_store.loadAllCookies()
+
+    def _added(self, cookie):
+        domain = cookie.domain().lstrip(".").lower()
+        self.domains[domain] = self.domains.get(domain, 0) + 1
+
+    def _removed(self, cookie):
+        domain = cookie.domain().lstrip(".").lower()
+        count = self.domains.get(domain, 0) - 1
+        if count > 0:
+            self.domains[domain] = count
+        else:
+            self.domains.pop(domain, None)
+
+    def has_cookies(self, host):
+        labels = host.lower().split(".")
+        return any(".".join(labels[i:]) in self.domains for i in range(len(labels)))
+
+
+class DownloadManager(QObject):
+    added = pyqtSignal(object)
+    download_finished = pyqtSignal(object)
+    verified = pyqtSignal(object)
+
+    def __init__(self, settings_file=DOWNLOAD_SETTINGS_FILE, state_file=DOWNLOAD_STATE_FILE, parent=None):
+        super().__init__(parent)
+        self.settings_file = settings_file
+        self.state_file = state_file
+        self.directory = default_download_dir()
+        self.max_concurrent = MAX_CONCURRENT_DOWNLOADS
+        self.entries = []
+        self.closing = False
+        # Set from the panel; applies to the next download that starts
+        self.next_expected_sha256 = None
+        self.load_settings()
+        # Received byte counts only matter after a crash; finished, paused
+        # and cancelled downloads save straight away
+        self.save_timer = QTimer(self)
+        self.save_timer.setInterval(STATE_SAVE_INTERVAL)
+        self.save_timer.timeout.connect(self.save_state)
+
+    def load_settings(self):
+        if os.path.exists(self.settings_file):
+            try:
+                with open(self.settings_file, "r") as f:
+                    settings = json.load(f)
+                self.directory = settings.get("directory", self.directory)
+                self.max_concurrent = max(1, int(settings.get("max_concurrent", self.max_concurrent)))
+            except Exception as e:
+                print(f"Error loading download settings: {e}")
+
+    def save_settings(self):
+        try:
+            with open(self.settings_file, "w") as f:
+                json.dump({"directory": self.directory, "max_concurrent": self.max_concurrent}, f)
+        except Exception as e:
+            print(f"Error saving download settings: {e}")
+
+    def set_directory(self, directory):
+        self.directory = directory
+        self.save_settings()
+
+    def set_max_concurrent(self, count):
+        self.max_concurrent = max(1, count)
+        self.save_settings()
+        self._pump()
+
+    def reserved_paths(self):
+        return {entry.path for entry in self.entries if entry.state not in FINISHED_STATES}
+
+    def add_item(self, item, segmented=False, resumable=False, user_agent=""):
+        # segmented: the caller has checked the download doesn't depend on
+        # the profile's cookies. resumable: it may be saved to disk and
+        # resumed after a restart. The manager checks the rest.
+        os.makedirs(self.directory, exist_ok=True)
+        name = item.downloadFileName() or item.suggestedFileName()
+        path = unique_path(self.directory, name, self.reserved_paths())
+        http = item.url().scheme() in ("http", "https")
+        entry = WebEngineDownload(
+            item, path,
+            segmented=segmented and http and item.totalBytes() >= MIN_SEGMENTED_SIZE,
+            resumable=resumable and http and item.totalBytes() >= MIN_RESUMABLE_SIZE,
+            user_agent=user_agent, parent=self)
+        # "#sha256=<hex>" on the link wins over the one typed in the panel
+        entry.expected_sha256 = sha256_from_url(item.url().fragment()) or self.next_expected_sha256
+        self.next_expected_sha256 = None
+        self.add(entry)
+        return entry
+
+    def add(self, entry):
+        entry.finished.connect(lambda entry=entry: self._entry_finished(entry))
+        entry.verified.connect(lambda entry=entry: self.verified.emit(entry))
+        self.entries.append(entry)
+        self.added.emit(entry)
+        if self.active_count() >= self.max_concurrent:
+            entry.hold()
+        self._pump()
+        if entry.persist:
+            self.save_state()
+            self.save_timer.start()
+
+    def save_state(self):
+        if self.closing:
+            return
+        downloads = []
+        for entry in self.entries:
+            if not entry.persist or entry.state in (COMPLETED, CANCELLED):
+                continue
+            snapshot = entry.snapshot()
+            if snapshot:
+                snapshot["state"] = entry.state
+                snapshot["headers"] = entry.headers
+                downloads.append(snapshot)
+        if not downloads and not os.path.exists(self.state_file):
+            return
+        try:
+            tmp = self.state_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(downloads, f)
+            os.replace(tmp, self.state_file)
+        except Exception as e:
+            print(f"Error saving download state: {e}")
+        if not any(entry.state == DOWNLOADING for entry in self.entries):
+            self.save_timer.stop()
+
+    def load_state(self):
+        # Downloads that were running or interrupted when the browser last
+        # closed carry on from their last saved byte
+        if not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file, "r") as f:
+                downloads = json.load(f)
+        except Exception as e:
+            print(f"Error loading download state: {e}")
+            return
+        for saved in downloads:
+            total = saved["total"]
+            segments = [Segment(pos, end) for pos, end in saved["segments"]]
+            part_path = saved["part_path"]
+            if not saved.get("validator") or not os.path.exists(part_path):
+                # Nothing to check the partial bytes against: start over
+                segments = [Segment(0, total)]
+            elif part_path == saved["path"]:
+                # QtWebEngine's own partial file, written front to back
+                size = os.path.getsize(part_path)
+                for segment in segments:
+                    segment.pos = segment.start = min(segment.pos, size)
+            entry = RangeDownload(saved["url"], saved["path"], part_path, total, saved.get("validator"),
+                                  saved.get("headers"), segments, self)
+            entry.state = PAUSED if saved.get("state") == PAUSED else QUEUED
+            entry.expected_sha256 = saved.get("sha256")
+            self.add(entry)
+
+    def shutdown(self):
+        # Stop the range fetchers so their saved offsets are final
+        for entry in self.entries:
+            if isinstance(entry, RangeDownload) and entry.fetcher and entry.state == DOWNLOADING:
+                entry.fetcher.stop()
+                entry.wait(2)
+        self.save_state()
+        # QtWebEngine cancels its own downloads on exit; keep them resumable
+        self.closing = True
+
+    def active_count(self):
+        return sum(1 for entry in self.entries if entry.state == DOWNLOADING)
+
+    def _pump(self):
+        for entry in self.entries:
+            if self.active_count() >= self.max_concurrent:
+                break
+            if entry.state == QUEUED:
+                entry.start()
+
+    def pause(self, entry):
+        if entry.state in (DOWNLOADING, QUEUED):
+            entry.pause()
+            self._pump()
+            if entry.persist:
+                self.save_state()
+
+    def resume(self, entry):
+        if entry.state == INTERRUPTED and entry.snapshot():
+            entry.auto_resumes = 0
+        elif entry.state != PAUSED:
+            return
+        # Back of the line if every slot is taken
+        entry.state = QUEUED
+        self._pump()
+        if entry.persist:
+            self.save_timer.start()
+
+    def cancel(self, entry):
+        if entry.state not in FINISHED_STATES:
+            entry.cancel()
+
+    def clear_finished(self):
+        kept = []
+        for entry in self.entries:
+            if entry.state in FINISHED_STATES:
+                entry.deleteLater()
+            else:
+                kept.append(entry)
+        self.entries = kept
+
+    def _entry_finished(self, entry):
+        self.download_finished.emit(entry)
+        self._pump()
+        if entry.persist:
+            self.save_state()
+
+
+class DownloadRow(QWidget):
+    def __init__(self, manager, entry, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.entry = entry
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(4, 2, 4, 2)
+
+        text = QVBoxLayout()
+        self.name_label = QLabel(os.path.basename(entry.path))
+        self.name_label.setToolTip(entry.url)
+        self.status_label = QLabel()
+        self.progress = QProgressBar()
+        self.progress.setMaximumHeight(10)
+        self.progress.setTextVisible(False)
+        self.sha_label = QLabel()
+        self.sha_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.sha_edit = QLineEdit()
+        self.sha_edit.setPlaceholderText("Expected SHA-256 (optional)")
+        self.sha_edit.editingFinished.connect(self.set_expected_sha256)
+        text.addWidget(self.name_label)
+        text.addWidget(self.progress)
+        text.addWidget(self.status_label)
+        text.addWidget(self.sha_label)
+        text.addWidget(self.sha_edit)
+        layout.addLayout(text, 1)
+
+        self.pause_btn = QPushButton("Pause")
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        layout.addWidget(self.pause_btn)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(lambda: self.manager.cancel(self.entry))
+        layout.addWidget(self.cancel_btn)
+        self.open_btn = QPushButton("Open")
+        self.open_btn.clicked.connect(lambda: QDesktopServices.openUrl(QUrl.fromLocalFile(self.entry.path)))
+        layout.addWidget(self.open_btn)
+        self.refresh()
+
+    def set_expected_sha256(self):
+        text = self.sha_edit.text().strip()
+        if not text:
+            return
+        digest = normalize_sha256(text)
+        if digest is None:
+            self.sha_edit.setStyleSheet("color: red;")
+            return
+        self.sha_edit.setStyleSheet("")
+        self.entry.set_expected_sha256(digest)
+        if self.entry.persist:
+            self.manager.save_state()
+        self.refresh()
+
+    def toggle_pause(self):
+        if self.entry.state in (PAUSED, INTERRUPTED):
+            self.manager.resume(self.entry)
+        else:
+            self.manager.pause(self.entry)
+        self.refresh()
+
+    def refresh(self):
+        entry = self.entry
+        if entry.total > 0:
+            self.progress.setRange(0, 1000)
+            self.progress.setValue(int(1000 * entry.received / entry.total))
+        else:
+            # Unknown size: busy indicator while running
+            self.progress.setRange(0, 0 if entry.state == DOWNLOADING else 1)
+        done = format_size(entry.received)
+        if entry.total > 0:
+            done += f" of {format_size(entry.total)}"
+        if entry.state == DOWNLOADING:
+            status = done + f" — {format_size(entry.speed)}/s"
+            if entry.connections > 1:
+                status += f" — {entry.connections} connections"
+            eta = entry.eta()
+            if eta is not None:
+                status += f" — {format_duration(eta)} left"
+        elif entry.state == INTERRUPTED:
+            status = f"Failed: {entry.error}" if entry.error else "Failed"
+        elif entry.state == COMPLETED:
+            status = format_size(entry.received)
+            matches = entry.sha256_matches()
+            if entry.is_hashing():
+                hashed = entry.hash_progress() / entry.received if entry.received else 0
+                status += f" — verifying {int(100 * hashed)}%"
+            elif entry.hash_error:
+                status += f" — couldn't hash: {entry.hash_error}"
+            elif matches is not None:
+                status += " — SHA-256 matches" if matches else " — SHA-256 MISMATCH"
+        else:
+            status = f"{entry.state.capitalize()} — {done}"
+        self.status_label.setText(status)
+        self.status_label.setStyleSheet("color: red;" if entry.sha256_matches() is False else "")
+        self.sha_label.setText(f"SHA-256: {entry.sha256}" if entry.sha256 else "")
+        self.sha_label.setVisible(bool(entry.sha256))
+        self.sha_edit.setVisible(not entry.expected_sha256 and entry.state not in (CANCELLED, INTERRUPTED))
+        finished = entry.state in FINISHED_STATES
+        retry = entry.state == INTERRUPTED and entry.snapshot() is not None
+        self.pause_btn.setVisible(not finished or retry)
+        self.pause_btn.setText("Retry" if retry else "Resume" if entry.state == PAUSED else "Pause")
+        self.cancel_btn.setVisible(not finished)
+        self.open_btn.setVisible(entry.state == COMPLETED)
+
+
+class DownloadsPanel(QDockWidget):
+    # Non-modal; rows refresh on a timer rather than on every progress signal
+    def __init__(self, manager, parent=None):
+        super().__init__("Downloads", parent)
+        self.manager = manager
+        self.rows = []
+
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(4, 4, 4, 4)
+
+        header = QHBoxLayout()
+        self.folder_label = QLabel()
+        header.addWidget(self.folder_label, 1)
+        header.addWidget(QLabel("At once:"))
+        self.concurrency = QSpinBox()
+        self.concurrency.setRange(1, 16)
+        self.concurrency.setValue(manager.max_concurrent)
+        self.concurrency.valueChanged.connect(manager.set_max_concurrent)
+        header.addWidget(self.concurrency)
+        self.next_sha = QLineEdit()
+        self.next_sha.setPlaceholderText("SHA-256 for the next download")
+        self.next_sha.textChanged.connect(self.set_next_sha256)
+        header.addWidget(self.next_sha)
+        folder_btn = QPushButton("Folder...")
+        folder_btn.clicked.connect(self.choose_folder)
+        header.addWidget(folder_btn)
+        clear_btn = QPushButton("Clear Finished")
+        clear_btn.clicked.connect(self.clear_finished)
+        header.addWidget(clear_btn)
+        layout.addLayout(header)
+
+        self.list_layout = QVBoxLayout()
+        self.list_layout.addStretch(1)
+        list_widget = QWidget()
+        list_widget.setLayout(self.list_layout)
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(list_widget)
+        layout.addWidget(scroll)
+        self.setWidget(container)
+        self.update_folder_label()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(PANEL_REFRESH_INTERVAL)
+        self.timer.timeout.connect(self.refresh)
+        manager.added.connect(self.add_row)
+        manager.download_finished.connect(lambda _: self.refresh())
+        manager.verified.connect(lambda _: self.refresh())
+
+    def update_folder_label(self):
+        self.folder_label.setText(f"Saving to {self.manager.directory}")
+
+    def choose_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Download Folder", self.manager.directory)
+        if directory:
+            self.manager.set_directory(directory)
+            self.update_folder_label()
+
+    def set_next_sha256(self, text):
+        digest = normalize_sha256(text)
+        self.manager.next_expected_sha256 = digest
+        self.next_sha.setStyleSheet("color: red;" if text.strip() and digest is None else "")
+
+    def add_row(self, entry):
+        if self.manager.next_expected_sha256 is None and normalize_sha256(self.next_sha.text()):
+            # Taken by this download
+            self.next_sha.clear()
+        row = DownloadRow(self.manager, entry)
+        self.list_layout.insertWidget(0, row)
+        self.rows.append(row)
+        self.show()
+        self.timer.start()
+
+    def clear_finished(self):
+        self.manager.clear_finished()
+        for row in list(self.rows):
+            if row.entry.state in FINISHED_STATES:
+                self.rows.remove(row)
+                row.deleteLater()
+
+    def refresh(self):
+        running = False
+        for row in self.rows:
+            row.refresh()
+            running = running or row.entry.state not in FINISHED_STATES or row.entry.is_hashing()
+        if not running:
+            self.timer.stop()
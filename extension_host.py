@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import traceback
+import importlib.util
+
+# Runs one extension in a process of its own, started by extensions.py as
+# `python extension_host.py <module>`. Talks to the browser in JSON lines
+# over stdin and stdout; whatever the extension prints goes to stderr.
+
+
+class BrowserAPI:
+    # What init_extension and cleanup_extension get instead of the Browser.
+    # Every call is a message to the browser: nothing here waits for it,
+    # and answers arrive later through a callback.
+    def __init__(self, host):
+        self._host = host
+
+    def on(self, event, callback):
+        # event is "tab_created", "tab_closed", "navigation" or "load_finished";
+        # callback gets a dict describing it
+        self._host.handlers.setdefault(event, []).append(callback)
+        self._host.subscribe(event)
+
+    def open_tab(self, url, callback=None):
+        # callback gets the new tab's id
+        self._host.call("open_tab", url, callback=callback)
+
+    def navigate(self, url, tab=None):
+        # Current tab unless a tab id is given
+        self._host.call("navigate", url, tab)
+
+    def show_message(self, text, timeout=5000):
+        self._host.call("show_message", text, timeout)
+
+    def add_content_script(self, source, matches=None, run_at="document-end", world="isolated",
+                           subframes=False, callback=None):
+        # Registered once for every tab, now and later; QtWebEngine injects it
+        # into matching pages itself. A Greasemonkey metadata block in source
+        # (@match, @include, @exclude, @run-at, @inject-into) overrides the
+        # arguments. callback gets the script's id, for remove_content_script.
+        options = {"run_at": run_at, "world": world, "subframes": subframes}
+        if matches:
+            options["matches"] = list(matches)
+        self._host.call("add_content_script", source, options, callback=callback)
+
+    def remove_content_script(self, script_id):
+        self._host.call("remove_content_script", script_id)
+
+    def tabs(self, callback):
+        # callback gets [{"id", "url", "title"}, ...]; incognito tabs are left out
+        self._host.call("tabs", callback=callback)
+
+
+class ExtensionHost:
+    def __init__(self, path, out):
+        self.path = path
+        self.out = out
+        self.module = None
+        # event -> callbacks registered with BrowserAPI.on
+        self.handlers = {}
+        # Events the browser sends us
+        self.subscribed = set()
+        # call id -> callback waiting for the browser's reply
+        self.callbacks = {}
+        self.next_id = 1
+        self.api = BrowserAPI(self)
+
+    def send(self, message):
+        self.out.write(json.dumps(message) + "\n")
+        self.out.flush()
+
+    def subscribe(self, event):
+        if event not in self.subscribed:
+            self.subscribed.add(event)
+            self.send({"type": "subscribe", "event": event})
+
+    def call(self, method, *args, callback=None):
+        message = {"type": "call", "method": method, "args": list(args)}
+        if callback is not None:
+            message["id"] = self.next_id
+            self.callbacks[self.next_id] = callback
+            self.next_id += 1
+        self.send(message)
+
+    def load(self):
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+        # Helper modules next to the extension are reloaded with it; if the
+        # import fails, the old ones go back so the running code still works
+        removed = self._modules_in(directory)
+        for module_name in removed:
+            del sys.modules[module_name]
+        spec = importlib.util.spec_from_file_location(name, self.path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except Exception:
+            sys.modules.pop(name, None)
+            for module_name in self._modules_in(directory):
+                del sys.modules[module_name]
+            sys.modules.update(removed)
+            raise
+        self.module = module
+
+    def _modules_in(self, directory):
+        modules = {}
+        for module_name, module in list(sys.modules.items()):
+            module_file = getattr(module, "__file__", None)
+            if module_name != "__main__" and module_file and os.path.dirname(os.path.abspath(module_file)) == directory:
+                modules[module_name] = module
+        return modules
+
+    def reload(self):
+        # The new code is imported before the old is cleaned up, so a
+        # module that doesn't import leaves the running one alone
+        old = self.module
+        try:
+            self.load()
+        except Exception:
+            self.module = old
+            self.send({"type": "error", "error": traceback.format_exc()})
+            self.send({"type": "reloaded", "ok": False})
+            return
+        new, self.module = self.module, old
+        self.run_hook("cleanup_extension")
+        self.module = new
+        self.handlers = {}
+        # Replies meant for the old code have nowhere to go
+        self.callbacks = {}
+        self.run_hook("init_extension")
+        # Subscriptions init_extension made again were never dropped; only
+        # the rest go
+        for event in sorted(self.subscribed - set(self.handlers)):
+            self.subscribed.discard(event)
+            self.send({"type": "unsubscribe", "event": event})
+        self.send({"type": "reloaded", "ok": True,
+                   "name": getattr(self.module, "EXTENSION_NAME", self.module.__name__)})
+
+    def _safely(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception:
+            error = traceback.format_exc()
+            sys.stderr.write(error)
+            self.send({"type": "error", "error": error})
+
+    def run_hook(self, name):
+        hook = getattr(self.module, name, None)
+        if hook is not None:
+            self._safely(hook, self.api)
+
+    def handle(self, message):
+        # False once the browser asked the extension to stop
+        kind = message.get("type")
+        if kind == "ping":
+            self.send({"type": "pong", "id": message.get("id")})
+        elif kind == "event":
+            # Timed here, so the browser sees what the hooks cost rather
+            # than how long the message waited in the pipe
+            started = time.perf_counter()
+            for callback in list(self.handlers.get(message.get("event"), ())):
+                self._safely(callback, message.get("data"))
+            self.send({"type": "done", "event": message.get("event"),
+                       "ms": (time.perf_counter() - started) * 1000})
+        elif kind == "reply":
+            callback = self.callbacks.pop(message.get("id"), None)
+            if callback is not None:
+                self._safely(callback, message.get("result"))
+        elif kind == "reload":
+            self.reload()
+        elif kind == "cleanup":
+            return False
+        return True
+
+    def run(self, stdin):
+        try:
+            self.load()
+        except Exception:
+            self.send({"type": "error", "error": traceback.format_exc()})
+            return 1
+        self.send({"type": "ready", "name": getattr(self.module, "EXTENSION_NAME", self.module.__name__)})
+        self.run_hook("init_extension")
+        for line in stdin:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if not self.handle(message):
+                break
+        # Also reached when the browser went away without saying so
+        self.run_hook("cleanup_extension")
+        self.send({"type": "bye"})
+        return 0
+
+
+def main():
+    if len(sys.argv) != 2:
+        sys.stderr.write("usage: extension_host.py <extension module>\n")
+        return 2
+    out = sys.stdout
+    # The protocol owns stdout; prints from the extension go to the browser's console
+    sys.stdout = sys.stderr
+    return ExtensionHost(sys.argv[1], out).run(sys.stdin)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
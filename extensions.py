@@ -0,0 +1,593 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+from collections import deque
+
+from PyQt5.QtCore import QObject, QProcess, QTimer, QUrl, QFileSystemWatcher, pyqtSignal
+
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+HOST_SCRIPT = os.path.join(SOURCE_DIR, "extension_host.py")
+EXTENSIONS_DIR = "extensions"
+# The extensions directory, plus *Ext.py modules next to the browser like ExampleExt.py
+EXTENSION_PATTERNS = (os.path.join(EXTENSIONS_DIR, "*.py"), os.path.join(SOURCE_DIR, "*Ext.py"))
+PING_INTERVAL = 5000
+# An extension that leaves a ping unanswered this long (ms) is restarted
+HANG_TIMEOUT = 10000
+# How long cleanup_extension gets before the host is killed
+STOP_TIMEOUT = 2000
+RESTART_DELAY = 1000
+# Editors save in several steps; reload once they're done
+RELOAD_DELAY = 300
+# More crashes than this within CRASH_WINDOW seconds and the extension stays stopped
+MAX_CRASHES = 3
+CRASH_WINDOW = 60
+EXTENSION_SETTINGS_FILE = "extension_settings.json"
+# Per-event budgets (ms) for the time an extension's hooks take; override
+# them under "budgets" in the settings file
+DEFAULT_BUDGETS = {"tab_created": 20, "tab_closed": 20, "navigation": 50, "load_finished": 100}
+# Upper bounds (ms) of the hook timing histogram
+HOOK_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 1000)
+# What happens when hooks go over budget: "warn", or "disable" the
+# extension once BUDGET_STRIKES of its last BUDGET_WINDOW calls to one
+# event were over
+WARN = "warn"
+DISABLE = "disable"
+BUDGET_WINDOW = 20
+BUDGET_STRIKES = 5
+
+STARTING = "starting"
+RUNNING = "running"
+STOPPED = "stopped"
+CRASHED = "crashed"
+DISABLED = "disabled"
+
+
+def discover_extensions(patterns=EXTENSION_PATTERNS):
+    # Modules that define init_extension. Only read as text; they're
+    # imported in their own host process, never in the browser.
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            path = os.path.abspath(path)
+            if path in paths:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    if "def init_extension" in f.read():
+                        paths.append(path)
+            except (OSError, UnicodeDecodeError):
+                continue
+    return paths
+
+
+def file_digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+class HookStats:
+    # Timings of one extension's hooks for one event
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.over_budget = 0
+        self.buckets = [0] * (len(HOOK_BUCKETS) + 1)
+        # Whether each recent call was over budget
+        self.recent = deque(maxlen=BUDGET_WINDOW)
+
+    def record(self, ms, budget):
+        over = ms > budget
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.over_budget += over
+        self.recent.append(over)
+        for i, bound in enumerate(HOOK_BUCKETS):
+            if ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        return over
+
+    def strikes(self):
+        return sum(self.recent)
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket the percentile falls in
+        needed = fraction * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= needed:
+                return HOOK_BUCKETS[i] if i < len(HOOK_BUCKETS) else self.max_ms
+        return 0
+
+    def summary(self, budget):
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0,
+            "p95_ms": self.percentile(0.95),
+            "max_ms": self.max_ms,
+            "budget_ms": budget,
+            "over_budget": self.over_budget,
+            "histogram": dict(zip([f"<= {b} ms" for b in HOOK_BUCKETS] + [f"> {HOOK_BUCKETS[-1]} ms"], self.buckets)),
+        }
+
+
+class ExtensionProcess(QObject):
+    # One extension running in extension_host.py. Crashed and hung hosts
+    # are restarted unless they keep crashing.
+    message = pyqtSignal(object, object)
+    state_changed = pyqtSignal(object)
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        # What's running, so saves that change nothing don't reload
+        self.digest = file_digest(path)
+        self.key = os.path.splitext(os.path.basename(path))[0]
+        self.name = self.key
+        self.state = STOPPED
+        self.process = None
+        self.buffer = b""
+        self.error_buffer = b""
+        self.subscriptions = set()
+        self.crashes = deque()
+        self.restarts = 0
+        self.last_error = ""
+        self.ping_sent = None
+        self.stopping = False
+        self.restart_after_stop = False
+        self.disable_after_stop = False
+        # event -> HookStats; kept across restarts
+        self.hook_stats = {}
+        # Events already warned about this run
+        self.warned = set()
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_changed.emit(self)
+
+    def pid(self):
+        return self.process.processId() if self.process is not None else None
+
+    def start(self):
+        if self.process is not None:
+            return
+        self.buffer = b""
+        self.error_buffer = b""
+        self.subscriptions = set()
+        self.ping_sent = None
+        self.stopping = False
+        self.process = QProcess(self)
+        self.process.setProgram(sys.executable)
+        self.process.setArguments([HOST_SCRIPT, self.path])
+        self.process.readyReadStandardOutput.connect(self._read_stdout)
+        self.process.readyReadStandardError.connect(self._read_stderr)
+        self.process.finished.connect(self._finished)
+        self.process.errorOccurred.connect(self._error)
+        self._set_state(STARTING)
+        self.process.start()
+
+    def send(self, message):
+        if self.process is not None and not self.stopping:
+            self.process.write(json.dumps(message).encode("utf-8") + b"\n")
+
+    def stop(self):
+        # Lets cleanup_extension run, then kills the host if it doesn't exit
+        if self.process is None:
+            return
+        self.send({"type": "cleanup"})
+        self.stopping = True
+        process = self.process
+        QTimer.singleShot(STOP_TIMEOUT, lambda: process is self.process and process.kill())
+
+    def kill(self):
+        if self.process is not None:
+            self.stopping = True
+            self.process.kill()
+
+    def disable(self, reason):
+        self.last_error = reason
+        if self.process is None:
+            self._set_state(DISABLED)
+        else:
+            self.disable_after_stop = True
+            self.stop()
+
+    def restart(self):
+        self.crashes.clear()
+        self.warned = set()
+        for stats in self.hook_stats.values():
+            stats.recent.clear()
+        self.last_error = ""
+        if self.process is None:
+            self.start()
+        else:
+            self.restart_after_stop = True
+            self.stop()
+
+    def ping(self):
+        if self.state != RUNNING or self.stopping:
+            return
+        if self.ping_sent is None:
+            self.ping_sent = time.monotonic()
+            self.send({"type": "ping"})
+        elif (time.monotonic() - self.ping_sent) * 1000 > HANG_TIMEOUT:
+            self.last_error = f"Not responding for {HANG_TIMEOUT // 1000} s"
+            # Not a requested stop, so it counts as a crash and is restarted
+            self.process.kill()
+
+    def _read_stdout(self):
+        self.buffer += bytes(self.process.readAllStandardOutput())
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            kind = message.get("type")
+            if kind == "ready":
+                self.name = message.get("name") or self.key
+                self._set_state(RUNNING)
+            elif kind == "pong":
+                self.ping_sent = None
+            elif kind == "subscribe":
+                self.subscriptions.add(message.get("event"))
+            elif kind == "unsubscribe":
+                self.subscriptions.discard(message.get("event"))
+            elif kind == "error":
+                self.last_error = message.get("error", "")
+            else:
+                self.message.emit(self, message)
+
+    def _read_stderr(self):
+        self.error_buffer += bytes(self.process.readAllStandardError())
+        *lines, self.error_buffer = self.error_buffer.split(b"\n")
+        for line in lines:
+            print(f"[{self.name}] {line.decode('utf-8', 'replace').rstrip()}")
+
+    def _error(self, error):
+        if error == QProcess.FailedToStart:
+            self.last_error = self.process.errorString()
+            self._finished(-1, QProcess.CrashExit)
+
+    def _finished(self, code, status):
+        if self.process is None:
+            return
+        self.process.deleteLater()
+        self.process = None
+        self.subscriptions = set()
+        if self.stopping:
+            self._set_state(DISABLED if self.disable_after_stop else STOPPED)
+            self.disable_after_stop = False
+            if self.restart_after_stop:
+                self.restart_after_stop = False
+                self.restarts += 1
+                self.start()
+            return
+        now = time.monotonic()
+        self.crashes.append(now)
+        while self.crashes and now - self.crashes[0] > CRASH_WINDOW:
+            self.crashes.popleft()
+        if not self.last_error:
+            self.last_error = f"Exited with code {code}"
+        if len(self.crashes) > MAX_CRASHES:
+            self._set_state(DISABLED)
+            return
+        self._set_state(CRASHED)
+        QTimer.singleShot(RESTART_DELAY, self._restart_crashed)
+
+    def _restart_crashed(self):
+        if self.state == CRASHED:
+            self.restarts += 1
+            self.start()
+
+
+class ExtensionManager(QObject):
+    # Starts every discovered extension in its own host and is the only
+    # thing they can reach the browser through: events go out, and calls
+    # come back as messages handled here on the GUI thread. Incognito tabs
+    # are invisible to extensions.
+    def __init__(self, browser, settings_file=EXTENSION_SETTINGS_FILE, parent=None):
+        super().__init__(parent)
+        self.browser = browser
+        self.settings_file = settings_file
+        self.budgets = dict(DEFAULT_BUDGETS)
+        self.over_budget = WARN
+        self.load_settings()
+        self.extensions = {}
+        # Extensions know tabs by number: tab -> id and back
+        self.tab_ids = {}
+        self.tabs = {}
+        self.next_tab_id = 1
+        self.commands = {
+            "open_tab": self._open_tab,
+            "navigate": self._navigate,
+            "show_message": self._show_message,
+            "tabs": self._list_tabs,
+            "add_content_script": self._add_content_script,
+            "remove_content_script": self._remove_content_script,
+        }
+        self.ping_timer = QTimer(self)
+        self.ping_timer.setInterval(PING_INTERVAL)
+        self.ping_timer.timeout.connect(self._ping)
+        # Hot reload: inotify on Linux. Changed files are collected and
+        # handled together once saving has settled.
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self._file_changed)
+        self.watcher.directoryChanged.connect(self._directory_changed)
+        self.changed_paths = set()
+        self.rescan = False
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(RELOAD_DELAY)
+        self.reload_timer.timeout.connect(self._apply_changes)
+        # Extensions being reloaded -> (their scripts before, scripts registered again)
+        self.reloads = {}
+
+    def load_settings(self):
+        if os.path.exists(self.settings_file):
+            try:
+                with open(self.settings_file, "r") as f:
+                    settings = json.load(f)
+                self.budgets.update({event: float(ms) for event, ms in settings.get("budgets", {}).items()})
+                if settings.get("over_budget") in (WARN, DISABLE):
+                    self.over_budget = settings["over_budget"]
+            except Exception as e:
+                print(f"Error loading extension settings: {e}")
+
+    def save_settings(self):
+        try:
+            with open(self.settings_file, "w") as f:
+                json.dump({"budgets": self.budgets, "over_budget": self.over_budget}, f)
+        except Exception as e:
+            print(f"Error saving extension settings: {e}")
+
+    def set_over_budget(self, policy):
+        if policy in (WARN, DISABLE):
+            self.over_budget = policy
+            self.save_settings()
+
+    def load(self):
+        for path in discover_extensions():
+            if path in self.extensions:
+                continue
+            extension = ExtensionProcess(path, self)
+            extension.message.connect(self._handle)
+            extension.state_changed.connect(self._state_changed)
+            self.extensions[path] = extension
+            self.watcher.addPath(path)
+            extension.start()
+        for pattern in EXTENSION_PATTERNS:
+            directory = os.path.dirname(os.path.abspath(pattern))
+            if os.path.isdir(directory) and directory not in self.watcher.directories():
+                self.watcher.addPath(directory)
+        if self.extensions:
+            self.ping_timer.start()
+
+    def reload(self, extension):
+        # cleanup_extension, import again, init_extension, all in the
+        # running host; tabs are left alone
+        if extension.state == RUNNING and not extension.stopping:
+            if extension not in self.reloads:
+                self.reloads[extension] = (set(self.browser.content_scripts.owned_by(extension.key)), set())
+            extension.send({"type": "reload"})
+        elif extension.state in (CRASHED, DISABLED):
+            # Likely the fix for whatever stopped it
+            extension.restart()
+
+    def unload(self, path):
+        extension = self.extensions.pop(path, None)
+        if extension is not None:
+            self.watcher.removePath(path)
+            extension.stop()
+
+    def _file_changed(self, path):
+        self.changed_paths.add(path)
+        self.reload_timer.start()
+
+    def _directory_changed(self, path):
+        self.rescan = True
+        self.reload_timer.start()
+
+    def _apply_changes(self):
+        paths, self.changed_paths = self.changed_paths, set()
+        if self.rescan:
+            self.rescan = False
+            found = discover_extensions()
+            for path in list(self.extensions):
+                if path not in found:
+                    print(f"Extension {self.extensions[path].name} removed")
+                    self.unload(path)
+            self.load()
+        for path in paths:
+            extension = self.extensions.get(path)
+            if extension is None or not os.path.exists(path):
+                continue
+            # Saving by renaming over the file drops the watch
+            if path not in self.watcher.files():
+                self.watcher.addPath(path)
+            digest = file_digest(path)
+            if digest != extension.digest:
+                extension.digest = digest
+                self.reload(extension)
+
+    def _reloaded(self, extension, message):
+        before, registered = self.reloads.pop(extension, (set(), set()))
+        if not message.get("ok"):
+            self.browser.statusBar().showMessage(f"Reloading extension {extension.name} failed; still running the old code", 10000)
+            return
+        # Scripts the new code registered again stay where they are; only
+        # the ones it dropped are taken out of the profiles
+        for key in before - registered:
+            self.browser.content_scripts.remove(extension.key, key)
+        extension.name = message.get("name") or extension.name
+        extension.warned = set()
+        print(f"Reloaded extension {extension.name}")
+        self.browser.statusBar().showMessage(f"Reloaded extension {extension.name}", 3000)
+
+    def find(self, key):
+        for extension in self.extensions.values():
+            if extension.key == key:
+                return extension
+        return None
+
+    def action(self, key, action):
+        extension = self.find(key)
+        if extension is None or action not in ("start", "stop", "kill", "restart", "reload"):
+            return False
+        if action == "start":
+            extension.restart()
+        elif action == "reload":
+            self.reload(extension)
+        else:
+            getattr(extension, action)()
+        return True
+
+    def shutdown(self):
+        self.ping_timer.stop()
+        running = [e for e in self.extensions.values() if e.process is not None]
+        for extension in running:
+            extension.stop()
+        deadline = time.monotonic() + STOP_TIMEOUT / 1000
+        for extension in running:
+            process = extension.process
+            if process is None:
+                continue
+            if not process.waitForFinished(max(0, int((deadline - time.monotonic()) * 1000))):
+                process.kill()
+                process.waitForFinished(100)
+
+    def _ping(self):
+        for extension in self.extensions.values():
+            extension.ping()
+
+    def tab_id(self, tab):
+        tab_id = self.tab_ids.get(tab)
+        if tab_id is None:
+            tab_id = self.tab_ids[tab] = self.next_tab_id
+            self.tabs[tab_id] = tab
+            self.next_tab_id += 1
+        return tab_id
+
+    def dispatch(self, event, tab, **data):
+        if tab.incognito:
+            return
+        listeners = [e for e in self.extensions.values() if event in e.subscriptions]
+        if listeners:
+            data["tab"] = self.tab_id(tab)
+            message = {"type": "event", "event": event, "data": data}
+            for extension in listeners:
+                extension.send(message)
+        if event == "tab_closed":
+            self.tabs.pop(self.tab_ids.pop(tab, None), None)
+
+    def budget(self, event):
+        return self.budgets.get(event, max(DEFAULT_BUDGETS.values()))
+
+    def _state_changed(self, extension):
+        if extension.state not in (STARTING, RUNNING):
+            self.reloads.pop(extension, None)
+            # A restarted extension registers its scripts again from init_extension
+            self.browser.content_scripts.remove_owner(extension.key)
+
+    def _hook_done(self, extension, event, ms):
+        budget = self.budget(event)
+        stats = extension.hook_stats.setdefault(event, HookStats())
+        if not stats.record(ms, budget) or extension.stopping:
+            # Hooks queued before a stop still report back; judge only running extensions
+            return
+        if self.over_budget == DISABLE and stats.strikes() >= BUDGET_STRIKES:
+            reason = (f"Disabled: {stats.strikes()} of the last {len(stats.recent)} {event} hooks "
+                      f"went over the {budget:.0f} ms budget")
+            print(f"Extension {extension.name}: {reason}")
+            self.browser.statusBar().showMessage(f"Extension {extension.name} disabled: too slow on {event}", 10000)
+            extension.disable(reason)
+        elif event not in extension.warned:
+            extension.warned.add(event)
+            print(f"Extension {extension.name} took {ms:.0f} ms on {event} (budget {budget:.0f} ms)")
+            self.browser.statusBar().showMessage(f"Extension {extension.name} is slowing down {event}", 5000)
+
+    def _handle(self, extension, message):
+        if message.get("type") == "done":
+            self._hook_done(extension, message.get("event"), float(message.get("ms", 0)))
+            return
+        if message.get("type") == "reloaded":
+            self._reloaded(extension, message)
+            return
+        if message.get("type") != "call":
+            return
+        command = self.commands.get(message.get("method"))
+        result = None
+        if command is None:
+            extension.last_error = f"Unknown call {message.get('method')!r}"
+        else:
+            try:
+                result = command(extension, *message.get("args", []))
+            except Exception as e:
+                extension.last_error = f"{message.get('method')}: {e}"
+                print(f"Error handling call from extension {extension.name}: {e}")
+        if "id" in message:
+            extension.send({"type": "reply", "id": message["id"], "result": result})
+
+    def _open_tab(self, extension, url):
+        return self.tab_id(self.browser.add_new_tab(url))
+
+    def _navigate(self, extension, url, tab_id=None):
+        tab = self.tabs.get(tab_id) if tab_id is not None else self.browser.tabs.currentWidget()
+        if tab is not None and not tab.incognito:
+            tab.browser.setUrl(QUrl(url))
+
+    def _show_message(self, extension, text, timeout=5000):
+        self.browser.statusBar().showMessage(f"{extension.name}: {text}", int(timeout))
+
+    def _add_content_script(self, extension, source, options=None):
+        allowed = ("name", "matches", "run_at", "world", "subframes")
+        options = {key: value for key, value in (options or {}).items() if key in allowed}
+        options.setdefault("name", extension.name)
+        key = self.browser.content_scripts.add_source(extension.key, source, **options)
+        if extension in self.reloads:
+            self.reloads[extension][1].add(key)
+        return key
+
+    def _remove_content_script(self, extension, key):
+        if extension in self.reloads:
+            # cleanup_extension during a reload; whatever init_extension
+            # doesn't register again is removed once it's done
+            self.reloads[extension][1].discard(key)
+            return True
+        return self.browser.content_scripts.remove(extension.key, key)
+
+    def _list_tabs(self, extension):
+        tabs = []
+        for i in range(self.browser.tabs.count()):
+            tab = self.browser.tabs.widget(i)
+            if not tab.incognito:
+                tabs.append({"id": self.tab_id(tab), "url": tab.browser.url().toString(),
+                             "title": tab.browser.title()})
+        return tabs
+
+    def summary(self):
+        extensions = [{
+            "key": e.key,
+            "name": e.name,
+            "path": e.path,
+            "state": e.state,
+            "pid": e.pid(),
+            "restarts": e.restarts,
+            "events": sorted(e.subscriptions),
+            "last_error": e.last_error,
+            "hooks": {event: stats.summary(self.budget(event))
+                      for event, stats in sorted(e.hook_stats.items())},
+        } for e in self.extensions.values()]
+        return {"extensions": extensions, "budgets": self.budgets, "over_budget": self.over_budget,
+                "content_scripts": self.browser.content_scripts.summary()}
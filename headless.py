@@ -0,0 +1,306 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import deque
+
+from PyQt5.QtCore import QObject, QTimer, QUrl, QMarginsF, pyqtSignal
+from PyQt5.QtGui import QPageLayout, QPageSize
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile, QWebEngineSettings
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor
+
+from singleinstance import RENDER_FLAG
+from renderoptions import build_parser, OK, TIMEOUT, FAILED
+
+# Batch rendering: `prw-beta.py --render urls.txt` renders every URL to a
+# PNG or PDF without a display, and prints one JSON line per page as it
+# finishes. Imported only in that mode.
+# Longest wait (ms) for network idle; pages that poll forever are captured anyway
+IDLE_TIMEOUT = 5000
+IDLE_CHECK_INTERVAL = 100
+# Longest wait (ms) for a page that was stopped mid-load to settle before reuse
+RESET_TIMEOUT = 2000
+
+
+def prepare_environment():
+    # Must run before the QApplication exists. Offscreen needs no X server;
+    # software compositing needs no GPU.
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    os.environ.setdefault("QT_QUICK_BACKEND", "software")
+    flags = os.environ.get("QTWEBENGINE_CHROMIUM_FLAGS", "")
+    if "--disable-gpu" not in flags.split():
+        os.environ["QTWEBENGINE_CHROMIUM_FLAGS"] = (flags + " --disable-gpu").strip()
+
+
+def output_name(url, fmt):
+    # Readable and stable: host and path, plus a hash for uniqueness
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", re.sub(r"^[a-z]+://", "", url)).strip("-")[:80] or "page"
+    return f"{slug}-{hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]}.{fmt}"
+
+
+class RequestCounter(QWebEngineUrlRequestInterceptor):
+    # Installed on one page; notes when its last request started
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.count = 0
+        self.last_request = time.monotonic()
+
+    def interceptRequest(self, info):
+        self.count += 1
+        self.last_request = time.monotonic()
+
+
+class RenderSlot(QObject):
+    # One page of the pool, reused from URL to URL. Screenshots need a view
+    # to paint into; on the offscreen platform it never reaches a screen.
+    finished = pyqtSignal(object, object)
+    # Free for the next URL
+    ready = pyqtSignal(object)
+
+    def __init__(self, profile, options, parent=None):
+        super().__init__(parent)
+        self.options = options
+        self.view = QWebEngineView()
+        self.page = QWebEnginePage(profile, self.view)
+        self.view.setPage(self.page)
+        self.view.resize(options.width, options.height)
+        self.view.show()
+        self.page.settings().setAttribute(QWebEngineSettings.ShowScrollBars, False)
+        self.page.setAudioMuted(True)
+        self.counter = RequestCounter(self)
+        self.page.setUrlRequestInterceptor(self.counter)
+        self.page.loadFinished.connect(self._load_finished)
+        self.page.pdfPrintingFinished.connect(self._pdf_finished)
+        self.page.renderProcessTerminated.connect(self._renderer_gone)
+        self.timeout = QTimer(self)
+        self.timeout.setSingleShot(True)
+        self.timeout.timeout.connect(self._timed_out)
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setInterval(IDLE_CHECK_INTERVAL)
+        self.idle_timer.timeout.connect(self._check_idle)
+        self.job = None
+        self.resetting = False
+        self.reset_timer = QTimer(self)
+        self.reset_timer.setSingleShot(True)
+        self.reset_timer.timeout.connect(self._reset_done)
+
+    def render(self, url, path):
+        now = time.monotonic()
+        self.job = {"url": url, "path": path, "started": now, "loaded": None, "requests": self.counter.count,
+                    "checking": False}
+        self.counter.last_request = now
+        self.timeout.start(int(self.options.timeout * 1000))
+        self.page.setUrl(QUrl.fromUserInput(url))
+
+    def _load_finished(self, ok):
+        if self.resetting:
+            if self.page.url() == QUrl("about:blank"):
+                self._reset_done()
+            return
+        job = self.job
+        if job is None or job["loaded"] is not None:
+            return
+        if not ok:
+            self._finish(FAILED, "load failed")
+            return
+        job["loaded"] = time.monotonic()
+        # The load budget is spent; IDLE_TIMEOUT bounds the wait from here
+        self.timeout.stop()
+        self.idle_timer.start()
+
+    def _check_idle(self):
+        job = self.job
+        if job is None or job["checking"]:
+            return
+        now = time.monotonic()
+        waited = (now - job["loaded"]) * 1000
+        quiet = (now - self.counter.last_request) * 1000 >= self.options.idle
+        if not quiet and waited < IDLE_TIMEOUT:
+            return
+        job["idle"] = quiet
+        job["checking"] = True
+        # Scripts can still be building the page after the network settles
+        self.page.runJavaScript("document.readyState", lambda state, job=job: self._ready_state(job, state))
+
+    def _ready_state(self, job, state):
+        if job is not self.job:
+            return
+        job["checking"] = False
+        waited = (time.monotonic() - job["loaded"]) * 1000
+        if state == "complete" or waited >= IDLE_TIMEOUT:
+            self.idle_timer.stop()
+            self._capture()
+
+    def _capture(self):
+        path = self.job["path"]
+        if self.options.format == "pdf":
+            layout = QPageLayout(QPageSize(QPageSize.A4), QPageLayout.Portrait, QMarginsF(10, 10, 10, 10))
+            self.page.printToPdf(path, layout)
+            return
+        pixmap = self.view.grab()
+        if pixmap.isNull() or not pixmap.save(path, "PNG"):
+            self._finish(FAILED, "could not save screenshot")
+        else:
+            self._finish(OK)
+
+    def _pdf_finished(self, path, ok):
+        if self.job is not None and path == self.job["path"]:
+            self._finish(OK if ok else FAILED, "" if ok else "could not save PDF")
+
+    def _timed_out(self):
+        if self.job is not None:
+            self._finish(TIMEOUT, f"not loaded after {self.options.timeout:g} s")
+
+    def _renderer_gone(self, status, code):
+        # The next setUrl starts a new renderer
+        if self.job is not None:
+            self._finish(FAILED, f"renderer terminated ({code})")
+
+    def _finish(self, status, error=""):
+        job, self.job = self.job, None
+        self.timeout.stop()
+        self.idle_timer.stop()
+        loaded = job["loaded"] is not None
+        result = {
+            "url": job["url"],
+            "status": status,
+            "ms": round((time.monotonic() - job["started"]) * 1000),
+            "requests": self.counter.count - job["requests"],
+        }
+        if status == OK:
+            result["output"] = job["path"]
+            result["network_idle"] = job.get("idle", True)
+        if error:
+            result["error"] = error
+        self.finished.emit(self, result)
+        if loaded:
+            self.ready.emit(self)
+        else:
+            # Stopped mid-load: its late loadFinished must not land on the
+            # next URL, so settle on a blank page first
+            self.resetting = True
+            self.reset_timer.start(RESET_TIMEOUT)
+            self.page.setUrl(QUrl("about:blank"))
+
+    def _reset_done(self):
+        if self.resetting:
+            self.resetting = False
+            self.reset_timer.stop()
+            self.ready.emit(self)
+
+
+class LineReader(QObject):
+    # Reads URLs on a thread, so a list piped in slowly (or by a
+    # coordinator) never blocks rendering
+    line = pyqtSignal(str)
+    closed = pyqtSignal()
+
+    def __init__(self, stream, parent=None):
+        super().__init__(parent)
+        self.stream = stream
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        for line in self.stream:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                self.line.emit(line)
+        self.closed.emit()
+
+
+class BatchRenderer(QObject):
+    # Hands URLs to free pages as they come in and streams each result
+    # out the moment it's ready
+    done = pyqtSignal()
+
+    def __init__(self, options, out=sys.stdout, parent=None):
+        super().__init__(parent)
+        self.options = options
+        self.out = out
+        if options.profile:
+            # A profile of its own, so several renderers never share one
+            self.profile = QWebEngineProfile("prw-render", self)
+            self.profile.setPersistentStoragePath(os.path.abspath(options.profile))
+            self.profile.setCachePath(os.path.join(os.path.abspath(options.profile), "cache"))
+        else:
+            self.profile = QWebEngineProfile(self)
+        os.makedirs(options.out, exist_ok=True)
+        self.slots = [RenderSlot(self.profile, options, self) for _ in range(max(1, options.pool))]
+        for slot in self.slots:
+            slot.finished.connect(self._slot_finished)
+            slot.ready.connect(self._slot_ready)
+        self.free = list(self.slots)
+        self.queue = deque()
+        self.input_closed = False
+        self.started = time.monotonic()
+        self.counts = {OK: 0, TIMEOUT: 0, FAILED: 0}
+
+    def add(self, url):
+        self.queue.append(url)
+        self._dispatch()
+
+    def close_input(self):
+        self.input_closed = True
+        self._check_done()
+
+    def _dispatch(self):
+        while self.free and self.queue:
+            url = self.queue.popleft()
+            path = os.path.join(self.options.out, output_name(url, self.options.format))
+            self.free.pop().render(url, path)
+
+    def _slot_finished(self, slot, result):
+        self.counts[result["status"]] += 1
+        self.out.write(json.dumps(result) + "\n")
+        self.out.flush()
+
+    def _slot_ready(self, slot):
+        self.free.append(slot)
+        self._dispatch()
+        self._check_done()
+
+    def _check_done(self):
+        if self.input_closed and not self.queue and len(self.free) == len(self.slots):
+            self.done.emit()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        total = sum(self.counts.values())
+        rate = total / elapsed if elapsed else 0
+        return (f"Rendered {self.counts[OK]} of {total} pages in {elapsed:.1f} s ({rate:.2f} pages/s); "
+                f"{self.counts[TIMEOUT]} timed out, {self.counts[FAILED]} failed")
+
+
+def parse_args(argv):
+    parser = build_parser("prw-beta.py --render", "Render URLs to PNG or PDF without a display.")
+    parser.add_argument(RENDER_FLAG, action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--profile", help="profile directory; off the record if not given")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options = parse_args(argv)
+    prepare_environment()
+    app = QApplication([sys.argv[0]])
+    app.setApplicationName("PhoenixRose Web")
+    try:
+        stream = sys.stdin if options.urls == "-" else open(options.urls, "r", encoding="utf-8")
+    except OSError as e:
+        print(f"Error reading URL list: {e}", file=sys.stderr)
+        return 2
+    renderer = BatchRenderer(options)
+    reader = LineReader(stream)
+    reader.line.connect(renderer.add)
+    reader.closed.connect(renderer.close_input)
+    renderer.done.connect(app.quit)
+    reader.start()
+    app.exec_()
+    print(renderer.summary(), file=sys.stderr)
+    return 0 if renderer.counts[OK] == sum(renderer.counts.values()) else 1
@@ -0,0 +1,178 @@
+import os
+import re
+import sys
+import json
+import time
+import ipaddress
+
+HSTS_PRELOAD_FILE = "hsts_preload.txt"
+LEARNED_HOSTS_FILE = "https_hosts.json"
+# A host that failed over https but loaded over http is retried over https
+# after a week
+HTTP_ONLY_TTL = 7 * 24 * 3600
+MAX_LEARNED_HOSTS = 10000
+# Milliseconds an https probe may go without a response before falling back
+# to http; a host that silently drops port 443 would otherwise hang the tab
+# until the TCP connect timeout
+PROBE_TIMEOUT = 3000
+JSON_COMMENT_RE = re.compile(r"^\s*//.*$", re.MULTILINE)
+
+
+def split_host(url):
+    # "Example.com:8080/path" -> ("example.com", ":8080/path")
+    end = len(url)
+    for sep in "/?#":
+        i = url.find(sep)
+        if i != -1:
+            end = min(end, i)
+    authority, rest = url[:end], url[end:]
+    authority = authority.rsplit("@", 1)[-1]
+    if authority.startswith("["):
+        host = authority[:authority.find("]") + 1]
+    else:
+        host = authority.partition(":")[0]
+    return host.lower(), authority[len(host):] + rest
+
+
+def is_local_host(host):
+    # Never probed: there's nothing to upgrade on loopback, IPs and intranet names
+    if host == "localhost" or host.endswith(".localhost") or "." not in host:
+        return True
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+class HttpsUpgrader:
+    def __init__(self, preload_file=HSTS_PRELOAD_FILE, learned_file=LEARNED_HOSTS_FILE):
+        self.preload_file = preload_file
+        self.learned_file = learned_file
+        self.preload_hosts = set()
+        self.preload_subdomain_hosts = set()
+        self._preload_mtime = None
+        # host -> [supports_https, when]
+        self.learned = {}
+        self.stats = {"preloaded": 0, "learned": 0, "probed": 0, "fallbacks": 0}
+        self.load_learned()
+
+    def reload_preload_list(self):
+        # Picked up again whenever the file changes on disk
+        try:
+            mtime = os.path.getmtime(self.preload_file)
+        except OSError:
+            return
+        if mtime == self._preload_mtime:
+            return
+        hosts, subdomain_hosts = set(), set()
+        try:
+            with open(self.preload_file, "r") as f:
+                for line in f:
+                    parts = line.split("#", 1)[0].split()
+                    if not parts:
+                        continue
+                    host = parts[0].lower().rstrip(".")
+                    if "include_subdomains" in parts[1:]:
+                        subdomain_hosts.add(host)
+                    else:
+                        hosts.add(host)
+        except Exception as e:
+            print(f"Error loading HSTS preload list: {e}")
+            return
+        self.preload_hosts, self.preload_subdomain_hosts = hosts, subdomain_hosts
+        self._preload_mtime = mtime
+
+    def is_preloaded(self, host):
+        self.reload_preload_list()
+        if host in self.preload_hosts or host in self.preload_subdomain_hosts:
+            return True
+        labels = host.split(".")
+        return any(".".join(labels[i:]) in self.preload_subdomain_hosts for i in range(1, len(labels) - 1))
+
+    def load_learned(self):
+        if os.path.exists(self.learned_file):
+            try:
+                with open(self.learned_file, "r") as f:
+                    self.learned = json.load(f)
+            except Exception as e:
+                print(f"Error loading learned https hosts: {e}")
+
+    def save_learned(self):
+        try:
+            with open(self.learned_file, "w") as f:
+                json.dump(self.learned, f)
+        except Exception as e:
+            print(f"Error saving learned https hosts: {e}")
+
+    def record(self, host, supports_https):
+        if not host or is_local_host(host) or (supports_https and self.is_preloaded(host)):
+            return
+        previous = self.learned.get(host)
+        if previous and previous[0] == supports_https and supports_https:
+            return
+        self.learned[host] = [supports_https, time.time()]
+        if len(self.learned) > MAX_LEARNED_HOSTS:
+            oldest = sorted(self.learned, key=lambda h: self.learned[h][1])
+            for h in oldest[:len(self.learned) - MAX_LEARNED_HOSTS]:
+                del self.learned[h]
+        self.save_learned()
+
+    def known_https(self, host):
+        # True / False when known, None when the host has to be probed
+        if self.is_preloaded(host):
+            self.stats["preloaded"] += 1
+            return True
+        entry = self.learned.get(host)
+        if entry is None:
+            return None
+        supports_https, when = entry
+        if not supports_https and time.time() - when > HTTP_ONLY_TTL:
+            return None
+        self.stats["learned"] += 1
+        return supports_https
+
+    def upgrade(self, url):
+        # Returns (url_to_load, http_fallback); http_fallback is set when
+        # the https attempt is a probe that may need to fall back
+        if url.startswith("https://"):
+            return url, None
+        explicit_http = url.startswith("http://")
+        rest = url[len("http://"):] if explicit_http else url
+        host, _ = split_host(rest)
+        http_url = "http://" + rest
+        if not host or is_local_host(host):
+            return http_url, None
+        known = self.known_https(host)
+        if known:
+            return "https://" + rest, None
+        if known is False or explicit_http:
+            return http_url, None
+        self.stats["probed"] += 1
+        return "https://" + rest, http_url
+
+
+def import_chromium_preload_list(source, target=HSTS_PRELOAD_FILE):
+    # Converts Chromium's transport_security_state_static.json to the plain
+    # "host [include_subdomains]" format read above
+    with open(source, "r", encoding="utf-8") as f:
+        data = json.loads(JSON_COMMENT_RE.sub("", f.read()))
+    count = 0
+    tmp = target + ".tmp"
+    with open(tmp, "w") as out:
+        out.write("# HSTS preload list: host [include_subdomains]\n")
+        for entry in data.get("entries", []):
+            if entry.get("mode") != "force-https":
+                continue
+            flag = " include_subdomains" if entry.get("include_subdomains") else ""
+            out.write(entry["name"] + flag + "\n")
+            count += 1
+    os.replace(tmp, target)
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: httpsfirst.py transport_security_state_static.json", file=sys.stderr)
+        sys.exit(2)
+    print(f"Imported {import_chromium_preload_list(sys.argv[1])} hosts into {HSTS_PRELOAD_FILE}")
@@ -0,0 +1,476 @@
+import os
+import json
+
+from PyQt5.QtCore import QObject, QBuffer, QIODevice, QFile, QUrl, pyqtSlot
+from PyQt5.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+from PyQt5.QtWebChannel import QWebChannel
+
+INTERNAL_SCHEME = "prw"
+NEW_TAB_URL = "prw://newtab"
+# Saved third-party pages are served from here; they're web content and
+# never get the browser bridge
+ARCHIVE_HOST = "archive"
+ABOUT_FILE = "about.html"
+
+STYLE_CSS = """
+body { font-family: -apple-system, "Segoe UI", Roboto, Helvetica, Arial, sans-serif;
+       background: #f7f7f7; color: #1d1d1f; margin: 0; padding: 32px; }
+h1 { font-weight: 600; font-size: 26px; margin: 0 0 20px; }
+input[type=search] { width: 100%; max-width: 640px; padding: 10px 12px; font-size: 16px;
+                     border: 1px solid #ccc; border-radius: 6px; box-sizing: border-box; }
+ul { list-style: none; padding: 0; margin: 16px 0; }
+li { padding: 6px 0; border-bottom: 1px solid #e5e5e5; overflow: hidden;
+     text-overflow: ellipsis; white-space: nowrap; }
+a { color: #007aff; text-decoration: none; }
+a:hover { text-decoration: underline; }
+table { border-collapse: collapse; width: 100%; }
+td, th { text-align: left; padding: 6px 8px; border-bottom: 1px solid #e5e5e5; }
+.tiles { display: flex; flex-wrap: wrap; gap: 12px; margin-top: 24px; }
+.tile { background: #fff; border-radius: 8px; padding: 12px 16px; width: 180px;
+        box-shadow: 0 2px 6px rgba(0,0,0,0.1); overflow: hidden; text-overflow: ellipsis; }
+.empty { color: #999; }
+"""
+
+COMMON_JS = """
+function withBrowser(callback) {
+    new QWebChannel(qt.webChannelTransport, function (channel) {
+        callback(channel.objects.browser);
+    });
+}
+function linkItem(url, text) {
+    var li = document.createElement("li");
+    var a = document.createElement("a");
+    a.href = url;
+    a.textContent = text || url;
+    li.appendChild(a);
+    return li;
+}
+function fillList(list, items, render) {
+    list.textContent = "";
+    if (!items.length) {
+        var li = document.createElement("li");
+        li.className = "empty";
+        li.textContent = "Nothing here yet.";
+        list.appendChild(li);
+    }
+    items.forEach(function (item) { list.appendChild(render(item)); });
+}
+function filterList(input, list) {
+    input.addEventListener("input", function () {
+        var needle = input.value.toLowerCase();
+        Array.prototype.forEach.call(list.children, function (li) {
+            li.style.display = li.textContent.toLowerCase().indexOf(needle) === -1 ? "none" : "";
+        });
+    });
+}
+"""
+
+
+def _page(title, body, script):
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>{title}</title>
+<link rel="stylesheet" href="{INTERNAL_SCHEME}://assets/style.css">
+<script src="{INTERNAL_SCHEME}://assets/qwebchannel.js"></script>
+<script src="{INTERNAL_SCHEME}://assets/common.js"></script>
+</head>
+<body>
+{body}
+<script>
+{script}
+</script>
+</body>
+</html>
+"""
+
+
+HISTORY_HTML = _page("History", """
+<h1>History</h1>
+<input type="search" id="filter" placeholder="Search history" autofocus>
+<ul id="list"></ul>
+""", """
+withBrowser(function (browser) {
+    browser.history(function (data) {
+        var list = document.getElementById("list");
+        fillList(list, JSON.parse(data).reverse(), function (url) { return linkItem(url); });
+        filterList(document.getElementById("filter"), list);
+    });
+});
+""")
+
+BOOKMARKS_HTML = _page("Bookmarks", """
+<h1>Bookmarks</h1>
+<input type="search" id="filter" placeholder="Search bookmarks" autofocus>
+<ul id="list"></ul>
+""", """
+withBrowser(function (browser) {
+    browser.bookmarks(function (data) {
+        var list = document.getElementById("list");
+        fillList(list, JSON.parse(data), function (b) { return linkItem(b.url, b.title || b.url); });
+        filterList(document.getElementById("filter"), list);
+    });
+});
+""")
+
+DOWNLOADS_HTML = _page("Downloads", """
+<h1>Downloads</h1>
+<table><thead><tr><th>File</th><th>State</th><th>Source</th></tr></thead>
+<tbody id="rows"></tbody></table>
+""", """
+withBrowser(function (browser) {
+    browser.downloads(function (data) {
+        var rows = document.getElementById("rows");
+        JSON.parse(data).forEach(function (d) {
+            var tr = document.createElement("tr");
+            [d.path, d.state, d.url].forEach(function (text) {
+                var td = document.createElement("td");
+                td.textContent = text;
+                tr.appendChild(td);
+            });
+            rows.appendChild(tr);
+        });
+    });
+});
+""")
+
+ARCHIVES_HTML = _page("Saved Pages", """
+<h1>Saved Pages</h1>
+<input type="search" id="filter" placeholder="Search saved pages" autofocus>
+<ul id="list"></ul>
+""", """
+withBrowser(function (browser) {
+    browser.archives(function (data) {
+        var list = document.getElementById("list");
+        fillList(list, JSON.parse(data), function (a) {
+            var when = new Date(a.created * 1000).toLocaleString();
+            var li = linkItem("prw://archive/" + a.id, (a.title || a.url) + " \u2014 " + when);
+            var remove = document.createElement("button");
+            remove.textContent = "Delete";
+            remove.style.float = "right";
+            remove.addEventListener("click", function () {
+                if (confirm("Delete this saved page?")) {
+                    browser.deleteArchive(a.id, function (ok) { if (ok) { li.remove(); } });
+                }
+            });
+            li.insertBefore(remove, li.firstChild);
+            return li;
+        });
+        filterList(document.getElementById("filter"), list);
+    });
+});
+""")
+
+JANK_HTML = _page("UI Stalls", """
+<h1>UI Stalls</h1>
+<p id="threshold"></p>
+<h2>Worst offenders</h2>
+<table><thead><tr><th>Where</th><th>Stalls</th><th>Total</th><th>Worst</th><th>Last stack</th></tr></thead>
+<tbody id="offenders"></tbody></table>
+<h2>Event loop latency</h2>
+<table><thead><tr><th>Heartbeat late by</th><th>Count</th></tr></thead>
+<tbody id="latency"></tbody></table>
+<h2>Recent stalls</h2>
+<table><thead><tr><th>When</th><th>Duration</th><th>Where</th></tr></thead>
+<tbody id="recent"></tbody></table>
+""", """
+function addRow(tbody, cells) {
+    var tr = document.createElement("tr");
+    cells.forEach(function (text) {
+        var td = document.createElement("td");
+        td.textContent = text;
+        td.style.whiteSpace = "pre-wrap";
+        tr.appendChild(td);
+    });
+    tbody.appendChild(tr);
+}
+withBrowser(function (browser) {
+    browser.stalls(function (data) {
+        var summary = JSON.parse(data);
+        document.getElementById("threshold").textContent =
+            "Stalls are event loop pauses over " + summary.threshold_ms + " ms.";
+        summary.offenders.forEach(function (o) {
+            addRow(document.getElementById("offenders"), [o.offender, o.count,
+                Math.round(o.total_ms) + " ms", Math.round(o.max_ms) + " ms", o.stack.slice(-8).join("\n")]);
+        });
+        Object.keys(summary.latency).forEach(function (bucket) {
+            addRow(document.getElementById("latency"), [bucket, summary.latency[bucket]]);
+        });
+        summary.recent.forEach(function (r) {
+            addRow(document.getElementById("recent"), [new Date(r.ts * 1000).toLocaleString(),
+                Math.round(r.duration_ms) + " ms", r.offender]);
+        });
+    });
+});
+""")
+
+EXTENSIONS_HTML = _page("Extensions", """
+<h1>Extensions</h1>
+<p>Each extension runs in a process of its own and can be stopped or restarted without touching the others.
+Saving an extension's file reloads it in place.</p>
+<table><thead><tr><th>Extension</th><th>State</th><th>PID</th><th>Restarts</th><th>Events</th><th>Last error</th><th></th></tr></thead>
+<tbody id="extensions"></tbody></table>
+<h2>Hook timings</h2>
+<p>Time each extension's hooks took per event, measured in its own process.
+When hooks go over budget:
+<select id="policy"><option value="warn">warn</option><option value="disable">disable the extension</option></select></p>
+<table><thead><tr><th>Extension</th><th>Event</th><th>Calls</th><th>Mean</th><th>p95</th><th>Max</th>
+<th>Budget</th><th>Over budget</th><th>Histogram</th></tr></thead>
+<tbody id="hooks"></tbody></table>
+<h2>Content scripts</h2>
+<p>Registered once and shared by every tab; user scripts are *.user.js files in the userscripts folder.</p>
+<table><thead><tr><th>Script</th><th>From</th><th>Matches</th><th>Excludes</th><th>Runs at</th><th>World</th></tr></thead>
+<tbody id="scripts"></tbody></table>
+""", """
+var bridge;
+function button(label, key, action) {
+    var b = document.createElement("button");
+    b.textContent = label;
+    b.addEventListener("click", function () {
+        bridge.extensionAction(key, action);
+        setTimeout(refresh, 300);
+    });
+    return b;
+}
+function ms(value) {
+    return (value < 10 ? value.toFixed(1) : Math.round(value)) + " ms";
+}
+function addCells(tr, cells) {
+    cells.forEach(function (text) {
+        var td = tr.insertCell();
+        td.textContent = text;
+        td.style.whiteSpace = "pre-wrap";
+    });
+}
+function showHooks(extensions) {
+    var tbody = document.getElementById("hooks");
+    tbody.textContent = "";
+    extensions.forEach(function (e) {
+        Object.keys(e.hooks).forEach(function (event) {
+            var h = e.hooks[event];
+            var histogram = Object.keys(h.histogram).filter(function (bucket) {
+                return h.histogram[bucket];
+            }).map(function (bucket) { return bucket + ": " + h.histogram[bucket]; });
+            var tr = tbody.insertRow();
+            addCells(tr, [e.name, event, h.count, ms(h.mean_ms), ms(h.p95_ms), ms(h.max_ms),
+                          ms(h.budget_ms), h.over_budget, histogram.join("\n")]);
+            if (h.over_budget) { tr.style.color = "#c00"; }
+        });
+    });
+}
+function refresh() {
+    bridge.extensions(function (data) {
+        var tbody = document.getElementById("extensions");
+        tbody.textContent = "";
+        var summary = JSON.parse(data);
+        var extensions = summary.extensions;
+        document.getElementById("policy").value = summary.over_budget;
+        showHooks(extensions);
+        var scripts = document.getElementById("scripts");
+        scripts.textContent = "";
+        summary.content_scripts.forEach(function (c) {
+            addCells(scripts.insertRow(), [c.name, c.owners.join(", "), c.matches.join("\n"),
+                                           c.excludes.join("\n"), c.run_at, c.world]);
+        });
+        if (!extensions.length) {
+            var td = tbody.insertRow().insertCell();
+            td.colSpan = 7;
+            td.className = "empty";
+            td.textContent = "No extensions found. Put modules that define init_extension in the extensions folder.";
+        }
+        extensions.forEach(function (e) {
+            var tr = tbody.insertRow();
+            addCells(tr, [e.name, e.state, e.pid || "", e.restarts, e.events.join(", "), e.last_error]);
+            var actions = tr.insertCell();
+            actions.title = e.path;
+            if (e.pid) {
+                actions.appendChild(button("Reload", e.key, "reload"));
+                actions.appendChild(button("Restart", e.key, "restart"));
+                actions.appendChild(button("Stop", e.key, "stop"));
+                actions.appendChild(button("Kill", e.key, "kill"));
+            } else {
+                actions.appendChild(button("Start", e.key, "start"));
+            }
+        });
+    });
+}
+withBrowser(function (browser) {
+    bridge = browser;
+    document.getElementById("policy").addEventListener("change", function (e) {
+        bridge.setExtensionBudgetPolicy(e.target.value);
+    });
+    refresh();
+    setInterval(refresh, 2000);
+});
+""")
+
+NEW_TAB_HTML = _page("New Tab", """
+<form id="search"><input type="search" id="query" placeholder="Search or enter website name" autofocus></form>
+<div class="tiles" id="tiles"></div>
+""", """
+document.getElementById("search").addEventListener("submit", function (e) {
+    e.preventDefault();
+    var q = document.getElementById("query").value.trim();
+    if (!q) { return; }
+    if (/^https?:\\/\\//.test(q)) {
+        location.href = q;
+    } else if (q.indexOf(" ") === -1 && q.indexOf(".") !== -1) {
+        location.href = "https://" + q;
+    } else {
+        location.href = "https://www.google.com/search?q=" + encodeURIComponent(q);
+    }
+});
+withBrowser(function (browser) {
+    browser.bookmarks(function (data) {
+        var tiles = document.getElementById("tiles");
+        JSON.parse(data).slice(0, 12).forEach(function (b) {
+            var a = document.createElement("a");
+            a.className = "tile";
+            a.href = b.url;
+            a.textContent = b.title || b.url;
+            tiles.appendChild(a);
+        });
+    });
+});
+""")
+
+
+def _read_qrc(path):
+    f = QFile(path)
+    if not f.open(QIODevice.ReadOnly):
+        return b""
+    data = bytes(f.readAll())
+    f.close()
+    return data
+
+
+def _read_file(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return b"<h1>About PhoenixRose Web</h1>"
+
+
+class BrowserBridge(QObject):
+    # Exposed to internal pages as "browser" over QWebChannel; internal pages
+    # ask for their data instead of having it baked into the HTML
+    def __init__(self, browser):
+        super().__init__(browser)
+        self.browser = browser
+
+    @pyqtSlot(result=str)
+    def history(self):
+        return json.dumps(self.browser.history[-1000:])
+
+    @pyqtSlot(result=str)
+    def bookmarks(self):
+        return json.dumps([{"title": title, "url": url} for title, url in self.browser.bookmarks])
+
+    @pyqtSlot(result=str)
+    def downloads(self):
+        items = []
+        for download in self.browser.download_manager.entries:
+            items.append({"path": download.path, "url": download.url, "state": download.state})
+        return json.dumps(items)
+
+    @pyqtSlot(result=str)
+    def archives(self):
+        return json.dumps(self.browser.archive_store.list_archives())
+
+    @pyqtSlot(str, result=bool)
+    def deleteArchive(self, archive_id):
+        return self.browser.archive_store.delete(archive_id)
+
+    @pyqtSlot(result=str)
+    def stalls(self):
+        return json.dumps(self.browser.stall_watchdog.summary())
+
+    @pyqtSlot(result=str)
+    def extensions(self):
+        return json.dumps(self.browser.extension_manager.summary())
+
+    @pyqtSlot(str, str)
+    def extensionAction(self, key, action):
+        self.browser.extension_manager.action(key, action)
+
+    @pyqtSlot(str)
+    def setExtensionBudgetPolicy(self, policy):
+        self.browser.extension_manager.set_over_budget(policy)
+
+
+class InternalSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        # Everything is encoded once up front and served straight from memory
+        self.assets = {
+            "style.css": (b"text/css", STYLE_CSS.encode()),
+            "common.js": (b"application/javascript", COMMON_JS.encode()),
+            "qwebchannel.js": (b"application/javascript", _read_qrc(":/qtwebchannel/qwebchannel.js")),
+        }
+        self.pages = {
+            "about": _read_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), ABOUT_FILE)),
+            "history": HISTORY_HTML.encode(),
+            "bookmarks": BOOKMARKS_HTML.encode(),
+            "downloads": DOWNLOADS_HTML.encode(),
+            "archives": ARCHIVES_HTML.encode(),
+            "jank": JANK_HTML.encode(),
+            "extensions": EXTENSIONS_HTML.encode(),
+            "newtab": NEW_TAB_HTML.encode(),
+        }
+        # Pages that build their response per request: host -> callable(job, url)
+        self.routes = {}
+
+    def add_route(self, host, callback):
+        self.routes[host] = callback
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        host = url.host()
+        if host == "assets":
+            asset = self.assets.get(url.path().lstrip("/"))
+            if asset:
+                self.reply(job, asset[0], asset[1])
+                return
+        elif host in self.pages:
+            self.reply(job, b"text/html", self.pages[host])
+            return
+        elif host in self.routes:
+            self.routes[host](job, url)
+            return
+        job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+
+    def reply(self, job, mime, data):
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(mime, buffer)
+
+
+def is_internal_url(url):
+    if isinstance(url, QUrl):
+        return url.scheme() == INTERNAL_SCHEME
+    return url.startswith(INTERNAL_SCHEME + "://")
+
+
+def is_privileged_url(url):
+    # Internal pages that get the QWebChannel bridge
+    url = url if isinstance(url, QUrl) else QUrl(url)
+    return is_internal_url(url) and url.host() != ARCHIVE_HOST
+
+
+def register_internal_scheme():
+    # Must run before the QApplication is created
+    scheme = QWebEngineUrlScheme(INTERNAL_SCHEME.encode())
+    scheme.setSyntax(QWebEngineUrlScheme.Host)
+    # LocalScheme: web content can't load or link to internal pages
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalScheme |
+                    QWebEngineUrlScheme.LocalAccessAllowed)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+def create_web_channel(browser):
+    channel = QWebChannel(browser)
+    channel.registerObject("browser", BrowserBridge(browser))
+    return channel
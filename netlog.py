@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import threading
+
+NETWORK_LOG_FILE = "requests.jsonl"
+NETWORK_LOG_MAX_BYTES = 10 * 1024 * 1024
+NETWORK_LOG_BACKUPS = 3
+RING_CAPACITY = 16384
+FLUSH_INTERVAL = 0.5
+BATCH_SIZE = 2048
+
+RECORD_FIELDS = ("ts", "url", "resource_type", "first_party_url", "navigation_type", "blocked")
+
+
+def rotate_log(path, incoming, max_bytes, backups):
+    # path -> path.1 -> ... -> path.<backups> once incoming bytes would
+    # take path past max_bytes
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    if size + incoming <= max_bytes:
+        return
+    for i in range(backups - 1, 0, -1):
+        src = f"{path}.{i}"
+        if os.path.exists(src):
+            os.replace(src, f"{path}.{i + 1}")
+    if backups > 0:
+        os.replace(path, f"{path}.1")
+    else:
+        os.remove(path)
+
+
+class RingBuffer:
+    # Single-producer/single-consumer ring. The interceptor thread only moves
+    # head and the writer thread only moves tail, so neither side needs a lock;
+    # when the writer falls behind new records are dropped instead of blocking.
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self._head - self._tail
+
+    def push(self, item):
+        head = self._head
+        if head - self._tail >= self.capacity:
+            self.dropped += 1
+            return False
+        self._slots[head % self.capacity] = item
+        self._head = head + 1
+        return True
+
+    def drain(self, limit=BATCH_SIZE):
+        tail = self._tail
+        count = min(self._head - tail, limit)
+        items = []
+        for i in range(tail, tail + count):
+            slot = i % self.capacity
+            items.append(self._slots[slot])
+            self._slots[slot] = None
+        self._tail = tail + count
+        return items
+
+
+class NetworkLogger:
+    def __init__(self, path=NETWORK_LOG_FILE, max_bytes=NETWORK_LOG_MAX_BYTES,
+                 backups=NETWORK_LOG_BACKUPS, capacity=RING_CAPACITY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.buffer = RingBuffer(capacity)
+        self.written = 0
+        self._wake = threading.Event()
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        if self._thread:
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="network-log", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self._stop = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def log(self, url, resource_type, first_party_url, navigation_type, blocked=False):
+        # Called for every request: just a tuple and a slot store, no I/O
+        self.buffer.push((time.time(), url, resource_type, first_party_url, navigation_type, blocked))
+
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            stopping = self._stop
+            while True:
+                batch = self.buffer.drain()
+                if not batch:
+                    break
+                self._write(batch)
+            if stopping:
+                break
+
+    def _write(self, batch):
+        lines = [json.dumps(dict(zip(RECORD_FIELDS, record))) for record in batch]
+        data = "\n".join(lines) + "\n"
+        try:
+            self._maybe_rotate(len(data))
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+            self.written += len(batch)
+        except Exception as e:
+            print(f"Error writing network log: {e}")
+
+    def _maybe_rotate(self, incoming):
+        rotate_log(self.path, incoming, self.max_bytes, self.backups)
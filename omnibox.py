@@ -0,0 +1,73 @@
+import time
+import bisect
+
+MAX_CANDIDATES = 500
+
+
+def strip_url(url):
+    # "https://www.Example.com/x" -> "example.com/x", the form people type
+    url = url.strip().lower()
+    for prefix in ("https://", "http://"):
+        if url.startswith(prefix):
+            url = url[len(prefix):]
+            break
+    if url.startswith("www."):
+        url = url[4:]
+    return url
+
+
+class UrlSuggester:
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+
+    def _entry(self, url):
+        key = strip_url(url)
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = [url, 0, 0.0, False]
+            bisect.insort(self._keys, key)
+        return entry
+
+    def add_visit(self, url, when=None):
+        if not url.startswith(("http://", "https://")):
+            return
+        entry = self._entry(url)
+        entry[0] = url
+        entry[1] += 1
+        entry[2] = time.time() if when is None else when
+
+    def add_bookmark(self, url):
+        if url.startswith(("http://", "https://")):
+            self._entry(url)[3] = True
+
+    def suggest(self, text, limit=8):
+        typed = strip_url(text)
+        if not typed:
+            return []
+        now = time.time()
+        start = bisect.bisect_left(self._keys, typed)
+        scored = []
+        for key in self._keys[start:start + MAX_CANDIDATES]:
+            if not key.startswith(typed):
+                break
+            url, visits, last_visit, bookmarked = self._entries[key]
+            age_hours = (now - last_visit) / 3600 if last_visit else 24 * 365
+            recency = 1 + 1 / (1 + age_hours / 24)
+            # Prefer completions that add little to what was typed, so
+            # "goo" ranks google.com/ above a deep search-results URL
+            extra = len(key) - len(typed)
+            score = (visits + (3 if bookmarked else 0)) * recency / (1 + extra / 16)
+            scored.append((score, url))
+        scored.sort(reverse=True)
+        return [(url, score) for score, url in scored[:limit]]
+
+    def top_hit(self, text):
+        # Returns (url, confidence) where confidence is the top hit's share of
+        # the total score among all matching candidates
+        results = self.suggest(text, limit=MAX_CANDIDATES)
+        if not results:
+            return None, 0.0
+        total = sum(score for _, score in results)
+        url, score = results[0]
+        return url, (score / total if total else 0.0)
@@ -0,0 +1,89 @@
+import time
+
+# Chromium keeps an unused preconnected socket for roughly ten seconds, so
+# hinting the same host more often than that only burns handshakes.
+HOST_HINT_INTERVAL = 10.0
+HIT_WINDOW = 30.0
+MAX_HINTS_PER_SECOND = 8
+
+
+def origin_of(url):
+    scheme, sep, rest = url.partition("://")
+    if not sep or scheme not in ("http", "https"):
+        return None, None
+    host = rest.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]
+    host = host.rsplit("@", 1)[-1].lower()
+    if not host:
+        return None, None
+    return f"{scheme}://{host}", host.split(":", 1)[0]
+
+
+class ConnectionPredictor:
+    def __init__(self, send_hint, host_interval=HOST_HINT_INTERVAL, hit_window=HIT_WINDOW,
+                 max_per_second=MAX_HINTS_PER_SECOND):
+        self.send_hint = send_hint
+        self.host_interval = host_interval
+        self.hit_window = hit_window
+        self.max_per_second = max_per_second
+        self._last_hint = {}
+        self._pending = {}
+        self._second = 0
+        self._sent_this_second = 0
+        self.stats = {"hints": 0, "rate_limited": 0, "hits": 0, "misses": 0,
+                      "hits_typed": 0, "hits_hover": 0, "misses_typed": 0, "misses_hover": 0}
+
+    def hint(self, url, source="typed"):
+        origin, host = origin_of(url)
+        if not origin:
+            return False
+        now = time.monotonic()
+        last = self._last_hint.get(host)
+        if last is not None and now - last < self.host_interval:
+            self.stats["rate_limited"] += 1
+            return False
+        second = int(now)
+        if second != self._second:
+            self._second = second
+            self._sent_this_second = 0
+        if self._sent_this_second >= self.max_per_second:
+            self.stats["rate_limited"] += 1
+            return False
+        self._sent_this_second += 1
+        self._last_hint[host] = now
+        self._expire(now)
+        self._pending[host] = (now, source)
+        self.stats["hints"] += 1
+        self.send_hint(origin)
+        return True
+
+    def record_navigation(self, url):
+        _, host = origin_of(url)
+        if not host:
+            return
+        now = time.monotonic()
+        self._expire(now)
+        pending = self._pending.pop(host, None)
+        if pending:
+            self.stats["hits"] += 1
+            self.stats["hits_" + pending[1]] = self.stats.get("hits_" + pending[1], 0) + 1
+
+    def _expire(self, now):
+        for host, (when, source) in list(self._pending.items()):
+            if now - when > self.hit_window:
+                del self._pending[host]
+                self.stats["misses"] += 1
+                self.stats["misses_" + source] = self.stats.get("misses_" + source, 0) + 1
+        if len(self._last_hint) > 1024:
+            for host, when in list(self._last_hint.items()):
+                if now - when > self.host_interval:
+                    del self._last_hint[host]
+
+    def summary(self):
+        self._expire(time.monotonic())
+        decided = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / decided if decided else 0.0
+        summary = dict(self.stats, pending=len(self._pending), hit_rate=round(hit_rate, 3))
+        for source in ("typed", "hover"):
+            hits, misses = self.stats["hits_" + source], self.stats["misses_" + source]
+            summary["hit_rate_" + source] = round(hits / (hits + misses), 3) if hits + misses else 0.0
+        return summary
@@ -0,0 +1,162 @@
+import re
+import time
+
+from PyQt5.QtCore import QObject, QTimer, QUrl
+from PyQt5.QtWebEngineWidgets import QWebEnginePage
+
+from omnibox import strip_url
+
+SPARE_PAGES = 2
+PRERENDER_CONFIDENCE = 0.6
+MAX_PRERENDERS = 1
+MAX_PRERENDER_RSS_MB = 350
+MIN_AVAILABLE_MB = 1024
+PRERENDER_TTL = 30.0
+MEMORY_CHECK_INTERVAL = 1000
+
+# GET navigations to these can still log people out or change state
+NON_IDEMPOTENT_RE = re.compile(
+    r"log-?out|sign-?out|sign-?off|unsubscribe|delete|remove|checkout|purchase|"
+    r"/pay\b|confirm|approve|/cancel|action=",
+    re.IGNORECASE,
+)
+
+
+def _read_meminfo_mb(path, field):
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def process_rss_mb(pid):
+    if not pid:
+        return None
+    return _read_meminfo_mb(f"/proc/{pid}/status", "VmRSS:")
+
+
+def available_memory_mb():
+    return _read_meminfo_mb("/proc/meminfo", "MemAvailable:")
+
+
+class SparePagePool(QObject):
+    # Pages on the shared profile created ahead of time, so neither a new tab
+    # nor a prerender pays for page setup on the critical path. The owner
+    # calls refill() once startup is out of the way.
+    def __init__(self, profile, size=SPARE_PAGES, page_class=QWebEnginePage, parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        self.size = size
+        self.page_class = page_class
+        self.pages = []
+
+    def take(self):
+        page = self.pages.pop() if self.pages else self.page_class(self.profile)
+        QTimer.singleShot(0, self.refill)
+        return page
+
+    def refill(self):
+        while len(self.pages) < self.size:
+            page = self.page_class(self.profile, self)
+            page.setUrl(QUrl("about:blank"))
+            self.pages.append(page)
+
+
+class Prerender:
+    def __init__(self, url, page):
+        self.url = url
+        self.key = strip_url(url).rstrip("/")
+        self.page = page
+        self.started = time.monotonic()
+        self.loaded = False
+
+
+class Prerenderer(QObject):
+    def __init__(self, page_pool, confidence=PRERENDER_CONFIDENCE, max_prerenders=MAX_PRERENDERS,
+                 max_rss_mb=MAX_PRERENDER_RSS_MB, parent=None):
+        super().__init__(parent)
+        self.page_pool = page_pool
+        self.confidence = confidence
+        self.max_prerenders = max_prerenders
+        self.max_rss_mb = max_rss_mb
+        self.active = []
+        self.stats = {"started": 0, "used": 0, "cancelled": 0, "skipped": 0, "over_memory": 0}
+        self.memory_timer = QTimer(self)
+        self.memory_timer.setInterval(MEMORY_CHECK_INTERVAL)
+        self.memory_timer.timeout.connect(self.check_limits)
+
+    def should_prerender(self, url, confidence, incognito):
+        if incognito or confidence < self.confidence:
+            return False
+        if not url.startswith(("http://", "https://")) or NON_IDEMPOTENT_RE.search(url):
+            return False
+        available = available_memory_mb()
+        return available is None or available >= MIN_AVAILABLE_MB
+
+    def update(self, url, confidence, incognito=False):
+        # Called whenever the URL bar's top suggestion changes
+        key = strip_url(url).rstrip("/") if url else None
+        for prerender in list(self.active):
+            if prerender.key != key:
+                self.cancel(prerender)
+        if not url or any(p.key == key for p in self.active):
+            return
+        if not self.should_prerender(url, confidence, incognito):
+            self.stats["skipped"] += 1
+            return
+        while len(self.active) >= self.max_prerenders:
+            self.cancel(self.active[0])
+
+        page = self.page_pool.take()
+        page.setParent(self)
+        page.setAudioMuted(True)
+        prerender = Prerender(url, page)
+        page.loadFinished.connect(lambda ok, p=prerender: self._loaded(p, ok))
+        page.setUrl(QUrl(url))
+        self.active.append(prerender)
+        self.stats["started"] += 1
+        self.memory_timer.start()
+
+    def take(self, url):
+        # Hand over the prerender for url, or None if there isn't one
+        key = strip_url(url).rstrip("/")
+        for prerender in self.active:
+            if prerender.key == key:
+                self.active.remove(prerender)
+                self.stats["used"] += 1
+                prerender.page.setAudioMuted(False)
+                if not self.active:
+                    self.memory_timer.stop()
+                return prerender
+        return None
+
+    def cancel(self, prerender=None):
+        targets = [prerender] if prerender else list(self.active)
+        for p in targets:
+            if p in self.active:
+                self.active.remove(p)
+                p.page.triggerAction(QWebEnginePage.Stop)
+                p.page.deleteLater()
+                self.stats["cancelled"] += 1
+        if not self.active:
+            self.memory_timer.stop()
+
+    def _loaded(self, prerender, ok):
+        prerender.loaded = ok
+        if not ok:
+            self.cancel(prerender)
+
+    def check_limits(self):
+        now = time.monotonic()
+        for prerender in list(self.active):
+            if now - prerender.started > PRERENDER_TTL:
+                self.cancel(prerender)
+                continue
+            rss = process_rss_mb(prerender.page.renderProcessPid())
+            if rss is not None and rss > self.max_rss_mb:
+                self.stats["over_memory"] += 1
+                self.cancel(prerender)
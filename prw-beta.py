@@ -1,13 +1,55 @@
 import os
 import sys
+import json
+from startup import timeline
+from singleinstance import forward_to_running_instance, parse_args, listen, INCOGNITO_FLAG, RENDER_FLAG, RENDER_FARM_FLAG
+if __name__ == "__main__" and RENDER_FLAG in sys.argv[1:]:
+    # Headless batch rendering: no window, no single-instance handover, and
+    # none of the browser's own modules to import
+    import headless
+    sys.exit(headless.main(sys.argv[1:]))
+if __name__ == "__main__" and RENDER_FARM_FLAG in sys.argv[1:]:
+    # Coordinator for several --render processes; never loads QtWebEngine
+    import renderfarm
+    sys.exit(renderfarm.main(sys.argv[1:]))
+if __name__ == "__main__" and forward_to_running_instance(sys.argv[1:]):
+    # Another instance opened the URLs; don't pay for starting WebEngine
+    sys.exit(0)
+timeline.begin("import Qt and WebEngine")
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QToolBar, QAction, QLineEdit, QWidget,
     QVBoxLayout, QTabWidget, QPushButton, QListWidget, QLabel,
-    QColorDialog, QSizePolicy, QFileDialog, QMessageBox
+    QColorDialog, QSizePolicy, QMessageBox, QCompleter
 )
 from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEngineProfile, QWebEngineSettings, QWebEnginePage
-from PyQt5.QtCore import QUrl, Qt, QSize, QFileInfo
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+from PyQt5.QtCore import QUrl, Qt, QSize, QFileInfo, QStringListModel, QIODevice, QTimer
 from PyQt5.QtGui import QFont
+from PyQt5.QtNetwork import QNetworkProxy
+timeline.end("import Qt and WebEngine")
+
+timeline.begin("import browser modules")
+from adblock import FilterEngine, load_filter_engine
+from datasaver import DataSaver
+from netlog import NetworkLogger
+from omnibox import UrlSuggester, strip_url
+from predictor import ConnectionPredictor
+from httpsfirst import HttpsUpgrader, PROBE_TIMEOUT
+from prerender import SparePagePool, Prerenderer
+from cacheproxy import CachingProxy
+from archive import ArchiveStore, ArchiveDevice, PageArchiver
+from theme import ThemeManager, PRESET_THEMES
+from thumbnails import ThumbnailService, TabPreview, TabOverview
+from tabswitcher import TabIndex, TabSwitcher
+from stallwatch import StallWatchdog
+from extensions import ExtensionManager
+from contentscripts import ContentScriptRegistry
+from downloads import DownloadManager, DownloadsPanel, CookieTracker, COMPLETED, CANCELLED
+from internal_pages import (
+    INTERNAL_SCHEME, NEW_TAB_URL, InternalSchemeHandler, register_internal_scheme,
+    create_web_channel, is_internal_url, is_privileged_url, ARCHIVE_HOST
+)
+timeline.end("import browser modules")
 
 os.environ['QTWEBENGINE_PROFILE_STORAGE'] = os.path.join(os.getcwd(), 'browser_cache')
 
@@ -16,26 +58,132 @@ HISTORY_FILE = "history.txt"
 BOOKMARKS_FILE = "bookmarks.txt"
 SESSION_FILE = "session.txt"  # NEW for session restore
 
-def read_about_file():
-    about_file_path = os.path.join(os.getcwd(), 'about.py')
-    if os.path.exists(about_file_path):
-        with open(about_file_path, 'r') as file:
-            return file.read()
-    return "About file not found."
+# Qt resource types mapped to the names used by filter list options
+RESOURCE_TYPE_NAMES = {
+    QWebEngineUrlRequestInfo.ResourceTypeMainFrame: "document",
+    QWebEngineUrlRequestInfo.ResourceTypeSubFrame: "subdocument",
+    QWebEngineUrlRequestInfo.ResourceTypeStylesheet: "stylesheet",
+    QWebEngineUrlRequestInfo.ResourceTypeScript: "script",
+    QWebEngineUrlRequestInfo.ResourceTypeImage: "image",
+    QWebEngineUrlRequestInfo.ResourceTypeFontResource: "font",
+    QWebEngineUrlRequestInfo.ResourceTypeObject: "object",
+    QWebEngineUrlRequestInfo.ResourceTypeMedia: "media",
+    QWebEngineUrlRequestInfo.ResourceTypeFavicon: "image",
+    QWebEngineUrlRequestInfo.ResourceTypeXhr: "xmlhttprequest",
+    QWebEngineUrlRequestInfo.ResourceTypePing: "ping",
+    QWebEngineUrlRequestInfo.ResourceTypePluginResource: "object",
+}
+
+NAVIGATION_TYPE_NAMES = {
+    QWebEngineUrlRequestInfo.NavigationTypeLink: "link",
+    QWebEngineUrlRequestInfo.NavigationTypeTyped: "typed",
+    QWebEngineUrlRequestInfo.NavigationTypeFormSubmitted: "form_submitted",
+    QWebEngineUrlRequestInfo.NavigationTypeBackForward: "back_forward",
+    QWebEngineUrlRequestInfo.NavigationTypeReload: "reload",
+    QWebEngineUrlRequestInfo.NavigationTypeRedirect: "redirect",
+}
+
+class RequestInterceptor(QWebEngineUrlRequestInterceptor):
+    # Runs on Chromium's IO thread for every request, so keep this cheap
+    def __init__(self, filter_engine, data_saver, parent=None):
+        super().__init__(parent)
+        self.filter_engine = filter_engine
+        self.data_saver = data_saver
+        self.adblock_enabled = True
+        self.blocked_count = 0
+        self.network_logger = None
+
+    def interceptRequest(self, info):
+        if not self.adblock_enabled and not self.network_logger and not self.data_saver.enabled:
+            return
+        url = info.requestUrl().toString()
+        first_party_url = info.firstPartyUrl().toString()
+        resource_type = RESOURCE_TYPE_NAMES.get(info.resourceType(), "other")
+        if resource_type == "document":
+            self.data_saver.page_started(url)
+        blocked = self.adblock_enabled and \
+            self.filter_engine.should_block(url, first_party_url, resource_type)
+        if blocked:
+            self.blocked_count += 1
+        else:
+            # Data saver counts only what ad blocking didn't already drop
+            blocked = self.data_saver.should_block(url, first_party_url, resource_type)
+        if blocked:
+            info.block(True)
+        if self.network_logger:
+            navigation_type = NAVIGATION_TYPE_NAMES.get(info.navigationType(), "other")
+            self.network_logger.log(url, resource_type, first_party_url, navigation_type, blocked)
+
+class BrowserPage(QWebEnginePage):
+    # Internal pages get the browser's QWebChannel; web content never does,
+    # archived pages included
+    web_channel = None
+
+    def acceptNavigationRequest(self, url, navigation_type, is_main_frame):
+        if is_main_frame:
+            channel = self.web_channel if is_privileged_url(url) else None
+            if self.webChannel() is not channel:
+                self.setWebChannel(channel)
+            # prw:// is a local scheme; a saved page must not read files
+            # through that
+            archived = is_internal_url(url) and url.host() == ARCHIVE_HOST
+            for attribute in (QWebEngineSettings.LocalContentCanAccessFileUrls,
+                              QWebEngineSettings.LocalContentCanAccessRemoteUrls):
+                if archived:
+                    self.settings().setAttribute(attribute, False)
+                else:
+                    self.settings().resetAttribute(attribute)
+        return super().acceptNavigationRequest(url, navigation_type, is_main_frame)
+
+class PreconnectHinter:
+    # A hidden page on the shared profile. <link rel=preconnect> tags injected
+    # here warm the profile's socket pool, which the real navigation reuses.
+    HINT_JS = """
+        (function (origin) {
+            var head = document.head || document.documentElement;
+            if (head.childNodes.length > 64) { head.textContent = ""; }
+            ["dns-prefetch", "preconnect"].forEach(function (rel) {
+                var link = document.createElement("link");
+                link.rel = rel;
+                link.href = origin;
+                head.appendChild(link);
+            });
+        })(%s);
+    """
+
+    def __init__(self, profile, parent=None):
+        self.page = QWebEnginePage(profile, parent)
+        self.page.setHtml("<!DOCTYPE html><html><head></head><body></body></html>")
+
+    def send_hint(self, origin):
+        self.page.runJavaScript(self.HINT_JS % json.dumps(origin))
 
 class BrowserTab(QWidget):
-    def __init__(self, parent=None, incognito=False):
+    def __init__(self, parent=None, incognito=False, interceptor=None, page=None):
         super().__init__(parent)
         self.incognito = incognito
+        # http:// URL to fall back to if the current https-first probe fails
+        self.https_fallback = None
+        # Host whose https probe failed; it's only remembered as http-only
+        # once the http fallback actually loads
+        self.https_failed_host = None
+        # Runs while an https probe is waiting for its first response
+        self.https_timer = QTimer(self)
+        self.https_timer.setSingleShot(True)
         self.browser = QWebEngineView()
 
-        if self.incognito:
+        if page is not None:
+            # Spare page from the pool; reparent it so the view owns it
+            self.profile = page.profile()
+            page.setParent(self.browser)
+            self.browser.setPage(page)
+        elif self.incognito:
             self.profile = QWebEngineProfile()
             self.profile.setPersistentCookiesPolicy(QWebEngineProfile.NoPersistentCookies)
             self.profile.setCachePath("")
             self.profile.setPersistentStoragePath("")
             self.profile.settings().setAttribute(QWebEngineSettings.LocalStorageEnabled, False)
-            self.browser.setPage(QWebEnginePage(self.profile, self.browser))
+            self.browser.setPage(BrowserPage(self.profile, self.browser))
         else:
             # Normal profile
             self.profile = QWebEngineProfile.defaultProfile()
@@ -51,51 +199,162 @@ class BrowserTab(QWidget):
 
         # NEW: Block popups by default (basic)
         self.profile.setHttpUserAgent("PhoenixRoseWeb/1.0")
-        self.profile.setRequestInterceptor(self)  # We'll add a dummy interceptor below
+        if interceptor:
+            self.profile.setUrlRequestInterceptor(interceptor)
 
         self.browser.page().featurePermissionRequested.connect(self.onFeaturePermissionRequested)  # Allow features like geolocation
 
-        self.browser.setUrl(QUrl("https://www.google.com"))
         layout = QVBoxLayout()
         layout.setContentsMargins(0, 0, 0, 0)
         layout.addWidget(self.browser)
         self.setLayout(layout)
 
+    def adopt_page(self, page):
+        # Swap in an already loaded page (e.g. a prerender); the old page is a
+        # child of the view, so setPage deletes it
+        page.setParent(self.browser)
+        self.browser.setPage(page)
+        page.featurePermissionRequested.connect(self.onFeaturePermissionRequested)
+
     def onFeaturePermissionRequested(self, url, feature):
         # Auto deny any feature requests for privacy/security
         self.browser.page().setFeaturePermission(url, feature, QWebEnginePage.PermissionDeniedByUser)
 
 class Browser(QMainWindow):
-    def __init__(self):
+    def __init__(self, urls=None, incognito=False):
         super().__init__()
         self.setWindowTitle("PhoenixRose Web")
         self.setGeometry(100, 100, 1200, 800)
         self.dark_mode = False
         self.incognito_mode = False
         self.custom_primary_color = None  # store custom theme color
+        # First, so stalls during the rest of startup are caught too
+        self.stall_watchdog = StallWatchdog(parent=self)
+        self.stall_watchdog.start()
+        self.theme_manager = ThemeManager(QApplication.instance())
 
         self.history = []
         self.bookmarks = []
-
-        self._create_menu_bar()
-        self._create_navbar()
-        self._create_bookmarks_bar()
-        self._create_tab_widget()
-        self._create_download_manager()  # NEW
-
-        self.load_history()
-        self.load_bookmarks()
-        self.load_theme()
-        self.load_session()  # NEW: restore tabs
-
-        if self.tabs.count() == 0:
-            self.add_new_tab()
-        self.update_bookmarks_bar()
+        self.startup_finished = False
+        # (urls, incognito) batches from the command line and from launches
+        # forwarded during startup, opened once the session is restored
+        self.startup_urls = [(list(urls or []), incognito)]
+
+        timeline.begin("WebEngine profile")
+        self.data_saver = DataSaver()
+        # Filters are loaded after the first paint, before any tab loads
+        self.request_interceptor = RequestInterceptor(FilterEngine(), self.data_saver, self)
+        self.url_suggester = UrlSuggester()
+        self.https_upgrader = HttpsUpgrader()
+        self.preconnect_hinter = PreconnectHinter(QWebEngineProfile.defaultProfile(), self)
+        self.predictor = ConnectionPredictor(self.preconnect_hinter.send_hint)
+        self.scheme_handler = InternalSchemeHandler(self)
+        QWebEngineProfile.defaultProfile().installUrlSchemeHandler(INTERNAL_SCHEME.encode(), self.scheme_handler)
+        BrowserPage.web_channel = create_web_channel(self)
+        self.archive_store = ArchiveStore()
+        self.page_archiver = PageArchiver(self.archive_store, parent=self)
+        self.page_archiver.progress.connect(self.archive_progress)
+        self.page_archiver.failed.connect(lambda url, error: print(f"Error archiving {url}: {error}"))
+        self.scheme_handler.add_route(ARCHIVE_HOST, self.serve_archive)
+        QWebEngineProfile.defaultProfile().downloadRequested.connect(self.handle_download)
+        self.page_pool = SparePagePool(QWebEngineProfile.defaultProfile(), page_class=BrowserPage, parent=self)
+        self.prerenderer = Prerenderer(self.page_pool, parent=self)
+        self._last_typed = ""
+        self.caching_proxy = None
+        # Shared by every normal tab, spare and prerendered pages included
+        self.content_scripts = ContentScriptRegistry()
+        self.content_scripts.attach(QWebEngineProfile.defaultProfile())
+        # Started after the first paint, with the rest of finish_startup
+        self.extension_manager = ExtensionManager(self, parent=self)
+        timeline.end("WebEngine profile")
+
+        with timeline.span("create window"):
+            self._create_menu_bar()
+            self._create_navbar()
+            self._create_bookmarks_bar()
+            self._create_tab_widget()
+            self._create_download_manager()
+            self.load_bookmarks()
+            self.load_theme()
+            self.update_bookmarks_bar()
+        # Everything else waits for the first paint; see finish_startup
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if "first paint" not in timeline.marks:
+            timeline.mark("first paint")
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        with timeline.span("adblock filters"):
+            self.request_interceptor.filter_engine = load_filter_engine()
+        with timeline.span("user scripts"):
+            # Before any tab loads, so the first pages get them too
+            self.content_scripts.load_user_scripts()
+        with timeline.span("history"):
+            self.load_history()
+            self._build_url_suggester()
+        with timeline.span("session restore"):
+            self.load_session()  # NEW: restore tabs
+            for urls, incognito in self.startup_urls:
+                self.open_urls(urls, incognito)
+            if self.tabs.count() == 0:
+                self.add_new_tab()
+        timeline.begin("first tab load")
+        self.tabs.currentWidget().browser.loadFinished.connect(self.first_tab_loaded)
+        with timeline.span("download state"):
+            self.download_manager.load_state()
+        self.stall_watchdog.load_log()
+        with timeline.span("start extensions"):
+            self.extension_manager.load()
+        with timeline.span("spare pages"):
+            self.page_pool.refill()
+        self.startup_finished = True
+
+    def open_urls(self, urls, incognito=False):
+        for url in urls:
+            fallback = None
+            if not is_internal_url(url) and "://" not in url:
+                url, fallback = self.https_upgrader.upgrade(url)
+            tab = self.add_new_tab(url, incognito=incognito)
+            self.start_https_probe(tab, fallback)
+
+    def open_forwarded(self, message):
+        # URLs from a later launch, handed over by singleinstance.listen
+        urls = message.get("urls") or []
+        incognito = bool(message.get("incognito"))
+        if self.startup_finished:
+            self.open_urls(urls, incognito)
+            if not urls:
+                self.add_new_tab(incognito=incognito)
+        else:
+            self.startup_urls.append((urls, incognito))
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
+
+    def first_tab_loaded(self):
+        self.sender().loadFinished.disconnect(self.first_tab_loaded)
+        timeline.end("first tab load")
+        timeline.mark("first tab loaded")
+        timeline.write()
+        print(f"Startup: {timeline.summary()}")
+        self.statusBar().showMessage(f"First paint after {timeline.marks['first paint']:.0f} ms", 5000)
 
     def closeEvent(self, event):
-        self.save_history()
         self.save_bookmarks()
-        self.save_session()  # NEW save session on close
+        if self.startup_finished:
+            # Before then history and tabs aren't loaded; saving would wipe them
+            self.save_history()
+            self.save_session()  # NEW save session on close
+        if not timeline.written:
+            timeline.write()
+        self.toggle_network_log(False)
+        self.toggle_caching_proxy(False)
+        self.download_manager.shutdown()
+        self.extension_manager.shutdown()
+        self.stall_watchdog.stop()
         event.accept()
 
     # ====== SESSION RESTORE NEW =======
@@ -125,9 +384,16 @@ class Browser(QMainWindow):
             except Exception as e:
                 print(f"Error loading session: {e}")
 
-    # ====== DOWNLOAD MANAGER NEW =======
+    # ====== DOWNLOAD MANAGER =======
     def _create_download_manager(self):
-        self.downloads = []  # keep track of ongoing downloads
+        state_file = os.path.join(QWebEngineProfile.defaultProfile().persistentStoragePath(), "downloads.json")
+        self.download_manager = DownloadManager(state_file=state_file, parent=self)
+        self.cookie_tracker = CookieTracker(QWebEngineProfile.defaultProfile().cookieStore(), self)
+        self.download_manager.download_finished.connect(self.download_finished)
+        self.download_manager.verified.connect(self.download_verified)
+        self.downloads_panel = DownloadsPanel(self.download_manager, self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.downloads_panel)
+        self.downloads_panel.hide()
 
     def _create_menu_bar(self):
         menu_bar = self.menuBar()
@@ -137,6 +403,18 @@ class Browser(QMainWindow):
         new_tab_action.triggered.connect(lambda: self.add_new_tab())
         file_menu.addAction(new_tab_action)
 
+        save_page_action = QAction("Save Page", self)
+        save_page_action.triggered.connect(self.save_page)
+        file_menu.addAction(save_page_action)
+
+        archive_tabs_action = QAction("Archive All Open Tabs", self)
+        archive_tabs_action.triggered.connect(self.archive_all_tabs)
+        file_menu.addAction(archive_tabs_action)
+
+        saved_pages_action = QAction("Saved Pages", self)
+        saved_pages_action.triggered.connect(lambda: self.add_new_tab(f"{INTERNAL_SCHEME}://archives"))
+        file_menu.addAction(saved_pages_action)
+
         close_tab_action = QAction("Close Tab", self)
         close_tab_action.triggered.connect(lambda: self.close_tab(self.tabs.currentIndex()))
         file_menu.addAction(close_tab_action)
@@ -150,6 +428,10 @@ class Browser(QMainWindow):
         add_bookmark_action.triggered.connect(self.add_bookmark)
         bookmarks_menu.addAction(add_bookmark_action)
 
+        show_bookmarks_action = QAction("Show All Bookmarks", self)
+        show_bookmarks_action.triggered.connect(lambda: self.add_new_tab(f"{INTERNAL_SCHEME}://bookmarks"))
+        bookmarks_menu.addAction(show_bookmarks_action)
+
         manage_bookmarks_action = QAction("Manage Bookmarks", self)
         manage_bookmarks_action.triggered.connect(self.manage_bookmarks)
         bookmarks_menu.addAction(manage_bookmarks_action)
@@ -159,6 +441,14 @@ class Browser(QMainWindow):
         show_history_action.triggered.connect(self.show_history)
         history_menu.addAction(show_history_action)
 
+        downloads_panel_action = QAction("Downloads Panel", self)
+        downloads_panel_action.triggered.connect(lambda: self.downloads_panel.show())
+        history_menu.addAction(downloads_panel_action)
+
+        show_downloads_action = QAction("Show Downloads", self)
+        show_downloads_action.triggered.connect(lambda: self.add_new_tab(f"{INTERNAL_SCHEME}://downloads"))
+        history_menu.addAction(show_downloads_action)
+
         view_menu = menu_bar.addMenu("View")
         toggle_incognito_action = QAction("Toggle Incognito Mode", self)
         toggle_incognito_action.triggered.connect(self.toggle_incognito_mode)
@@ -168,6 +458,48 @@ class Browser(QMainWindow):
         toggle_dark_mode_action.triggered.connect(self.toggle_dark_mode)
         view_menu.addAction(toggle_dark_mode_action)
 
+        adblock_action = QAction("Block Ads and Trackers", self)
+        adblock_action.setCheckable(True)
+        adblock_action.setChecked(True)
+        adblock_action.toggled.connect(self.toggle_adblock)
+        view_menu.addAction(adblock_action)
+
+        network_log_action = QAction("Log Network Requests", self)
+        network_log_action.setCheckable(True)
+        network_log_action.toggled.connect(self.toggle_network_log)
+        view_menu.addAction(network_log_action)
+
+        caching_proxy_action = QAction("Share Cache Through Local Proxy", self)
+        caching_proxy_action.setCheckable(True)
+        caching_proxy_action.toggled.connect(self.toggle_caching_proxy)
+        view_menu.addAction(caching_proxy_action)
+
+        tab_switcher_action = QAction("Search Tabs...", self)
+        tab_switcher_action.setShortcut("Ctrl+Shift+A")
+        tab_switcher_action.triggered.connect(self.show_tab_switcher)
+        view_menu.addAction(tab_switcher_action)
+
+        tab_overview_action = QAction("Tab Overview", self)
+        tab_overview_action.triggered.connect(self.show_tab_overview)
+        view_menu.addAction(tab_overview_action)
+
+        predictor_stats_action = QAction("Connection Predictor Stats", self)
+        predictor_stats_action.triggered.connect(self.show_predictor_stats)
+        view_menu.addAction(predictor_stats_action)
+
+        self.allow_site_action = QAction("Allow Full Content on This Site", self)
+        self.allow_site_action.setCheckable(True)
+        self.allow_site_action.triggered.connect(self.allow_current_site)
+        view_menu.addAction(self.allow_site_action)
+
+        stalls_action = QAction("UI Stall Report", self)
+        stalls_action.triggered.connect(lambda: self.add_new_tab(f"{INTERNAL_SCHEME}://jank"))
+        view_menu.addAction(stalls_action)
+
+        extensions_action = QAction("Extensions", self)
+        extensions_action.triggered.connect(lambda: self.add_new_tab(f"{INTERNAL_SCHEME}://extensions"))
+        view_menu.addAction(extensions_action)
+
         dev_tools_action = QAction("Toggle Developer Tools", self)  # NEW
         dev_tools_action.triggered.connect(self.toggle_dev_tools)
         view_menu.addAction(dev_tools_action)
@@ -225,31 +557,38 @@ class Browser(QMainWindow):
         home_btn.triggered.connect(self.navigate_home)
         navbar.addAction(home_btn)
 
+        self.data_saver_btn = QAction("Data Saver", self)
+        self.data_saver_btn.setCheckable(True)
+        self.data_saver_btn.setToolTip("Block images, media, web fonts and third-party scripts")
+        self.data_saver_btn.toggled.connect(self.toggle_data_saver)
+        navbar.addAction(self.data_saver_btn)
+
+        self.data_saver_label = QLabel()
+        self.data_saver_label.setVisible(False)
+        navbar.addWidget(self.data_saver_label)
+        self.data_saver_timer = QTimer(self)
+        self.data_saver_timer.setInterval(1000)
+        self.data_saver_timer.timeout.connect(self.update_data_saver_label)
+
         self.url_bar = QLineEdit()
         self.url_bar.setPlaceholderText("Search or enter website name")
         self.url_bar.setFont(QFont("San Francisco", 12))
         self.url_bar.returnPressed.connect(self.navigate_to_url)
+        self.url_bar.textEdited.connect(self.url_text_edited)
         self.url_bar.setMaximumWidth(900)
 
+        self.url_completer_model = QStringListModel(self)
+        self.url_completer = QCompleter(self.url_completer_model, self)
+        self.url_completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        self.url_bar.setCompleter(self.url_completer)
+
         navbar.addWidget(self.url_bar)
 
         self.new_tab_btn = QPushButton("+")
         self.new_tab_btn.setFixedSize(25, 25)
         self.new_tab_btn.setToolTip("Open new tab")
         self.new_tab_btn.clicked.connect(self.add_new_tab)
-        self.new_tab_btn.setStyleSheet("""
-            QPushButton {
-                font-weight: bold;
-                font-size: 18px;
-                color: #333;
-                background-color: #eee;
-                border: 1px solid #ccc;
-                border-radius: 3px;
-            }
-            QPushButton:hover {
-                background-color: #ddd;
-            }
-        """)
+        self.new_tab_btn.setFont(QFont(self.new_tab_btn.font().family(), 14, QFont.Bold))
         navbar.addWidget(self.new_tab_btn)
 
     def _create_bookmarks_bar(self):
@@ -263,34 +602,59 @@ class Browser(QMainWindow):
         self.tabs.setTabsClosable(True)
         self.tabs.setMovable(True)
         self.tabs.tabCloseRequested.connect(self.close_tab)
+        # The tab that was current before the last switch, for its last thumbnail
+        self.previous_tab = None
         self.tabs.currentChanged.connect(self.current_tab_changed)
         self.setCentralWidget(self.tabs)
+        self.thumbnails = ThumbnailService(parent=self)
+        self.tab_preview = TabPreview(self.tabs, self.thumbnails)
+        self.tab_index = TabIndex()
+        self.tab_switcher = TabSwitcher(self.tab_index, self.tabs)
+        self.tab_switcher.tab_chosen.connect(lambda tab: self.tabs.setCurrentWidget(tab))
 
     def add_new_tab(self, url=None, incognito=False):
-        new_tab = BrowserTab(incognito=incognito)
-        if url:
-            new_tab.browser.setUrl(QUrl(url))
-        else:
-            new_tab.browser.setUrl(QUrl("https://www.google.com"))
-
+        page = None if incognito else self.page_pool.take()
+        new_tab = BrowserTab(incognito=incognito, interceptor=self.request_interceptor, page=page)
+        if incognito:
+            new_tab.profile.installUrlSchemeHandler(INTERNAL_SCHEME.encode(), self.scheme_handler)
+            new_tab.profile.downloadRequested.connect(self.handle_download)
+        new_tab.browser.setUrl(QUrl(url or NEW_TAB_URL))
+
+        self.tab_index.add(new_tab, "New Tab", url or NEW_TAB_URL)
         i = self.tabs.addTab(new_tab, "New Tab")
         self.tabs.setCurrentIndex(i)
 
         # Connect signals for URL change and title update
         new_tab.browser.urlChanged.connect(lambda qurl, tab=new_tab: self.update_urlbar(qurl, tab))
+        new_tab.browser.urlChanged.connect(lambda qurl: self.predictor.record_navigation(qurl.toString()))
+        new_tab.browser.urlChanged.connect(lambda qurl, tab=new_tab: self.tab_index.update(tab, url=qurl.toString()))
+        new_tab.browser.titleChanged.connect(lambda title, tab=new_tab: self.tab_index.update(tab, title=title))
+        self._connect_page_signals(new_tab)
+        new_tab.browser.loadFinished.connect(lambda ok, tab=new_tab: self.https_load_finished(ok, tab))
+        new_tab.browser.loadStarted.connect(lambda tab=new_tab: self.https_load_started(tab))
+        new_tab.browser.loadProgress.connect(lambda progress, tab=new_tab: self.https_load_progress(progress, tab))
+        new_tab.https_timer.timeout.connect(lambda tab=new_tab: self.https_probe_timed_out(tab))
         new_tab.browser.loadFinished.connect(lambda _, tab=new_tab: self.update_tab_title(tab))
         new_tab.browser.loadFinished.connect(lambda _, tab=new_tab: self.add_to_history(tab.browser.url().toString()))
+        new_tab.browser.loadFinished.connect(lambda _, tab=new_tab: self.thumbnails.schedule(tab))
+        new_tab.browser.urlChanged.connect(
+            lambda qurl, tab=new_tab: self.extension_manager.dispatch("navigation", tab, url=qurl.toString()))
+        new_tab.browser.loadFinished.connect(
+            lambda ok, tab=new_tab: self.extension_manager.dispatch(
+                "load_finished", tab, url=tab.browser.url().toString(), ok=ok))
+        self.extension_manager.dispatch("tab_created", new_tab, url=url or NEW_TAB_URL)
 
         # NEW: Show stop/reload toggle
         new_tab.browser.loadStarted.connect(lambda tab=new_tab: self.toggle_reload_stop(True))
         new_tab.browser.loadFinished.connect(lambda tab=new_tab: self.toggle_reload_stop(False))
 
-        # NEW: Hook download requests
-        new_tab.browser.page().profile().downloadRequested.connect(self.handle_download)
-
         self.apply_theme_to_tab(new_tab)
         return new_tab
 
+    def _connect_page_signals(self, tab):
+        # Signals that live on the page rather than the view; redone after a page swap
+        tab.browser.page().linkHovered.connect(lambda url, tab=tab: self.link_hovered(url, tab))
+
     def toggle_reload_stop(self, loading):
         self.reload_btn.setVisible(not loading)
         self.stop_btn.setVisible(loading)
@@ -298,6 +662,9 @@ class Browser(QMainWindow):
     def stop_loading(self):
         current_tab = self.tabs.currentWidget()
         if current_tab:
+            current_tab.https_fallback = None
+            current_tab.https_failed_host = None
+            current_tab.https_timer.stop()
             current_tab.browser.stop()
 
     def close_tab(self, i):
@@ -305,13 +672,27 @@ class Browser(QMainWindow):
             return
         tab = self.tabs.widget(i)
         self.tabs.removeTab(i)
+        self.thumbnails.forget(tab)
+        self.tab_index.remove(tab)
+        self.extension_manager.dispatch("tab_closed", tab)
         tab.deleteLater()
 
     def current_tab_changed(self, i):
         tab = self.tabs.widget(i)
+        previous, self.previous_tab = self.previous_tab, tab
+        # A closed tab is already out of the widget and gets no thumbnail
+        if previous is not None and previous is not tab and self.tabs.indexOf(previous) != -1:
+            self.thumbnails.leaving(previous)
         if tab:
             self.update_urlbar(tab.browser.url(), tab)
-            self.apply_theme_to_tab(tab)
+            self.thumbnails.tab_shown(tab)
+            self.tab_index.touch(tab)
+
+    def show_tab_switcher(self):
+        self.tab_switcher.open()
+
+    def show_tab_overview(self):
+        TabOverview(self.tabs, self.thumbnails, self).exec_()
 
     def update_urlbar(self, qurl, tab):
         if tab != self.tabs.currentWidget():
@@ -319,6 +700,8 @@ class Browser(QMainWindow):
         url = qurl.toString()
         self.url_bar.setText(url)
         self.url_bar.setCursorPosition(0)
+        self.allow_site_action.setChecked(self.data_saver.is_allowed(url))
+        self.update_data_saver_label()
 
     def update_tab_title(self, tab):
         i = self.tabs.indexOf(tab)
@@ -326,15 +709,117 @@ class Browser(QMainWindow):
             title = tab.browser.page().title()
             self.tabs.setTabText(i, title if title else "New Tab")
 
+    # ===== URL BAR SUGGESTIONS / CONNECTION PREDICTION =====
+    def _build_url_suggester(self):
+        for url in self.history:
+            self.url_suggester.add_visit(url, when=0)
+        for _, url in self.bookmarks:
+            self.url_suggester.add_bookmark(url)
+
+    def url_text_edited(self, text):
+        deleting = len(text) < len(self._last_typed)
+        self._last_typed = text
+        suggestions = self.url_suggester.suggest(text)
+        self.url_completer_model.setStringList([url for url, _ in suggestions])
+        current_tab = self.tabs.currentWidget()
+        incognito = current_tab.incognito if current_tab else self.incognito_mode
+        # Incognito tabs each have a throwaway profile the hinter can't reach
+        if suggestions and not incognito:
+            self.predictor.hint(suggestions[0][0], "typed")
+
+        top_url, confidence = self.url_suggester.top_hit(text) if suggestions else (None, 0.0)
+        self.prerenderer.update(top_url, confidence, incognito)
+        if top_url and not deleting and confidence >= self.prerenderer.confidence:
+            # Inline-complete the confident hit so Enter goes where the prerender is
+            completion = strip_url(top_url)
+            if completion.startswith(text.lower()) and len(completion) > len(text):
+                self.url_bar.setText(text + completion[len(text):])
+                self.url_bar.setSelection(len(text), len(completion) - len(text))
+
+    def link_hovered(self, url, tab):
+        if url and not tab.incognito:
+            self.predictor.hint(url, "hover")
+
+    def show_predictor_stats(self):
+        stats = self.predictor.summary()
+        stats.update({f"prerender_{key}": value for key, value in self.prerenderer.stats.items()})
+        QMessageBox.information(self, "Connection Predictor",
+                                "\n".join(f"{key}: {value}" for key, value in stats.items()))
+
     def navigate_to_url(self):
         url = self.url_bar.text().strip()
         if not url:
             return
-        if not url.startswith("http://") and not url.startswith("https://"):
-            url = "http://" + url
+        fallback = None
+        if not is_internal_url(url):
+            url, fallback = self.https_upgrader.upgrade(url)
+        self._last_typed = ""
         current_tab = self.tabs.currentWidget()
         if current_tab:
-            current_tab.browser.setUrl(QUrl(url))
+            prerender = None if current_tab.incognito else self.prerenderer.take(url)
+            self.start_https_probe(current_tab, None if prerender else fallback)
+            current_tab.https_failed_host = None
+            if prerender:
+                page = prerender.page
+                current_tab.adopt_page(page)
+                self._connect_page_signals(current_tab)
+                self.update_urlbar(page.url(), current_tab)
+                self.update_tab_title(current_tab)
+                self.predictor.record_navigation(page.url().toString())
+                if prerender.loaded:
+                    self.add_to_history(page.url().toString())
+            else:
+                current_tab.browser.setUrl(QUrl(url))
+        self.prerenderer.cancel()
+
+    def start_https_probe(self, tab, fallback):
+        tab.https_fallback = fallback
+        if fallback:
+            tab.https_timer.start(PROBE_TIMEOUT)
+        else:
+            tab.https_timer.stop()
+
+    def https_load_started(self, tab):
+        # The probe's own load keeps its timer; any other navigation ends it
+        if tab.https_timer.isActive() and \
+                tab.browser.page().requestedUrl().host() != QUrl(tab.https_fallback).host():
+            tab.https_timer.stop()
+            tab.https_fallback = None
+
+    def https_load_progress(self, progress, tab):
+        # Chromium reports 10% when a load starts and only goes past that
+        # once a response has committed
+        if progress > 10 and tab.https_timer.isActive() and tab.browser.url().scheme() == "https":
+            tab.https_timer.stop()
+
+    def https_probe_timed_out(self, tab):
+        fallback, tab.https_fallback = tab.https_fallback, None
+        if not fallback:
+            return
+        # Cleared first, so the loadFinished(False) from stop() doesn't fall back again
+        tab.browser.stop()
+        self.https_upgrader.stats["fallbacks"] += 1
+        tab.https_failed_host = QUrl(fallback).host()
+        tab.browser.setUrl(QUrl(fallback))
+
+    def https_load_finished(self, ok, tab):
+        tab.https_timer.stop()
+        url = tab.browser.url()
+        fallback, tab.https_fallback = tab.https_fallback, None
+        failed_host, tab.https_failed_host = tab.https_failed_host, None
+        if ok:
+            # Covers both probes and http:// loads that redirected to https
+            if url.scheme() == "https" and not tab.incognito:
+                self.https_upgrader.record(url.host(), True)
+            elif url.scheme() == "http" and url.host() == failed_host and not tab.incognito:
+                # Reachable over http but not https; a failure that was just
+                # being offline, DNS or a timeout never gets here
+                self.https_upgrader.record(failed_host, False)
+            return
+        if fallback and url.host() == QUrl(fallback).host():
+            self.https_upgrader.stats["fallbacks"] += 1
+            tab.https_failed_host = url.host()
+            tab.browser.setUrl(QUrl(fallback))
 
     def go_back(self):
         current_tab = self.tabs.currentWidget()
@@ -364,6 +849,7 @@ class Browser(QMainWindow):
             title = current_tab.browser.page().title()
             if (title, url) not in self.bookmarks:
                 self.bookmarks.append((title, url))
+                self.url_suggester.add_bookmark(url)
                 self.update_bookmarks_bar()
 
     def update_bookmarks_bar(self):
@@ -371,7 +857,6 @@ class Browser(QMainWindow):
         for title, url in self.bookmarks:
             btn = QPushButton(title)
             btn.setToolTip(url)
-            btn.setStyleSheet("background-color: #e0e0e0; margin: 2px; padding: 2px 8px; border-radius: 4px;")
             btn.clicked.connect(lambda checked, url=url: self.open_bookmark(url))
             self.bookmark_toolbar.addWidget(btn)
 
@@ -405,32 +890,16 @@ class Browser(QMainWindow):
 
     # ===== HISTORY =====
     def add_to_history(self, url):
+        if is_internal_url(url):
+            return
+        if url:
+            self.url_suggester.add_visit(url)
         if url and url not in self.history:
             self.history.append(url)
             self.save_history()
 
     def show_history(self):
-        dlg = QWidget()
-        dlg.setWindowTitle("History")
-        dlg.setGeometry(300, 300, 400, 400)
-        layout = QVBoxLayout()
-        list_widget = QListWidget()
-        for url in self.history:
-            list_widget.addItem(url)
-        layout.addWidget(list_widget)
-
-        def open_selected():
-            selected = list_widget.currentRow()
-            if selected >= 0:
-                url = self.history[selected]
-                self.add_new_tab(url)
-
-        open_btn = QPushButton("Open Selected")
-        open_btn.clicked.connect(open_selected)
-        layout.addWidget(open_btn)
-
-        dlg.setLayout(layout)
-        dlg.show()
+        self.add_new_tab(f"{INTERNAL_SCHEME}://history")
 
     def save_history(self):
         try:
@@ -483,9 +952,9 @@ class Browser(QMainWindow):
                         self.dark_mode = False
                     if color:
                         self.custom_primary_color = color
-                    self.apply_theme()
             except Exception as e:
                 print(f"Error loading theme: {e}")
+        self.apply_theme()
 
     def save_theme(self):
         try:
@@ -501,14 +970,8 @@ class Browser(QMainWindow):
         self.save_theme()
 
     def apply_preset_theme(self, theme):
-        themes = {
-            "light": (False, None),
-            "dark": (True, None),
-            "blue": (False, "#2196f3"),
-            "purple": (False, "#9c27b0"),
-        }
-        if theme in themes:
-            self.dark_mode, self.custom_primary_color = themes[theme]
+        if theme in PRESET_THEMES:
+            self.dark_mode, self.custom_primary_color = PRESET_THEMES[theme]
             self.apply_theme()
             self.save_theme()
 
@@ -520,24 +983,10 @@ class Browser(QMainWindow):
             self.save_theme()
 
     def apply_theme(self):
-        if self.dark_mode:
-            self.setStyleSheet("""
-                QMainWindow { background-color: #121212; color: #eee; }
-                QToolBar { background-color: #222; }
-                QPushButton { background-color: #333; color: #eee; }
-                QLineEdit { background-color: #222; color: #eee; }
-            """)
-        else:
-            base_color = self.custom_primary_color if self.custom_primary_color else "#f0f0f0"
-            self.setStyleSheet(f"""
-                QMainWindow {{ background-color: {base_color}; color: #000; }}
-                QToolBar {{ background-color: #ddd; }}
-                QPushButton {{ background-color: #eee; color: #000; }}
-                QLineEdit {{ background-color: #fff; color: #000; }}
-            """)
-        # Apply theme to all tabs
-        for i in range(self.tabs.count()):
-            self.apply_theme_to_tab(self.tabs.widget(i))
+        # Pages only need touching when dark mode flips
+        if self.theme_manager.apply(self.dark_mode, self.custom_primary_color):
+            for i in range(self.tabs.count()):
+                self.apply_theme_to_tab(self.tabs.widget(i))
 
     def apply_theme_to_tab(self, tab):
         if self.dark_mode:
@@ -561,6 +1010,63 @@ class Browser(QMainWindow):
             page.setDevToolsPage(self._dev_tools.page())
             self._dev_tools.show()
 
+    # ===== AD BLOCKING =====
+    def toggle_adblock(self, enabled):
+        self.request_interceptor.adblock_enabled = enabled
+
+    # ===== DATA SAVER =====
+    def toggle_data_saver(self, enabled):
+        self.data_saver.enabled = enabled
+        self.data_saver_label.setVisible(enabled)
+        if enabled:
+            self.data_saver_timer.start()
+            self.update_data_saver_label()
+        else:
+            self.data_saver_timer.stop()
+
+    def allow_current_site(self, allowed):
+        current_tab = self.tabs.currentWidget()
+        if current_tab:
+            self.data_saver.set_allowed(current_tab.browser.url().toString(), allowed)
+            if self.data_saver.enabled:
+                current_tab.browser.reload()
+
+    def update_data_saver_label(self):
+        current_tab = self.tabs.currentWidget()
+        if not self.data_saver.enabled or not current_tab:
+            return
+        url = current_tab.browser.url().toString()
+        if self.data_saver.is_allowed(url):
+            self.data_saver_label.setText(" Site allowed ")
+            return
+        requests, saved_bytes = self.data_saver.page_savings(url)
+        self.data_saver_label.setText(f" {requests} requests, ~{saved_bytes // 1024} KB saved ")
+
+    # ===== NETWORK LOG =====
+    def toggle_network_log(self, enabled):
+        logger = self.request_interceptor.network_logger
+        if enabled and not logger:
+            logger = NetworkLogger()
+            logger.start()
+            self.request_interceptor.network_logger = logger
+        elif not enabled and logger:
+            self.request_interceptor.network_logger = None
+            logger.stop()
+
+    # ===== CACHING PROXY =====
+    def toggle_caching_proxy(self, enabled):
+        # The application proxy applies to every profile, so incognito tabs
+        # share the cache too; only public responses are ever stored
+        if enabled and not self.caching_proxy:
+            self.caching_proxy = CachingProxy()
+            self.caching_proxy.start()
+            QNetworkProxy.setApplicationProxy(
+                QNetworkProxy(QNetworkProxy.HttpProxy, "127.0.0.1", self.caching_proxy.port))
+        elif not enabled and self.caching_proxy:
+            QNetworkProxy.setApplicationProxy(QNetworkProxy(QNetworkProxy.NoProxy))
+            self.caching_proxy.stop()
+            self.caching_proxy = None
+
     # ===== INCOGNITO MODE =====
     def toggle_incognito_mode(self):
         self.incognito_mode = not self.incognito_mode
@@ -569,32 +1075,77 @@ class Browser(QMainWindow):
 
     # ===== ABOUT =====
     def show_about(self):
-        about_text = read_about_file()
-        dlg = QMessageBox(self)
-        dlg.setWindowTitle("About PhoenixRose Web")
-        dlg.setText(about_text)
-        dlg.setStandardButtons(QMessageBox.Ok)
-        dlg.exec_()
-
-    # ===== DOWNLOAD HANDLER NEW =====
+        self.add_new_tab(f"{INTERNAL_SCHEME}://about")
+
+    # ===== PAGE ARCHIVES =====
+    def _archivable_pages(self, tabs):
+        pages = []
+        for tab in tabs:
+            url = tab.browser.url()
+            if url.scheme() in ("http", "https"):
+                pages.append(tab.browser.page())
+        return pages
+
+    def save_page(self):
+        current_tab = self.tabs.currentWidget()
+        if current_tab:
+            self.page_archiver.archive(self._archivable_pages([current_tab]))
+
+    def archive_all_tabs(self):
+        tabs = [self.tabs.widget(i) for i in range(self.tabs.count())]
+        self.page_archiver.archive(self._archivable_pages(tabs))
+
+    def archive_progress(self, done, total):
+        self.statusBar().showMessage(f"Archived {done} of {total} pages", 3000)
+
+    def serve_archive(self, job, url):
+        manifest = self.archive_store.load_manifest(url.path().strip("/"))
+        if not manifest:
+            job.fail(job.UrlNotFound)
+            return
+        device = ArchiveDevice(self.archive_store, manifest, job)
+        device.open(QIODevice.ReadOnly)
+        job.reply(b"multipart/related", device)
+
+    # ===== DOWNLOAD HANDLER =====
     def handle_download(self, download):
-        path, _ = QFileDialog.getSaveFileName(self, "Save File", download.path())
-        if path:
-            download.setPath(path)
-            download.accept()
-            download.finished.connect(lambda: self.download_finished(download))
+        if self.page_archiver.handle_download(download):
+            return
+        page = download.page()
+        profile = page.profile() if page else QWebEngineProfile.defaultProfile()
+        # Range requests, the probe included, go out without the profile's
+        # cookies, so downloads from hosts with cookies stay in QtWebEngine:
+        # a signed or single-use link may not survive an extra request.
+        # Incognito downloads are never written to the download state file.
+        range_ok = not profile.isOffTheRecord() and not self.cookie_tracker.has_cookies(download.url().host())
+        self.download_manager.add_item(download, range_ok, range_ok, profile.httpUserAgent())
 
     def download_finished(self, download):
-        if download.state() == download.DownloadCompleted:
-            QMessageBox.information(self, "Download Completed", f"Downloaded: {download.path()}")
-        elif download.state() == download.DownloadCancelled:
-            QMessageBox.warning(self, "Download Cancelled", "Download was cancelled.")
-        elif download.state() == download.DownloadInterrupted:
-            QMessageBox.warning(self, "Download Interrupted", "Download was interrupted.")
+        name = os.path.basename(download.path)
+        if download.state == COMPLETED:
+            self.statusBar().showMessage(f"Downloaded {name}", 5000)
+        elif download.state == CANCELLED:
+            self.statusBar().showMessage(f"Cancelled {name}", 5000)
+        else:
+            self.statusBar().showMessage(f"Download of {name} failed: {download.error}", 5000)
+
+    def download_verified(self, download):
+        name = os.path.basename(download.path)
+        matches = download.sha256_matches()
+        if matches is False:
+            self.statusBar().showMessage(f"SHA-256 of {name} doesn't match the expected digest", 10000)
+            self.downloads_panel.show()
+        elif matches:
+            self.statusBar().showMessage(f"Verified {name} (SHA-256 matches)", 5000)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    app.setApplicationName("PhoenixRose Web")
-    window = Browser()
+    register_internal_scheme()
+    with timeline.span("QApplication"):
+        app = QApplication(sys.argv)
+        app.setApplicationName("PhoenixRose Web")
+    urls, flags = parse_args(sys.argv[1:])
+    with timeline.span("Browser.__init__"):
+        window = Browser(urls, incognito=INCOGNITO_FLAG in flags)
+    window.single_instance = listen(window.open_forwarded, window)
     window.show()
     sys.exit(app.exec_())
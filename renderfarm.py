@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque, Counter
+
+from PyQt5.QtCore import QObject, QProcess, QTimer, QCoreApplication, pyqtSignal
+
+from renderoptions import build_parser, OK, TIMEOUT, FAILED
+from singleinstance import RENDER_FLAG, RENDER_FARM_FLAG
+
+# `prw-beta.py --render-farm urls.txt` shards a URL list over several
+# `--render` workers, one browser process each with a profile directory of
+# its own. The coordinator never loads QtWebEngine itself.
+WORKERS = os.cpu_count() or 2
+WORKER_POOL = 2
+# URLs sent to a worker ahead of the ones it's rendering, so it never waits for us
+PREFETCH = 2
+# Attempts per URL, each on a different worker
+MAX_ATTEMPTS = 3
+MAX_WORKER_RESTARTS = 2
+PROGRESS_INTERVAL = 1000
+PROFILES_DIR = "render-profiles"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Worker(QObject):
+    # One `--render` process; URLs go in on stdin, results come back as
+    # JSON lines on stdout
+    result = pyqtSignal(object, object)
+    exited = pyqtSignal(object)
+
+    def __init__(self, index, arguments, window, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.arguments = arguments
+        self.window = window
+        # This worker's share; others steal from the back when they run dry
+        self.queue = deque()
+        self.in_flight = Counter()
+        self.process = None
+        self.buffer = b""
+        self.error_buffer = b""
+        self.restarts = 0
+        self.rendered = 0
+        self.failed_attempts = 0
+        self.stolen = 0
+        self.times = []
+
+    def alive(self):
+        return self.process is not None
+
+    def start(self):
+        self.buffer = b""
+        self.error_buffer = b""
+        self.process = QProcess(self)
+        self.process.setProgram(sys.executable)
+        self.process.setArguments(self.arguments)
+        self.process.readyReadStandardOutput.connect(self._read_stdout)
+        self.process.readyReadStandardError.connect(self._read_stderr)
+        self.process.finished.connect(self._finished)
+        self.process.errorOccurred.connect(self._error)
+        self.process.start()
+
+    def capacity(self):
+        return self.window - sum(self.in_flight.values()) if self.alive() else 0
+
+    def send(self, url):
+        self.in_flight[url] += 1
+        self.process.write(url.encode("utf-8") + b"\n")
+
+    def finish_input(self):
+        if self.process is not None:
+            self.process.closeWriteChannel()
+
+    def _read_stdout(self):
+        self.buffer += bytes(self.process.readAllStandardOutput())
+        *lines, self.buffer = self.buffer.split(b"\n")
+        for line in lines:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            url = result.get("url")
+            if url not in self.in_flight:
+                continue
+            self.in_flight[url] -= 1
+            if not self.in_flight[url]:
+                del self.in_flight[url]
+            self.result.emit(self, result)
+
+    def _read_stderr(self):
+        self.error_buffer += bytes(self.process.readAllStandardError())
+        *lines, self.error_buffer = self.error_buffer.split(b"\n")
+        for line in lines:
+            print(f"[worker {self.index}] {line.decode('utf-8', 'replace').rstrip()}", file=sys.stderr)
+
+    def _error(self, error):
+        if error == QProcess.FailedToStart:
+            print(f"Error starting render worker {self.index}: {self.process.errorString()}", file=sys.stderr)
+            self._finished(-1, QProcess.CrashExit)
+
+    def _finished(self, code, status):
+        if self.process is None:
+            return
+        self.process.deleteLater()
+        self.process = None
+        self.exited.emit(self)
+
+
+class RenderFarm(QObject):
+    # Shards the list round-robin, keeps every worker PREFETCH URLs ahead,
+    # lets idle workers steal half of the longest queue, and retries failed
+    # URLs on workers that haven't tried them yet. Only final results are
+    # streamed out.
+    done = pyqtSignal()
+
+    def __init__(self, urls, options, entry, out=sys.stdout, parent=None):
+        super().__init__(parent)
+        self.options = options
+        self.out = out
+        # Rendering the same URL twice would only overwrite the same file
+        self.urls = list(dict.fromkeys(urls))
+        # url -> indexes of the workers that have tried it
+        self.tried = {url: set() for url in self.urls}
+        self.workers = []
+        for i in range(max(1, options.workers)):
+            profile = os.path.join(options.profiles, f"worker-{i}")
+            arguments = [entry, RENDER_FLAG, "-", "--profile", profile, "--out", options.out,
+                         "--format", options.format, "--pool", str(options.pool),
+                         "--timeout", str(options.timeout), "--idle", str(options.idle),
+                         "--width", str(options.width), "--height", str(options.height)]
+            worker = Worker(i, arguments, options.pool + PREFETCH, self)
+            worker.result.connect(self._result)
+            worker.exited.connect(self._exited)
+            self.workers.append(worker)
+        for i, url in enumerate(self.urls):
+            self.workers[i % len(self.workers)].queue.append(url)
+        self.counts = {OK: 0, TIMEOUT: 0, FAILED: 0}
+        self.retries = 0
+        self.steals = 0
+        self.finished = False
+        self.started = time.monotonic()
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(PROGRESS_INTERVAL)
+        self.progress_timer.timeout.connect(self.report_progress)
+
+    def start(self):
+        self.started = time.monotonic()
+        for worker in self.workers:
+            worker.start()
+        for worker in self.workers:
+            self._feed(worker)
+        self.progress_timer.start()
+        self._check_finished()
+
+    def completed(self):
+        return sum(self.counts.values())
+
+    def _feed(self, worker):
+        while worker.capacity() > 0:
+            if not worker.queue and not self._steal(worker):
+                return
+            url = worker.queue.popleft()
+            self.tried[url].add(worker.index)
+            worker.send(url)
+
+    def _steal(self, thief):
+        # Half of the longest queue, from its far end; dead workers' queues too
+        victim = max((w for w in self.workers if w is not thief), key=lambda w: len(w.queue), default=None)
+        if victim is None or not victim.queue:
+            return False
+        for _ in range((len(victim.queue) + 1) // 2):
+            thief.queue.appendleft(victim.queue.pop())
+        thief.stolen += 1
+        self.steals += 1
+        return True
+
+    def _retry_target(self, url):
+        candidates = [w for w in self.workers if w.alive() and w.index not in self.tried[url]]
+        if not candidates or len(self.tried[url]) >= self.options.attempts:
+            return None
+        return min(candidates, key=lambda w: len(w.queue) + sum(w.in_flight.values()))
+
+    def _result(self, worker, result):
+        url = result["url"]
+        if result["status"] == OK:
+            worker.rendered += 1
+            worker.times.append(result.get("ms", 0))
+        else:
+            worker.failed_attempts += 1
+            target = self._retry_target(url)
+            if target is not None:
+                self.retries += 1
+                # Ahead of the target's own share, so retries don't wait for the end
+                target.queue.appendleft(url)
+                self._feed(target)
+                self._feed(worker)
+                return
+        result["worker"] = worker.index
+        result["attempts"] = len(self.tried[url])
+        self._emit(result)
+        self._feed(worker)
+
+    def _emit(self, result):
+        self.counts[result["status"]] += 1
+        self.out.write(json.dumps(result) + "\n")
+        self.out.flush()
+        self._check_finished()
+
+    def _exited(self, worker):
+        lost = list(worker.in_flight.elements())
+        worker.in_flight.clear()
+        if self.finished:
+            if not any(w.alive() for w in self.workers):
+                self.done.emit()
+            return
+        print(f"Render worker {worker.index} exited with {len(lost)} pages in flight", file=sys.stderr)
+        if worker.restarts < MAX_WORKER_RESTARTS:
+            worker.restarts += 1
+            worker.start()
+        for url in lost:
+            self._result(worker, {"url": url, "status": FAILED, "error": "worker exited"})
+        for other in self.workers:
+            self._feed(other)
+        if not any(w.alive() for w in self.workers):
+            for w in self.workers:
+                while w.queue:
+                    url = w.queue.popleft()
+                    self._emit({"url": url, "status": FAILED, "error": "no render workers left",
+                                "attempts": len(self.tried[url])})
+
+    def _check_finished(self):
+        if self.finished or self.completed() < len(self.urls):
+            return
+        self.finished = True
+        self.progress_timer.stop()
+        for worker in self.workers:
+            worker.finish_input()
+        if not any(w.alive() for w in self.workers):
+            self.done.emit()
+
+    def report_progress(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.counts[OK] / elapsed if elapsed else 0
+        per_worker = " ".join(f"{w.index}:{w.rendered}{'' if w.alive() else '!'}" for w in self.workers)
+        print(f"[farm] {self.completed()}/{len(self.urls)} done, {self.counts[OK]} ok, "
+              f"{self.counts[TIMEOUT] + self.counts[FAILED]} failed, {self.retries} retries, "
+              f"{self.steals} steals, {rate:.2f} pages/s | {per_worker}", file=sys.stderr)
+
+    def metrics(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "urls": len(self.urls),
+            "ok": self.counts[OK],
+            "timeouts": self.counts[TIMEOUT],
+            "failed": self.counts[FAILED],
+            "retries": self.retries,
+            "steals": self.steals,
+            "elapsed_s": round(elapsed, 2),
+            "pages_per_s": round(self.counts[OK] / elapsed, 2) if elapsed else 0,
+            "workers": [{
+                "worker": w.index,
+                "rendered": w.rendered,
+                "failed_attempts": w.failed_attempts,
+                "steals": w.stolen,
+                "restarts": w.restarts,
+                "mean_ms": round(sum(w.times) / len(w.times)) if w.times else 0,
+                "p95_ms": percentile(w.times, 0.95),
+            } for w in self.workers],
+        }
+
+
+def parse_args(argv):
+    parser = build_parser("prw-beta.py --render-farm", "Render URLs with several headless browser processes.")
+    parser.add_argument(RENDER_FARM_FLAG, action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="browser processes")
+    parser.add_argument("--attempts", type=int, default=MAX_ATTEMPTS,
+                        help="tries per URL, each on a different worker")
+    parser.add_argument("--profiles", default=PROFILES_DIR, help="directory for the workers' profiles")
+    parser.add_argument("--metrics", help="write the final metrics here as JSON")
+    parser.set_defaults(pool=WORKER_POOL)
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    options = parse_args(argv)
+    try:
+        if options.urls == "-":
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(options.urls, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+    except OSError as e:
+        print(f"Error reading URL list: {e}", file=sys.stderr)
+        return 2
+    urls = [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+    app = QCoreApplication([sys.argv[0]])
+    # Workers run the same entry point in --render mode
+    farm = RenderFarm(urls, options, os.path.abspath(sys.argv[0]))
+    farm.done.connect(app.quit)
+    QTimer.singleShot(0, farm.start)
+    app.exec_()
+    metrics = farm.metrics()
+    if options.metrics:
+        try:
+            with open(options.metrics, "w") as f:
+                json.dump(metrics, f, indent=2)
+        except OSError as e:
+            print(f"Error writing metrics: {e}", file=sys.stderr)
+    print(f"Rendered {metrics['ok']} of {metrics['urls']} pages in {metrics['elapsed_s']} s "
+          f"({metrics['pages_per_s']} pages/s) with {len(farm.workers)} workers; "
+          f"{metrics['retries']} retries, {metrics['steals']} steals", file=sys.stderr)
+    return 0 if metrics["ok"] == metrics["urls"] else 1
@@ -0,0 +1,31 @@
+import argparse
+
+# What `--render` and `--render-farm` share: their options and the result
+# statuses. No Qt here, so the farm's coordinator never loads QtWebEngine.
+POOL_SIZE = 4
+# Seconds a page gets to load
+PAGE_TIMEOUT = 30
+# Network idle: no request started for this long (ms) once the load finished
+NETWORK_IDLE = 500
+VIEWPORT_WIDTH = 1280
+VIEWPORT_HEIGHT = 800
+FORMATS = ("png", "pdf")
+OUTPUT_DIR = "renders"
+
+OK = "ok"
+TIMEOUT = "timeout"
+FAILED = "failed"
+
+
+def build_parser(prog, description):
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    parser.add_argument("urls", nargs="?", default="-", help="file with one URL per line; - for stdin")
+    parser.add_argument("--format", choices=FORMATS, default="png")
+    parser.add_argument("--out", default=OUTPUT_DIR, help="directory for the rendered files")
+    parser.add_argument("--pool", type=int, default=POOL_SIZE, help="pages rendering at once")
+    parser.add_argument("--timeout", type=float, default=PAGE_TIMEOUT, help="seconds each page gets to load")
+    parser.add_argument("--idle", type=int, default=NETWORK_IDLE,
+                        help="ms without new requests that count as network idle")
+    parser.add_argument("--width", type=int, default=VIEWPORT_WIDTH)
+    parser.add_argument("--height", type=int, default=VIEWPORT_HEIGHT)
+    return parser
@@ -0,0 +1,324 @@
+import os
+import sys
+import time
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin
+
+MIN_SEGMENTED_SIZE = 8 * 1024 * 1024
+MAX_SEGMENTS = 8
+INITIAL_SEGMENTS = 2
+READ_CHUNK = 256 * 1024
+# Must stay well above READ_CHUNK: a split never lands inside a chunk
+# a worker is already writing
+MIN_SPLIT_SIZE = 1024 * 1024
+MAX_RETRIES = 5
+RETRY_BACKOFF = 0.5
+ADAPT_INTERVAL = 1.0
+# Another connection is only added while the last one raised throughput by 10%
+ADAPT_GAIN = 1.1
+TIMEOUT = 30
+MAX_REDIRECTS = 5
+
+
+class ResourceChanged(Exception):
+    pass
+
+
+def _connection(parts):
+    port = parts.port
+    if parts.scheme == "https":
+        return http.client.HTTPSConnection(parts.hostname, port or 443, timeout=TIMEOUT)
+    return http.client.HTTPConnection(parts.hostname, port or 80, timeout=TIMEOUT)
+
+
+def _request_path(parts):
+    return (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+
+def parse_content_range(value):
+    # "bytes 0-0/1234" -> (0, 0, 1234)
+    try:
+        unit, _, spec = value.strip().partition(" ")
+        span, _, total = spec.partition("/")
+        start, _, end = span.partition("-")
+        if unit.lower() != "bytes":
+            return None
+        return int(start), int(end), int(total)
+    except (AttributeError, ValueError):
+        return None
+
+
+def probe(url, headers=None):
+    # Returns (final_url, total, validator) when url can be fetched in byte
+    # ranges, None otherwise. The validator is what If-Range gets sent with.
+    headers = dict(headers or {})
+    for _ in range(MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            return None
+        conn = _connection(parts)
+        try:
+            conn.request("GET", _request_path(parts), headers=dict(headers, Range="bytes=0-0"))
+            response = conn.getresponse()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if response.status != 206:
+                return None
+            content_range = parse_content_range(response.getheader("Content-Range", ""))
+            if not content_range or content_range[0] != 0:
+                return None
+            accept_ranges = response.getheader("Accept-Ranges", "bytes").lower()
+            if accept_ranges != "bytes":
+                return None
+            etag = response.getheader("ETag")
+            validator = etag if etag and not etag.startswith("W/") else response.getheader("Last-Modified")
+            return url, content_range[2], validator
+        except (OSError, http.client.HTTPException):
+            return None
+        finally:
+            conn.close()
+    return None
+
+
+def _pwrite_fallback(lock):
+    def pwrite(fd, data, offset):
+        with lock:
+            os.lseek(fd, offset, os.SEEK_SET)
+            return os.write(fd, data)
+    return pwrite
+
+
+class Segment:
+    __slots__ = ("start", "pos", "end", "retries", "owned")
+
+    def __init__(self, start, end, pos=None):
+        self.start = start
+        self.end = end
+        self.pos = start if pos is None else pos
+        self.retries = 0
+        self.owned = False
+
+    def remaining(self):
+        return self.end - self.pos
+
+
+class SegmentedFetcher:
+    # Fetches url into path with parallel range requests. Every worker
+    # writes its bytes straight to their final offset in one preallocated
+    # file, so nothing is stitched afterwards. Workers that run out of work
+    # split the largest remaining segment in half.
+    def __init__(self, url, path, total, validator=None, headers=None, max_segments=MAX_SEGMENTS,
+                 segments=None):
+        self.url = url
+        self.path = path
+        self.total = total
+        self.validator = validator
+        self.headers = dict(headers or {})
+        self.max_segments = max_segments
+        self.segments = segments or [Segment(0, total)]
+        self.error = None
+        # Set when the server's copy no longer matches the validator
+        self.changed = False
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        # Set by workers as they exit, so run() returns without waiting out a tick
+        self._wake = threading.Event()
+        self._pwrite = getattr(os, "pwrite", None) or _pwrite_fallback(threading.Lock())
+
+    @property
+    def received(self):
+        with self._lock:
+            return self.total - sum(segment.remaining() for segment in self.segments)
+
+    def is_complete(self):
+        return self.received == self.total
+
+    def contiguous(self):
+        # Bytes from the start of the file that are all on disk; segments
+        # never overlap and anything before the first one is complete
+        with self._lock:
+            pending = [segment.pos for segment in self.segments if segment.remaining() > 0]
+        return min(pending) if pending else self.total
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def run(self):
+        # Blocks until the file is complete, stop() is called or a segment
+        # runs out of retries
+        self._stop.clear()
+        self.error = None
+        self.changed = False
+        for segment in self.segments:
+            segment.owned = False
+            segment.retries = 0
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            if os.fstat(fd).st_size != self.total:
+                os.ftruncate(fd, self.total)
+                if hasattr(os, "posix_fallocate"):
+                    try:
+                        os.posix_fallocate(fd, 0, self.total)
+                    except OSError:
+                        pass
+            workers = [self._spawn(fd) for _ in range(min(INITIAL_SEGMENTS, self.max_segments))]
+            self._adapt(fd, workers)
+            for worker in workers:
+                worker.join()
+        finally:
+            os.close(fd)
+        return self.error is None and self.is_complete()
+
+    def _spawn(self, fd):
+        worker = threading.Thread(target=self._worker, args=(fd,), daemon=True)
+        worker.start()
+        return worker
+
+    def _adapt(self, fd, workers):
+        # Add a connection while each addition still pays for itself
+        baseline = None
+        last = self.received
+        last_time = time.monotonic()
+        while not self._stop.is_set():
+            self._wake.wait(ADAPT_INTERVAL)
+            self._wake.clear()
+            alive = [w for w in workers if w.is_alive()]
+            if not alive or self.error:
+                return
+            now = time.monotonic()
+            if now - last_time < ADAPT_INTERVAL:
+                continue
+            received = self.received
+            rate = (received - last) / (now - last_time)
+            last, last_time = received, now
+            if len(alive) >= self.max_segments or not self._splittable():
+                continue
+            if baseline is not None and rate < baseline * ADAPT_GAIN:
+                # The last connection didn't help; the link is saturated
+                self.max_segments = len(alive)
+                continue
+            baseline = rate
+            workers.append(self._spawn(fd))
+
+    def _splittable(self):
+        with self._lock:
+            return any(s.remaining() >= 2 * MIN_SPLIT_SIZE or (not s.owned and s.remaining() > 0)
+                       for s in self.segments)
+
+    def _take_segment(self):
+        with self._lock:
+            for segment in self.segments:
+                if not segment.owned and segment.remaining() > 0:
+                    segment.owned = True
+                    return segment
+            largest = max(self.segments, key=Segment.remaining)
+            if largest.remaining() < 2 * MIN_SPLIT_SIZE:
+                return None
+            middle = largest.pos + largest.remaining() // 2
+            segment = Segment(middle, largest.end)
+            segment.owned = True
+            largest.end = middle
+            self.segments.insert(self.segments.index(largest) + 1, segment)
+            return segment
+
+    def _worker(self, fd):
+        parts = urlsplit(self.url)
+        conn = None
+        with self._lock:
+            self.connections += 1
+        try:
+            while not self._stop.is_set() and self.error is None:
+                segment = self._take_segment()
+                if segment is None:
+                    return
+                attempt_start = segment.pos
+                try:
+                    if conn is None:
+                        conn = _connection(parts)
+                    if not self._fetch(conn, parts, fd, segment):
+                        conn.close()
+                        conn = None
+                except ResourceChanged as e:
+                    self.error = str(e)
+                    self.changed = True
+                    self._stop.set()
+                except (OSError, http.client.HTTPException) as e:
+                    if conn is not None:
+                        conn.close()
+                        conn = None
+                    # Retries only run out on a segment that stopped making progress
+                    segment.retries = 1 if segment.pos > attempt_start else segment.retries + 1
+                    if segment.retries > MAX_RETRIES:
+                        self.error = f"bytes {segment.pos}-{segment.end - 1}: {e}"
+                        self._stop.set()
+                    else:
+                        self._stop.wait(RETRY_BACKOFF * 2 ** (segment.retries - 1))
+                finally:
+                    with self._lock:
+                        segment.owned = False
+        finally:
+            if conn is not None:
+                conn.close()
+            with self._lock:
+                self.connections -= 1
+            self._wake.set()
+
+    def _fetch(self, conn, parts, fd, segment):
+        # Returns True when the connection can be reused
+        with self._lock:
+            start, end = segment.pos, segment.end
+        headers = dict(self.headers, Range=f"bytes={start}-{end - 1}")
+        if self.validator:
+            headers["If-Range"] = self.validator
+        conn.request("GET", _request_path(parts), headers=headers)
+        response = conn.getresponse()
+        if response.status == 200:
+            raise ResourceChanged("file changed on the server")
+        if response.status != 206:
+            raise http.client.HTTPException(f"HTTP {response.status}")
+        content_range = parse_content_range(response.getheader("Content-Range", ""))
+        if not content_range or content_range[0] != start or content_range[2] != self.total:
+            raise ResourceChanged("server returned a different range")
+        requested_end = end
+        while not self._stop.is_set():
+            with self._lock:
+                want = min(READ_CHUNK, segment.end - segment.pos)
+            if want <= 0:
+                break
+            data = response.read(want)
+            if not data:
+                raise http.client.IncompleteRead(b"", want)
+            self._pwrite(fd, data, segment.pos)
+            with self._lock:
+                segment.pos += len(data)
+        # Cut short by a split or stop(): the rest of the body is still in flight
+        return segment.pos == requested_end and not self._stop.is_set()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) not in (2, 3):
+        print("usage: segmented.py URL OUTPUT [MAX_SEGMENTS]", file=sys.stderr)
+        return 2
+    url, output = argv[0], argv[1]
+    result = probe(url)
+    if not result:
+        print("Server doesn't support range requests", file=sys.stderr)
+        return 1
+    final_url, total, validator = result
+    fetcher = SegmentedFetcher(final_url, output, total, validator,
+                               max_segments=int(argv[2]) if len(argv) == 3 else MAX_SEGMENTS)
+    started = time.monotonic()
+    ok = fetcher.run()
+    elapsed = time.monotonic() - started
+    print(f"{'Done' if ok else 'Failed'}: {fetcher.received} of {total} bytes in {elapsed:.2f} s "
+          f"({len(fetcher.segments)} segments){'' if ok else ' - ' + str(fetcher.error)}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import socket
+import time
+import getpass
+import hashlib
+import tempfile
+from pathlib import Path
+
+# Runs before Qt is imported, so a second launch can hand its URLs over and
+# exit without paying for it. Only listen() touches Qt.
+SERVER_PREFIX = "phoenixrose-web"
+# Only paid when an instance is running: with none, connecting fails at once.
+# A running instance that's busy, e.g. still restoring its session, gets
+# REPLY_TIMEOUT before we say we're waiting and BUSY_TIMEOUT in all.
+REPLY_TIMEOUT = 3.0
+BUSY_TIMEOUT = 60.0
+NEW_INSTANCE_FLAG = "--new-instance"
+INCOGNITO_FLAG = "--incognito"
+# Batch rendering (headless.py, renderfarm.py) always runs in a process of its own
+RENDER_FLAG = "--render"
+RENDER_FARM_FLAG = "--render-farm"
+
+
+def server_address():
+    # One instance per user and profile; the profile lives in the working directory
+    profile = hashlib.sha1(os.path.abspath(os.getcwd()).encode("utf-8")).hexdigest()[:12]
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = "user"
+    name = f"{SERVER_PREFIX}-{user}-{profile}"
+    if os.name == "nt":
+        return name
+    # A full path, so QLocalServer and the AF_UNIX client agree on it
+    return os.path.join(os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(), name)
+
+
+def parse_args(argv):
+    # Returns (urls, flags); local files become file:// URLs, since the
+    # running instance may have a different working directory
+    urls, flags = [], set()
+    for arg in argv:
+        if arg.startswith("--"):
+            flags.add(arg)
+        elif os.path.exists(arg):
+            urls.append(Path(arg).resolve().as_uri())
+        elif arg:
+            urls.append(arg)
+    return urls, flags
+
+
+def _connect(address):
+    # The connection, or None when no instance is listening
+    if os.name == "nt":
+        try:
+            return open(r"\\.\pipe" + "\\" + address, "r+b", buffering=0)
+        except FileNotFoundError:
+            return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(REPLY_TIMEOUT)
+    try:
+        sock.connect(address)
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No socket, or one left behind by an instance that crashed
+        sock.close()
+        return None
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def _send(connection, data):
+    if os.name == "nt":
+        # Pipe reads don't time out; a busy instance is simply waited for
+        connection.write(data)
+        return connection.readline()
+    connection.sendall(data)
+    deadline = time.monotonic() + BUSY_TIMEOUT
+    waiting = False
+    reply = b""
+    while not reply.endswith(b"\n"):
+        try:
+            chunk = connection.recv(64)
+        except socket.timeout:
+            if time.monotonic() >= deadline:
+                raise
+            if not waiting:
+                print("Waiting for the running instance to respond...", file=sys.stderr)
+                waiting = True
+            continue
+        if not chunk:
+            break
+        reply += chunk
+    return reply
+
+
+def _is_listening(address):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def forward_to_running_instance(argv):
+    # True when a running instance was reached and this process should exit
+    urls, flags = parse_args(argv)
+    if flags & {NEW_INSTANCE_FLAG, RENDER_FLAG, RENDER_FARM_FLAG}:
+        return False
+    message = {"urls": urls, "incognito": INCOGNITO_FLAG in flags, "flags": sorted(flags)}
+    try:
+        connection = _connect(server_address())
+    except OSError:
+        return False
+    if connection is None:
+        return False
+    # Something is listening, so starting anyway would put a second
+    # instance on the same profile; report a failed handover instead
+    try:
+        with connection:
+            reply = _send(connection, json.dumps(message).encode("utf-8") + b"\n")
+    except OSError as e:
+        print(f"Error handing URLs to the running instance: {e}", file=sys.stderr)
+        return True
+    if reply != b"ok\n":
+        print("Error: the running instance didn't accept the URLs", file=sys.stderr)
+    return True
+
+
+def listen(on_message, parent=None):
+    # Serves later launches; on_message gets each one's decoded message.
+    # Returns the QLocalServer, or None when another instance beat us to it.
+    from PyQt5.QtNetwork import QLocalServer
+
+    server = QLocalServer(parent)
+    server.setSocketOptions(QLocalServer.UserAccessOption)
+    address = server_address()
+    # With access options set, listen() replaces a live socket instead of
+    # failing, so check first
+    if os.name != "nt" and _is_listening(address):
+        # Started at the same moment as another instance
+        return None
+    # Clears a socket left behind by an instance that crashed
+    QLocalServer.removeServer(address)
+    if not server.listen(address):
+        print(f"Error starting single-instance server: {server.errorString()}")
+        return None
+
+    def accept():
+        while server.hasPendingConnections():
+            connection = server.nextPendingConnection()
+            buffer = bytearray()
+            connection.readyRead.connect(lambda c=connection, b=buffer: read(c, b))
+            connection.disconnected.connect(connection.deleteLater)
+
+    def read(connection, buffer):
+        buffer.extend(bytes(connection.readAll()))
+        if b"\n" not in buffer:
+            return
+        line = bytes(buffer).split(b"\n", 1)[0]
+        try:
+            message = json.loads(line)
+        except ValueError:
+            connection.disconnectFromServer()
+            return
+        connection.write(b"ok\n")
+        connection.flush()
+        connection.disconnectFromServer()
+        on_message(message)
+
+    server.newConnection.connect(accept)
+    return server
+
+
+if __name__ == "__main__":
+    # e.g. python singleinstance.py https://example.com
+    sys.exit(0 if forward_to_running_instance(sys.argv[1:]) else 1)
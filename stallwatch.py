@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import threading
+import traceback
+from collections import Counter, deque
+
+from PyQt5.QtCore import QObject, QTimer
+
+from netlog import rotate_log
+
+STALL_LOG_FILE = "stalls.jsonl"
+STALL_LOG_MAX_BYTES = 2 * 1024 * 1024
+STALL_LOG_BACKUPS = 3
+HEARTBEAT_INTERVAL = 50
+# A heartbeat this late (ms) is logged as a stall
+STALL_THRESHOLD = 250
+# How often the sampler looks at the heartbeat, and at the main thread's
+# stack while it's stalled
+SAMPLE_INTERVAL = 0.02
+MAX_STACK_DEPTH = 40
+MAX_RECENT = 50
+# Upper bounds (ms) of the event loop latency histogram
+LATENCY_BUCKETS = (16, 33, 50, 100, 250, 500, 1000, 5000)
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def format_frame(frame):
+    return f"{os.path.basename(frame.filename)}:{frame.lineno} in {frame.name}"
+
+
+def blame(stack):
+    # The innermost frame of our own code: the code that's running, or that
+    # called into Qt. Blocked in app.exec_() means Qt itself.
+    for frame in reversed(stack):
+        if os.path.dirname(os.path.abspath(frame.filename)) != SOURCE_DIR:
+            continue
+        if frame.name == "<module>" or os.path.abspath(frame.filename) == os.path.abspath(__file__):
+            break
+        return f"{frame.name} ({os.path.basename(frame.filename)})"
+    return "Qt event loop"
+
+
+class StallWatchdog(QObject):
+    # A QTimer heartbeat on the GUI thread plus a sampler thread that checks
+    # it. While the heartbeat is late the sampler reads the main thread's
+    # Python stack through sys._current_frames(); once it beats again the
+    # stall is logged with its duration and the stack seen most often.
+    def __init__(self, path=STALL_LOG_FILE, threshold=STALL_THRESHOLD, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.threshold = threshold / 1000
+        self.main_thread_id = threading.get_ident()
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        # offender -> {"count", "total_ms", "max_ms", "last", "stack"}
+        self.offenders = {}
+        self.recent = []
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        # Durations of stalls that have ended, oldest first
+        self._ended = deque()
+        self._stop = threading.Event()
+        self._thread = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(HEARTBEAT_INTERVAL)
+        self.timer.timeout.connect(self._beat)
+
+    def start(self):
+        if self._thread:
+            return
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self.timer.start()
+        self._thread = threading.Thread(target=self._run, name="stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if not self._thread:
+            return
+        self.timer.stop()
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self._thread = None
+
+    def _beat(self):
+        now = time.monotonic()
+        late_ms = max(0.0, (now - self._last_beat) * 1000 - HEARTBEAT_INTERVAL)
+        self._last_beat = now
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if late_ms < bound:
+                self.latency[i] += 1
+                break
+        else:
+            self.latency[-1] += 1
+        if late_ms > self.threshold * 1000:
+            # Logged by the sampler thread, off the GUI thread
+            self._ended.append(late_ms / 1000)
+
+    def _run(self):
+        samples = []
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            lag = time.monotonic() - self._last_beat
+            if lag > self.threshold + HEARTBEAT_INTERVAL / 1000:
+                frame = sys._current_frames().get(self.main_thread_id)
+                if frame is not None:
+                    samples.append(traceback.extract_stack(frame, limit=MAX_STACK_DEPTH))
+            while self._ended:
+                # A stall spent in C code holding the GIL has no samples
+                self._record(self._ended.popleft(), samples)
+                samples = []
+
+    def _record(self, duration, samples):
+        votes = Counter(blame(stack) for stack in samples)
+        offender = votes.most_common(1)[0][0] if votes else "unknown"
+        stack = next((s for s in samples if blame(s) == offender), [])
+        record = {
+            "ts": time.time(),
+            "duration_ms": round(duration * 1000, 1),
+            "offender": offender,
+            "samples": len(samples),
+            "stack": [format_frame(frame) for frame in stack],
+        }
+        with self._lock:
+            self._count(record)
+            self.recent = (self.recent + [record])[-MAX_RECENT:]
+        data = json.dumps(record) + "\n"
+        try:
+            rotate_log(self.path, len(data), STALL_LOG_MAX_BYTES, STALL_LOG_BACKUPS)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+        except Exception as e:
+            print(f"Error writing stall log: {e}")
+
+    def _count(self, record):
+        stats = self.offenders.setdefault(record["offender"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        stats["count"] += 1
+        stats["total_ms"] += record["duration_ms"]
+        stats["max_ms"] = max(stats["max_ms"], record["duration_ms"])
+        stats["last"] = record["ts"]
+        stats["stack"] = record["stack"]
+
+    def worst_offenders(self, limit=20):
+        with self._lock:
+            items = [dict(stats, offender=name) for name, stats in self.offenders.items()]
+        items.sort(key=lambda stats: stats["total_ms"], reverse=True)
+        return items[:limit]
+
+    def summary(self):
+        with self._lock:
+            recent = list(self.recent)
+        labels = [f"< {bound} ms" for bound in LATENCY_BUCKETS] + [f">= {LATENCY_BUCKETS[-1]} ms"]
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "latency": dict(zip(labels, self.latency)),
+            "offenders": self.worst_offenders(),
+            "recent": recent[::-1],
+        }
+
+    def load_log(self):
+        # Offender totals carry over from earlier sessions' logs
+        for path in [f"{self.path}.{i}" for i in range(STALL_LOG_BACKUPS, 0, -1)] + [self.path]:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        self._count(json.loads(line))
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"Error loading stall log: {e}")
@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+# Imported before Qt, so this module must not import it
+STARTUP_TRACE_FILE = "startup_trace.json"
+
+
+def process_age():
+    # Seconds since the process was created, so the trace also covers the
+    # interpreter starting up. Linux only; None elsewhere.
+    try:
+        with open("/proc/self/stat", "r") as f:
+            # Fields after the ")" that closes the command name start at field 3
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StartupTimeline:
+    # Spans and marks written in Chrome's trace event format; open the file
+    # in chrome://tracing or ui.perfetto.dev. Times count from process start.
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.offset = process_age() or 0.0
+        self.events = []
+        # name -> ms since process start
+        self.marks = {}
+        self._open = {}
+        self.pid = os.getpid()
+        self.written = False
+        if self.offset:
+            self._add({"name": "interpreter start", "ph": "X", "ts": 0, "dur": self.offset * 1e6})
+
+    def now_ms(self):
+        return (time.perf_counter() - self.origin + self.offset) * 1000
+
+    def _add(self, event):
+        event.setdefault("pid", self.pid)
+        event.setdefault("tid", threading.get_ident())
+        event.setdefault("cat", "startup")
+        self.events.append(event)
+
+    def begin(self, name):
+        self._open[name] = self.now_ms()
+
+    def end(self, name):
+        started = self._open.pop(name, None)
+        if started is not None:
+            self._add({"name": name, "ph": "X", "ts": started * 1000, "dur": (self.now_ms() - started) * 1000})
+
+    @contextmanager
+    def span(self, name):
+        self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(name)
+
+    def mark(self, name):
+        if name in self.marks:
+            return
+        self.marks[name] = self.now_ms()
+        self._add({"name": name, "ph": "i", "s": "g", "ts": self.marks[name] * 1000})
+
+    def write(self, path=STARTUP_TRACE_FILE):
+        for name in list(self._open):
+            self.end(name)
+        try:
+            with open(path, "w") as f:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms",
+                           "otherData": {"marks_ms": self.marks}}, f)
+            self.written = True
+        except Exception as e:
+            print(f"Error writing startup trace: {e}")
+
+    def summary(self):
+        return ", ".join(f"{name} at {ms:.0f} ms" for name, ms in sorted(self.marks.items(), key=lambda m: m[1]))
+
+
+timeline = StartupTimeline()
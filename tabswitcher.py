@@ -0,0 +1,175 @@
+from PyQt5.QtCore import Qt, QEvent, pyqtSignal
+from PyQt5.QtWidgets import QFrame, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem
+
+from omnibox import strip_url
+
+MAX_RESULTS = 50
+# Bonuses on top of 1 point per matched character
+WORD_START_BONUS = 2
+CONSECUTIVE_BONUS = 3
+# URL matches count for less than title matches
+URL_WEIGHT = 0.8
+# How much being recently used multiplies a match's score
+RECENCY_WEIGHT = 1.0
+WORD_SEPARATORS = " /.-_:?=&#"
+
+
+def fuzzy_score(query, text):
+    # Greedy subsequence match: every query character has to appear in
+    # order. Returns None when it doesn't match.
+    score = 0
+    pos = -1
+    for ch in query:
+        found = text.find(ch, pos + 1)
+        if found == -1:
+            return None
+        score += 1
+        if found == 0 or text[found - 1] in WORD_SEPARATORS:
+            score += WORD_START_BONUS
+        if found == pos + 1:
+            score += CONSECUTIVE_BONUS
+        pos = found
+    return score
+
+
+class TabEntry:
+    __slots__ = ("tab", "title", "url", "title_key", "url_key", "chars", "last_used")
+
+    def __init__(self, tab):
+        self.tab = tab
+        self.title = ""
+        self.url = ""
+        self.title_key = ""
+        self.url_key = ""
+        self.chars = frozenset()
+        self.last_used = 0
+
+
+class TabIndex:
+    # Titles and URLs of every tab, kept up to date from titleChanged and
+    # urlChanged rather than read back from the tabs on each search.
+    # Searches that extend the previous query only rescan its matches.
+    def __init__(self):
+        self.entries = {}
+        self.clock = 0
+        self._last_query = None
+        self._last_matches = None
+
+    def add(self, tab, title="", url=""):
+        self.entries[tab] = TabEntry(tab)
+        self.update(tab, title, url)
+
+    def remove(self, tab):
+        self.entries.pop(tab, None)
+        self._last_query = None
+
+    def update(self, tab, title=None, url=None):
+        entry = self.entries.get(tab)
+        if entry is None:
+            return
+        if title is not None:
+            entry.title = title
+            entry.title_key = title.lower()
+        if url is not None:
+            entry.url = url
+            entry.url_key = strip_url(url)
+        entry.chars = frozenset(entry.title_key) | frozenset(entry.url_key)
+        self._last_query = None
+
+    def touch(self, tab):
+        # Most recently used first; the clock counts tab switches
+        entry = self.entries.get(tab)
+        if entry is not None:
+            self.clock += 1
+            entry.last_used = self.clock
+
+    def search(self, text, limit=MAX_RESULTS):
+        query = "".join(text.lower().split())
+        if not query:
+            entries = sorted(self.entries.values(), key=lambda e: e.last_used, reverse=True)
+            return [entry.tab for entry in entries[:limit]]
+        if self._last_query and query.startswith(self._last_query):
+            candidates = self._last_matches
+        else:
+            candidates = self.entries.values()
+        needed = frozenset(query)
+        scored = []
+        matches = []
+        for entry in candidates:
+            if not needed <= entry.chars:
+                continue
+            title_score = fuzzy_score(query, entry.title_key)
+            url_score = fuzzy_score(query, entry.url_key)
+            if title_score is None and url_score is None:
+                continue
+            matches.append(entry)
+            score = max(title_score or 0, (url_score or 0) * URL_WEIGHT)
+            age = self.clock - entry.last_used
+            score *= 1 + RECENCY_WEIGHT / (1 + age)
+            scored.append((score, entry.last_used, entry))
+        self._last_query, self._last_matches = query, matches
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [entry.tab for _, _, entry in scored[:limit]]
+
+    def entry(self, tab):
+        return self.entries.get(tab)
+
+
+class TabSwitcher(QFrame):
+    # Quick-switcher overlay over the tab area: type to filter, Enter to go
+    tab_chosen = pyqtSignal(object)
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.setFrameShape(QFrame.StyledPanel)
+        self.setAutoFillBackground(True)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(6, 6, 6, 6)
+        self.search = QLineEdit()
+        self.search.setPlaceholderText("Search open tabs")
+        self.search.textChanged.connect(self.refresh)
+        self.search.returnPressed.connect(self.choose)
+        self.search.installEventFilter(self)
+        self.results = QListWidget()
+        self.results.itemActivated.connect(self.choose)
+        layout.addWidget(self.search)
+        layout.addWidget(self.results)
+        self.hide()
+
+    def open(self):
+        parent = self.parentWidget()
+        width = min(640, parent.width() - 40)
+        self.setGeometry((parent.width() - width) // 2, 60, width, min(420, parent.height() - 80))
+        self.search.clear()
+        self.refresh()
+        self.show()
+        self.raise_()
+        self.search.setFocus()
+
+    def refresh(self):
+        self.results.clear()
+        for tab in self.index.search(self.search.text()):
+            entry = self.index.entry(tab)
+            item = QListWidgetItem(f"{entry.title or entry.url}\n{entry.url}")
+            item.setData(Qt.UserRole, tab)
+            self.results.addItem(item)
+        self.results.setCurrentRow(0)
+
+    def choose(self, item=None):
+        item = item or self.results.currentItem()
+        self.hide()
+        if item is not None:
+            self.tab_chosen.emit(item.data(Qt.UserRole))
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.KeyPress:
+            if event.key() in (Qt.Key_Down, Qt.Key_Up, Qt.Key_PageDown, Qt.Key_PageUp):
+                self.results.keyPressEvent(event)
+                return True
+            if event.key() == Qt.Key_Escape:
+                self.hide()
+                return True
+        elif event.type() == QEvent.FocusOut and not self.results.hasFocus():
+            self.hide()
+        return False
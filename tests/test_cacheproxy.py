@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cacheproxy import CachingProxy
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        headers = {"Cache-Control": "max-age=60"}
+        status = 200
+        if self.path == "/cookie":
+            headers["Set-Cookie"] = "session=1"
+        elif self.path == "/etag":
+            headers = {"Cache-Control": "max-age=0", "ETag": '"v1"'}
+            if self.headers.get("If-None-Match") == '"v1"':
+                status = 304
+        body = b"" if status == 304 else f"body of {self.path}".encode()
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CachingProxyTest(unittest.TestCase):
+    def setUp(self):
+        self.origin = ThreadingHTTPServer(("127.0.0.1", 0), OriginHandler)
+        self.origin.daemon_threads = True
+        self.origin.requests = []
+        threading.Thread(target=self.origin.serve_forever, daemon=True).start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.proxy = CachingProxy(cache_dir=self.cache_dir)
+        self.proxy.start()
+
+    def tearDown(self):
+        self.proxy.stop()
+        self.origin.shutdown()
+        self.origin.server_close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.origin.server_address[1]}{path}"
+
+    def get(self, path):
+        conn = http.client.HTTPConnection("127.0.0.1", self.proxy.port, timeout=5)
+        try:
+            conn.request("GET", self.url(path))
+            response = conn.getresponse()
+            return response, response.read()
+        finally:
+            conn.close()
+
+    def wait_stored(self, path):
+        # The entry is committed after the body went out to the client
+        deadline = time.monotonic() + 5
+        while self.proxy.cache.lookup(self.url(path), {}) is None:
+            self.assertLess(time.monotonic(), deadline, "response was never stored")
+            time.sleep(0.01)
+
+    def test_second_request_is_a_hit(self):
+        first, body = self.get("/static")
+        self.assertEqual(first.status, 200)
+        self.assertIsNone(first.getheader("X-Cache"))
+        self.wait_stored("/static")
+        second, cached = self.get("/static")
+        self.assertEqual(second.getheader("X-Cache"), "HIT")
+        self.assertEqual(cached, body)
+        self.assertEqual(len(self.origin.requests), 1)
+
+    def test_set_cookie_responses_are_not_cached(self):
+        for _ in range(2):
+            response, _ = self.get("/cookie")
+            self.assertEqual(response.status, 200)
+            self.assertIsNone(response.getheader("X-Cache"))
+        self.assertEqual(len(self.origin.requests), 2)
+        self.assertIsNone(self.proxy.cache.lookup(self.url("/cookie"), {}))
+
+    def test_stale_entry_is_revalidated_with_304(self):
+        _, body = self.get("/etag")
+        self.wait_stored("/etag")
+        response, cached = self.get("/etag")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader("X-Cache"), "HIT")
+        self.assertEqual(cached, body)
+        self.assertEqual(self.origin.requests[1][1].get("If-None-Match"), '"v1"')
+        self.assertEqual(self.proxy.cache.stats["revalidated"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from segmented import Segment, SegmentedFetcher, probe, MIN_SPLIT_SIZE
+
+DATA = os.urandom(4 * MIN_SPLIT_SIZE)
+ETAG = '"v1"'
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        start, end, status = 0, len(DATA) - 1, 200
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match and self.headers.get("If-Range", ETAG) == ETAG:
+            start, end, status = int(match.group(1)), int(match.group(2) or end), 206
+            self.server.ranges.append((start, end))
+        self.send_response(status)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", ETAG)
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(DATA)}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        try:
+            for pos in range(start, end + 1, 64 * 1024):
+                self.wfile.write(DATA[pos:min(end + 1, pos + 64 * 1024)])
+                # Slow enough that a second connection finds work to split
+                time.sleep(0.001)
+        except OSError:
+            pass
+
+
+class SegmentedFetcherTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        self.server.daemon_threads = True
+        self.server.ranges = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/file.bin"
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "file.bin")
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_probe(self):
+        self.assertEqual(probe(self.url), (self.url, len(DATA), ETAG))
+
+    def test_idle_worker_splits_the_largest_segment(self):
+        fetcher = SegmentedFetcher(self.url, self.path, len(DATA), ETAG,
+                                   segments=[Segment(0, MIN_SPLIT_SIZE), Segment(MIN_SPLIT_SIZE, len(DATA))])
+        first = fetcher._take_segment()
+        second = fetcher._take_segment()
+        self.assertEqual((first.start, second.start), (0, MIN_SPLIT_SIZE))
+        third = fetcher._take_segment()
+        middle = MIN_SPLIT_SIZE + (len(DATA) - MIN_SPLIT_SIZE) // 2
+        self.assertEqual((second.end, third.start, third.end), (middle, middle, len(DATA)))
+        # Too small to split again; the worker has nothing left to do
+        fetcher.segments = [Segment(0, 2 * MIN_SPLIT_SIZE - 1)]
+        fetcher._take_segment()
+        self.assertIsNone(fetcher._take_segment())
+
+    def test_fetch_with_two_connections(self):
+        fetcher = SegmentedFetcher(self.url, self.path, len(DATA), ETAG)
+        self.assertTrue(fetcher.run())
+        self.assertEqual(self.read(), DATA)
+        # The second connection took half of the first one's range
+        self.assertGreaterEqual(len(fetcher.segments), 2)
+        starts = sorted(start for start, _ in self.server.ranges)
+        self.assertEqual(starts[0], 0)
+        self.assertGreater(starts[1], 0)
+
+    def test_if_range_mismatch_stops_the_fetch(self):
+        fetcher = SegmentedFetcher(self.url, self.path, len(DATA), '"old"')
+        self.assertFalse(fetcher.run())
+        self.assertTrue(fetcher.changed)
+        self.assertEqual(self.server.ranges, [])
+
+    def test_resume_keeps_the_existing_prefix(self):
+        half = len(DATA) // 2
+        with open(self.path, "wb") as f:
+            f.write(DATA[:half] + bytes(len(DATA) - half))
+        fetcher = SegmentedFetcher(self.url, self.path, len(DATA), ETAG, segments=[Segment(half, len(DATA))])
+        self.assertEqual(fetcher.received, half)
+        self.assertTrue(fetcher.run())
+        self.assertEqual(self.read(), DATA)
+        self.assertTrue(all(start >= half for start, _ in self.server.ranges))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+from PyQt5.QtGui import QPalette, QColor
+from PyQt5.QtWidgets import QToolTip
+
+# name -> (dark_mode, primary color)
+PRESET_THEMES = {
+    "light": (False, None),
+    "dark": (True, None),
+    "blue": (False, "#2196f3"),
+    "purple": (False, "#9c27b0"),
+}
+
+LIGHT_COLORS = {
+    QPalette.Window: "#f0f0f0",
+    QPalette.WindowText: "#000000",
+    QPalette.Base: "#ffffff",
+    QPalette.AlternateBase: "#f5f5f5",
+    QPalette.Text: "#000000",
+    QPalette.Button: "#eeeeee",
+    QPalette.ButtonText: "#000000",
+    QPalette.ToolTipBase: "#ffffdc",
+    QPalette.ToolTipText: "#000000",
+    QPalette.Highlight: "#3d7be0",
+    QPalette.HighlightedText: "#ffffff",
+    QPalette.Link: "#0b57d0",
+}
+
+DARK_COLORS = {
+    QPalette.Window: "#121212",
+    QPalette.WindowText: "#eeeeee",
+    QPalette.Base: "#222222",
+    QPalette.AlternateBase: "#2a2a2a",
+    QPalette.Text: "#eeeeee",
+    QPalette.Button: "#333333",
+    QPalette.ButtonText: "#eeeeee",
+    QPalette.ToolTipBase: "#333333",
+    QPalette.ToolTipText: "#eeeeee",
+    QPalette.Highlight: "#3d7be0",
+    QPalette.HighlightedText: "#ffffff",
+    QPalette.Link: "#8ab4f8",
+}
+
+
+def build_palette(dark_mode, primary_color=None):
+    palette = QPalette()
+    for role, color in (DARK_COLORS if dark_mode else LIGHT_COLORS).items():
+        palette.setColor(role, QColor(color))
+    if primary_color and not dark_mode:
+        palette.setColor(QPalette.Window, QColor(primary_color))
+    placeholder = QColor(palette.color(QPalette.Text))
+    placeholder.setAlpha(128)
+    palette.setColor(QPalette.PlaceholderText, placeholder)
+    for role in (QPalette.Text, QPalette.WindowText, QPalette.ButtonText):
+        palette.setColor(QPalette.Disabled, role, QColor("#777777" if dark_mode else "#a0a0a0"))
+    return palette
+
+
+class ThemeManager:
+    # Themes are a QPalette on the QApplication, built once per theme.
+    # Setting a palette only repaints; a stylesheet re-polishes every widget
+    # on each change, and while one is set on the application Qt stops
+    # passing palette changes on to widgets. So there's none.
+    def __init__(self, app):
+        self.app = app
+        self.palettes = {}
+        # (dark_mode, primary_color) currently applied
+        self.current = None
+        # Native styles (macOS, GTK) ignore most palette roles
+        app.setStyle("Fusion")
+        for dark_mode, primary_color in PRESET_THEMES.values():
+            self.palette(dark_mode, primary_color)
+
+    def palette(self, dark_mode, primary_color=None):
+        key = (dark_mode, None if dark_mode else primary_color)
+        if key not in self.palettes:
+            self.palettes[key] = build_palette(*key)
+        return self.palettes[key]
+
+    def apply(self, dark_mode, primary_color=None):
+        # Returns True when dark mode flipped, i.e. pages need a new background
+        previous = self.current
+        self.current = (dark_mode, None if dark_mode else primary_color)
+        if previous == self.current:
+            return False
+        palette = self.palette(dark_mode, primary_color)
+        self.app.setPalette(palette)
+        QToolTip.setPalette(palette)
+        return previous is None or previous[0] != dark_mode
@@ -0,0 +1,290 @@
+import os
+import hashlib
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QTimer, QBuffer, QByteArray, QIODevice, QEvent, QPoint, QSize, pyqtSignal
+from PyQt5.QtGui import QPixmap, QIcon
+from PyQt5.QtWidgets import QLabel, QDialog, QVBoxLayout, QListWidget, QListWidgetItem, QListView
+from PyQt5.QtWebEngineWidgets import QWebEnginePage
+
+THUMBNAIL_DIR = "thumbnails"
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_HEIGHT = 200
+THUMBNAIL_FORMAT = "JPG"
+THUMBNAIL_QUALITY = 70
+# A 320x200 JPEG is 10-20 KB
+MEMORY_CACHE_BYTES = 4 * 1024 * 1024
+DISK_CACHE_BYTES = 32 * 1024 * 1024
+# Capture requests within this window are done once per tab
+CAPTURE_DELAY = 500
+
+
+def thumbnail_key(url, incognito=False):
+    # Keyed by URL so restored and discarded tabs find theirs
+    return hashlib.sha1(("incognito:" if incognito else "").encode() + url.encode("utf-8")).hexdigest()
+
+
+class ThumbnailStore:
+    # Compressed thumbnails in a small in-memory LRU in front of a larger
+    # one on disk. Incognito thumbnails never reach the disk.
+    def __init__(self, root=THUMBNAIL_DIR, memory_bytes=MEMORY_CACHE_BYTES, disk_bytes=DISK_CACHE_BYTES):
+        self.root = root
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        # key -> size, least recently used first
+        self.disk = OrderedDict()
+        self.disk_size = 0
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.root, key + ".jpg")
+
+    def _scan(self):
+        try:
+            names = [name for name in os.listdir(self.root) if name.endswith(".jpg")]
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            try:
+                st = os.stat(os.path.join(self.root, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_size += size
+        self._evict_disk()
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            return data
+        if key not in self.disk:
+            self.stats["misses"] += 1
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except OSError:
+            self.disk_size -= self.disk.pop(key)
+            self.stats["misses"] += 1
+            return None
+        self.disk.move_to_end(key)
+        self.stats["disk_hits"] += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data, persist=True):
+        self._remember(key, data)
+        if not persist:
+            return
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key))
+        except OSError as e:
+            print(f"Error saving thumbnail: {e}")
+            return
+        self.disk_size += len(data) - self.disk.pop(key, 0)
+        self.disk[key] = len(data)
+        self._evict_disk()
+
+    def discard(self, key):
+        data = self.memory.pop(key, None)
+        if data is not None:
+            self.memory_size -= len(data)
+
+    def _remember(self, key, data):
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_size -= len(previous)
+        self.memory[key] = data
+        self.memory_size += len(data)
+        while self.memory_size > self.memory_bytes and len(self.memory) > 1:
+            _, dropped = self.memory.popitem(last=False)
+            self.memory_size -= len(dropped)
+
+    def _evict_disk(self):
+        while self.disk_size > self.disk_bytes and self.disk:
+            key, size = self.disk.popitem(last=False)
+            self.disk_size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+
+class ThumbnailService(QObject):
+    # Captures tabs only while they're on screen: after a load finishes in
+    # the current tab, and as a tab goes to the background.
+    # Requests are coalesced; a tab that loaded while hidden is captured
+    # the next time it's shown. Discarded and frozen pages are never
+    # grabbed, so asking for their thumbnail never wakes them up.
+    updated = pyqtSignal(object)
+
+    def __init__(self, store=None, parent=None):
+        super().__init__(parent)
+        self.store = store or ThumbnailStore()
+        self.pending = []
+        # Tabs whose page changed since their last capture
+        self.changed = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(CAPTURE_DELAY)
+        self.timer.timeout.connect(self._capture_pending)
+
+    def key(self, tab):
+        return thumbnail_key(tab.browser.url().toString(), tab.incognito)
+
+    def schedule(self, tab):
+        self.changed.add(tab)
+        if not tab.isVisible():
+            return
+        if tab not in self.pending:
+            self.pending.append(tab)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def tab_shown(self, tab):
+        if tab in self.changed:
+            self.schedule(tab)
+
+    def leaving(self, tab):
+        # Called right after a tab is switched away from; the view still has
+        # its last frame, so it can be grabbed although it's now hidden
+        if tab is not None and tab in self.changed:
+            self.capture(tab)
+
+    def forget(self, tab):
+        self.changed.discard(tab)
+        if tab in self.pending:
+            self.pending.remove(tab)
+        if tab.incognito:
+            self.store.discard(self.key(tab))
+
+    def thumbnail(self, tab):
+        data = self.store.get(self.key(tab))
+        if data is None:
+            return None
+        pixmap = QPixmap()
+        pixmap.loadFromData(data, THUMBNAIL_FORMAT)
+        return pixmap
+
+    def _capture_pending(self):
+        pending, self.pending = self.pending, []
+        for tab in pending:
+            if tab.isVisible():
+                self.capture(tab)
+
+    def capture(self, tab):
+        page = tab.browser.page()
+        if page.lifecycleState() != QWebEnginePage.Active:
+            return
+        pixmap = tab.browser.grab()
+        if pixmap.isNull() or pixmap.width() == 0:
+            return
+        scaled = pixmap.scaledToWidth(THUMBNAIL_WIDTH, Qt.SmoothTransformation)
+        scaled = scaled.copy(0, 0, THUMBNAIL_WIDTH, min(THUMBNAIL_HEIGHT, scaled.height()))
+        data = QByteArray()
+        buffer = QBuffer(data)
+        buffer.open(QIODevice.WriteOnly)
+        scaled.save(buffer, THUMBNAIL_FORMAT, THUMBNAIL_QUALITY)
+        buffer.close()
+        self.store.put(self.key(tab), bytes(data), persist=not tab.incognito)
+        self.changed.discard(tab)
+        self.updated.emit(tab)
+
+
+class TabPreview(QLabel):
+    # Thumbnail popup shown while hovering a background tab
+    def __init__(self, tabs, service):
+        super().__init__(tabs, Qt.ToolTip)
+        self.tabs = tabs
+        self.service = service
+        self.index = -1
+        self.setStyleSheet("border: 1px solid #888;")
+        tabs.tabBar().setMouseTracking(True)
+        tabs.tabBar().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.MouseMove:
+            self.hover(obj.tabAt(event.pos()))
+        elif event.type() in (QEvent.Leave, QEvent.MouseButtonPress):
+            self.hover(-1)
+        return False
+
+    def hover(self, index):
+        if index == self.index:
+            return
+        self.index = index
+        tab = self.tabs.widget(index) if index >= 0 else None
+        pixmap = self.service.thumbnail(tab) if tab is not None and index != self.tabs.currentIndex() else None
+        if pixmap is None:
+            self.hide()
+            return
+        self.setPixmap(pixmap)
+        self.adjustSize()
+        bar = self.tabs.tabBar()
+        self.move(bar.mapToGlobal(bar.tabRect(index).bottomLeft() + QPoint(0, 4)))
+        self.show()
+
+
+class TabOverview(QDialog):
+    # Grid of every open tab; discarded tabs show their stored thumbnail
+    def __init__(self, tabs, service, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Tab Overview")
+        self.resize(1000, 700)
+        self.tabs = tabs
+        self.service = service
+        self.grid = QListWidget()
+        self.grid.setViewMode(QListView.IconMode)
+        self.grid.setIconSize(QSize(THUMBNAIL_WIDTH * 3 // 4, THUMBNAIL_HEIGHT * 3 // 4))
+        self.grid.setResizeMode(QListView.Adjust)
+        self.grid.setMovement(QListView.Static)
+        self.grid.setSpacing(8)
+        self.grid.setWordWrap(True)
+        self.grid.itemActivated.connect(self.activate)
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.grid)
+        # Opened anew each time; nothing may keep a closed one alive
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        service.updated.connect(self.refresh_tab)
+        self.populate()
+
+    def done(self, result):
+        # Accept, reject and closing the window all end up here
+        self.service.updated.disconnect(self.refresh_tab)
+        super().done(result)
+
+    def populate(self):
+        self.grid.clear()
+        for i in range(self.tabs.count()):
+            tab = self.tabs.widget(i)
+            item = QListWidgetItem(self.tabs.tabText(i))
+            item.setData(Qt.UserRole, i)
+            item.setToolTip(tab.browser.url().toString())
+            pixmap = self.service.thumbnail(tab)
+            if pixmap is not None:
+                item.setIcon(QIcon(pixmap))
+            self.grid.addItem(item)
+
+    def refresh_tab(self, tab):
+        i = self.tabs.indexOf(tab)
+        item = self.grid.item(i) if i >= 0 else None
+        pixmap = self.service.thumbnail(tab) if item else None
+        if pixmap is not None:
+            item.setIcon(QIcon(pixmap))
+
+    def activate(self, item):
+        self.tabs.setCurrentIndex(item.data(Qt.UserRole))
+        self.accept()